@@ -1,4 +1,4 @@
-from flask import Blueprint, render_template, request, jsonify, session, redirect, url_for, flash
+from flask import Blueprint, render_template, request, jsonify, session, redirect, url_for, flash, current_app, Response
 from flask_login import login_required, current_user, login_user, logout_user
 from models import User, InvitationCode, db
 from functools import wraps
@@ -8,6 +8,7 @@ from datetime import datetime
 import os
 from werkzeug.utils import secure_filename
 import time
+import hmac
 
 # 创建管理后台蓝图
 admin_app = Blueprint('admin', __name__, 
@@ -337,6 +338,7 @@ def update_project(project_id):
     try:
         # 导入Project模型
         from app import Project
+        from export import bump_project_data_version
         
         project = Project.query.get_or_404(project_id)
         data = request.get_json()
@@ -350,6 +352,7 @@ def update_project(project_id):
             project.total_score = float(data['score'])
         
         db.session.commit()
+        bump_project_data_version(project_id)
         return jsonify({'success': True, 'message': '项目更新成功'})
     except Exception as e:
         db.session.rollback()
@@ -361,7 +364,9 @@ def update_project(project_id):
 def delete_project(project_id):
     try:
         # 导入Project模型
-        from app import Project
+        from app import Project, cache
+        from export import bump_project_data_version
+        from utils.cache_access import invalidate_tag, project_cache_tag
         
         # 这里使用get_or_404直接获取项目，不做用户ID筛选，允许管理员删除任何项目
         project = Project.query.get_or_404(project_id)
@@ -369,11 +374,50 @@ def delete_project(project_id):
         # 删除项目
         db.session.delete(project)
         db.session.commit()
+        bump_project_data_version(project_id)
+        invalidate_tag(cache, project_cache_tag(project_id))
         return jsonify({'success': True, 'message': '项目删除成功'})
     except Exception as e:
         db.session.rollback()
         return jsonify({'success': False, 'message': '删除项目失败: ' + str(e)}), 500
 
+# 生成文件清理状态
+@admin_app.route('/api/retention', methods=['GET'])
+@login_required
+@admin_required
+def get_retention_status():
+    from utils.file_retention import get_retention_metrics
+    return jsonify({'success': True, 'metrics': get_retention_metrics()})
+
+@admin_app.route('/api/retention/sweep', methods=['POST'])
+@login_required
+@admin_required
+def trigger_retention_sweep():
+    from utils.file_retention import run_retention_sweep
+    result = run_retention_sweep(force=True)
+    if result is None:
+        return jsonify({'success': False, 'message': '清理正在其他进程中执行，请稍后再试'}), 409
+    return jsonify({'success': True, 'result': result})
+
+@admin_app.route('/api/dwg_worker', methods=['GET'])
+@login_required
+@admin_required
+def get_dwg_worker_status():
+    from update_dwg_attribute import get_acad_worker_status
+    return jsonify({'success': True, 'status': get_acad_worker_status()})
+
+# 请求耗时、SQL 和缓存统计（Prometheus 文本格式）
+@admin_app.route('/api/metrics', methods=['GET'])
+def get_request_metrics():
+    # Prometheus 无法登录后台，配置 METRICS_TOKEN 后也可以使用 Authorization: Bearer <令牌> 访问
+    token = current_app.config.get('METRICS_TOKEN')
+    auth_header = request.headers.get('Authorization', '')
+    token_ok = bool(token) and auth_header.startswith('Bearer ') and hmac.compare_digest(auth_header[7:], token)
+    if not token_ok and not (current_user.is_authenticated and current_user.role == 'admin'):
+        return jsonify({'success': False, 'message': '只有管理员可以访问此接口'}), 403
+    from utils.request_metrics import render_prometheus_metrics
+    return Response(render_prometheus_metrics(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
 # 评价标准管理API路由
 @admin_app.route('/api/standards', methods=['GET'])
 @login_required
@@ -11,6 +11,7 @@ import urllib.parse
 import uuid
 import shutil # Added import
 import copy # <--- Import copy module
+import hashlib
 from datetime import datetime, timedelta, timezone
 from functools import wraps
 import tempfile
@@ -22,6 +23,7 @@ import traceback # 确保导入 traceback
 import pymysql
 import sqlite3
 from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 
@@ -45,7 +47,8 @@ from word_template import process_template, replace_placeholders
 from export import (
     generate_word, generate_dwg,
     generate_self_assessment_report,
-    generate_generateljzpwb
+    generate_generateljzpwb,
+    bump_project_data_version
 )
 from models import (
     db, User, InvitationCode,
@@ -54,6 +57,14 @@ from models import (
 )
 from admin import admin_app
 from utils.extract_word_info import extract_project_info
+from utils.file_retention import init_file_retention
+from utils.shared_cache import update_cache_value, check_cache_backend
+from utils.project_permissions import resolve_project_permission, invalidate_project_permissions
+from utils.cache_access import get_or_compute, set_cached, delete_cached, invalidate_tag, project_cache_tag
+from utils.last_seen import init_last_seen, record_last_seen
+from utils.request_metrics import init_request_metrics
+from utils.query_profiler import init_query_profiler
+from utils.report_jobs import init_report_jobs, run_report, get_report_job, report_job_payload, send_report_job_file
 from utils.document_parser import convert_doc_to_docx, parse_report_scores # 添加 parse_report_scores
 from map_helper import init_routes
 # 导入公共交通分析报告生成函数
@@ -96,6 +107,16 @@ app.add_url_rule('/api/google_elevation', view_func=map_routes['get_google_eleva
 # 设置配置
 app.config['UPLOAD_FOLDER'] = 'uploads'
 app.config['EXPORT_FOLDER'] = 'static/exports'
+app.config['SERVER_WORKERS'] = int(os.environ.get('SERVER_WORKERS', 1))  # Web服务工作进程数，由 start.py 设置（gunicorn）
+app.config['TEMPLATE_RENDER_WORKERS'] = int(os.environ.get('TEMPLATE_RENDER_WORKERS', os.cpu_count() or 1))  # 整个服务的报审表模板并行渲染进程数，按工作进程平分，1表示顺序处理
+app.config['DWG_BACKEND'] = os.environ.get('DWG_BACKEND', 'auto')  # DWG生成方式：autocad / dxf / auto（Windows用AutoCAD，其他系统用ezdxf）
+app.config['DWG_ACAD_WORKER_ENABLED'] = os.environ.get('DWG_ACAD_WORKER_ENABLED', 'true').lower() != 'false'  # AutoCAD方式导出时使用常驻工作进程和任务队列
+app.config['DWG_CACHE_ENABLED'] = os.environ.get('DWG_CACHE_ENABLED', 'true').lower() != 'false'  # 相同模板和属性的DWG导出直接使用 dwg_cache 中的结果
+app.config['REPORT_JOB_WORKERS'] = int(os.environ.get('REPORT_JOB_WORKERS', 2))  # 每个进程同时执行的后台报告任务数
+app.config['LAST_SEEN_THROTTLE'] = int(os.environ.get('LAST_SEEN_THROTTLE', 60))  # 同一用户最后在线时间的最小记录间隔（秒）
+app.config['LAST_SEEN_FLUSH_INTERVAL'] = int(os.environ.get('LAST_SEEN_FLUSH_INTERVAL', 30))  # 最后在线时间批量写入数据库的间隔（秒）
+app.config['METRICS_ENABLED'] = os.environ.get('METRICS_ENABLED', 'true').lower() != 'false'  # 统计接口耗时、SQL和缓存命中，管理后台 /admin/api/metrics 输出
+app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN')  # Prometheus 抓取指标时使用的 Bearer 令牌，未设置时只允许管理员访问
 app.config['MAX_CONTENT_LENGTH'] = 100 * 1024 * 1024  # 最大上传文件限制增加到100MB
 
 # 配置日志
@@ -117,6 +138,20 @@ logging.getLogger('sqlalchemy.orm').setLevel(logging.WARNING)
 logging.getLogger('werkzeug').setLevel(logging.WARNING)
 logging.getLogger('flask_cors').setLevel(logging.WARNING)
 
+# 请求耗时、SQL 和缓存统计，在其他注册请求钩子的模块之前注册，以便计入这些钩子的耗时，见 utils/request_metrics.py
+init_request_metrics(app)
+
+# 生成文件自动清理（static/exports、temp、dwg_cache），规则见 utils/file_retention.py
+app.config['FILE_RETENTION_ENABLED'] = os.environ.get('FILE_RETENTION_ENABLED', 'true').lower() != 'false'
+app.config['FILE_RETENTION_INTERVAL'] = int(os.environ.get('FILE_RETENTION_INTERVAL', 30 * 60))  # 清理间隔（秒）
+init_file_retention(app)
+
+# 报告导出后台任务，见 utils/report_jobs.py
+init_report_jobs(app)
+
+# 用户最后在线时间由后台线程批量写入，见 utils/last_seen.py
+init_last_seen(app, db)
+
 # 配置 session
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev_key_123')  # 添加一个默认的密钥
 app.config['SESSION_TYPE'] = 'filesystem'
@@ -128,14 +163,28 @@ CORS(app, resources={r"/api/*": {"origins": "*"}})
 # 判断是否为生产环境
 is_production = os.environ.get('FLASK_ENV') == 'production'
 
+# 开发环境的慢查询和 N+1 查询检测，结果写入 logs/query_profiler.log 和响应头 X-Query-Profiler，见 utils/query_profiler.py
+# QUERY_PROFILER_ENABLED 未设置时跟随 app.debug
+if os.environ.get('QUERY_PROFILER_ENABLED'):
+    app.config['QUERY_PROFILER_ENABLED'] = os.environ.get('QUERY_PROFILER_ENABLED').lower() != 'false'
+app.config['QUERY_PROFILER_MAX_STATEMENTS'] = int(os.environ.get('QUERY_PROFILER_MAX_STATEMENTS', 50))  # 单个请求的语句数上限
+app.config['QUERY_PROFILER_MAX_REPEATS'] = int(os.environ.get('QUERY_PROFILER_MAX_REPEATS', 10))  # 同一形状语句的重复次数上限
+app.config['QUERY_PROFILER_SLOW_QUERY'] = float(os.environ.get('QUERY_PROFILER_SLOW_QUERY', 0.5))  # 慢查询阈值（秒）
+init_query_profiler(app)
+
 # 配置缓存
+# 默认使用多进程共享的 SQLite 缓存（utils/shared_cache.py），各工作进程看到同一份数据，清除缓存对所有进程生效；
+# 有 Redis 时可设置 CACHE_TYPE=RedisCache 和 CACHE_REDIS_URL；评分汇总增量更新和缓存标签需要原子的读取-修改-写回，
+# 不支持的后端（FileSystemCache、Memcached 等）在启动时报错
 cache_config = {
     "DEBUG": not is_production,
-    "CACHE_TYPE": "FileSystemCache" if is_production else "SimpleCache",
-    "CACHE_DIR": "cache" if is_production else None,
+    "CACHE_TYPE": os.environ.get('CACHE_TYPE', 'utils.shared_cache.SQLiteCache'),
+    "CACHE_DIR": os.environ.get('CACHE_DIR', 'cache'),
+    "CACHE_REDIS_URL": os.environ.get('CACHE_REDIS_URL'),
     "CACHE_DEFAULT_TIMEOUT": 3600  # 缓存过期时间，单位秒（1小时）
 }
 cache = Cache(app, config=cache_config)
+check_cache_backend(cache)
 
 # 配置数据库连接
 db_uri = os.environ.get('DATABASE_URL')
@@ -191,15 +240,9 @@ def favicon():
 # 添加请求处理器来更新用户的last_seen时间
 @app.before_request
 def update_last_seen():
-    """更新用户的最后访问时间"""
+    """记录用户的最后访问时间，按用户节流后由后台线程批量写入数据库"""
     if current_user.is_authenticated:
-        try:
-            # 尝试使用timezone.utc (Python 3.8+)
-            current_user.last_seen = datetime.now(timezone.utc)
-        except (AttributeError, TypeError):
-            # 回退到旧方法
-            current_user.last_seen = datetime.utcnow()
-        db.session.commit()
+        record_last_seen(current_user.id)
 
 # 添加请求日志中间件
 @app.before_request
@@ -627,6 +670,7 @@ def save_project_info(form_data):
         # 保存项目信息到数据库
         db.session.add(project)
         db.session.commit()
+        bump_project_data_version(project.id)
         db.session.refresh(project)  # 刷新对象以获取最新值
         
         print(f"项目信息保存成功: ID={project.id}, 名称={project.name}")
@@ -771,17 +815,15 @@ def create_project():
             )
             db.session.add(collaborator)
             
-            # 为项目创建默认评分数据
-            try:
-                app.logger.info(f"创建项目默认评分数据: 项目ID={project_id}, 名称={project_name}, 标准={standard}")
-                create_default_scores(project_id, project_name, standard)
-            except Exception as score_error:
-                app.logger.error(f"创建默认评分数据失败: {str(score_error)}")
-                app.logger.error(traceback.format_exc())
-                # 继续执行，不影响项目创建
+            # 为项目创建默认评分数据，与项目在同一事务中提交，失败时项目也不创建，避免生成没有评分记录的项目
+            app.logger.info(f"创建项目默认评分数据: 项目ID={project_id}, 名称={project_name}, 标准={standard}")
+            if not create_default_scores(project_id, project_name, standard):
+                db.session.rollback()
+                return jsonify({'error': '创建默认评分数据失败，项目未创建，请稍后重试'}), 500
             
             # 提交事务
             db.session.commit()
+            bump_project_data_version(project_id)
             return jsonify({
                 'id': project_id,
                 'name': project.name,
@@ -813,76 +855,52 @@ def create_default_scores(project_id, project_name, standard_selection):
     """
     为项目创建默认评分记录
     
+    通过一条 INSERT ... SELECT 语句直接从评价标准表生成默认得分记录，
+    不再逐条插入。评价标准中同一条文重复出现时只保留第一条，其余条文照常写入。
+    记录与项目在同一事务中，由调用方提交。
+    
     参数:
     - project_id: 项目ID
     - project_name: 项目名称
     - standard_selection: 评价标准
+
+    返回:
+    - bool: 是否成功，失败时调用方应回滚事务
     """
     try:
         app.logger.info(f"开始创建默认评分记录...")
+        start_time = time.perf_counter()
+        
+        # 所有条文默认达标为"是"；分值为"—"的条文得分为"—"，其余为"0"
+        # 映射评价等级：控制项 → 基本级，评分项 → 提高级，找不到映射则保持原值
+        result = db.session.execute(
+            text("""
+            INSERT INTO `得分表` (
+                `项目ID`, `项目名称`, `专业`, `评价等级`, `条文号`, `分类`, 
+                `是否达标`, `得分`, `技术措施`, `评价标准`
+            )
+            SELECT
+                :project_id, :project_name, `专业`,
+                CASE TRIM(`属性`) WHEN '控制项' THEN '基本级' WHEN '评分项' THEN '提高级' ELSE TRIM(`属性`) END,
+                `条文号`, `分类`, '是',
+                CASE WHEN `分值` = '—' THEN '—' ELSE '0' END,
+                '', :standard
+            FROM `评价标准`
+            WHERE `标准名称` = :standard
+            ORDER BY `序号`
+            ON DUPLICATE KEY UPDATE `得分表`.`序号` = `得分表`.`序号`
+            """),
+            {
+                "project_id": project_id,
+                "project_name": project_name,
+                "standard": standard_selection
+            }
+        )
+        # 重复的条文命中唯一索引后不做修改，不计入影响行数
+        insert_count = result.rowcount
         
-        # 获取标准数据
-        app.logger.info(f"获取标准数据: {standard_selection}")
-        standards_data = get_standards_by_name(standard_selection)
-        if standards_data:
-
-            # 插入新的评分记录
-            insert_count = 0
-            insert_errors = 0
-            score = "0"
-            for std in standards_data:
-                # 所有条文默认达标为"是"
-                is_achieved = '是'
-                    # 映射评价等级：控制项 → 基本级，评分项 → 提高级
-                level_mapping = {
-                    '控制项': '基本级',
-                    '评分项': '提高级'
-                }
-                # 获取映射后的评价等级，如果找不到映射则保持原值
-                normalized_level = std.属性.strip()  # 去除前后空格
-                mapped_level = level_mapping.get(normalized_level, normalized_level)
-                
-                # 如果分值为"—"，则设置为"—"
-                if std.分值 == "—":
-                    score = "—"
-                else:
-                    score = "0"
-                # 插入评分记录
-                try:
-                    db.session.execute(
-                        text("""
-                        INSERT INTO `得分表` (
-                            `项目ID`, `项目名称`, `专业`, `评价等级`, `条文号`, `分类`, 
-                            `是否达标`, `得分`, `技术措施`, `评价标准`
-                        ) VALUES (
-                            :project_id, :project_name, :specialty, :level, :clause_number, 
-                            :category, :is_achieved, :score, :technical_measures, :standard
-                        )
-                        """),
-                        {
-                            "project_id": project_id,
-                            "project_name": project_name,
-                            "specialty": std.专业,
-                            "level": mapped_level,  # 使用映射后的值,   
-                            "clause_number": std.条文号,
-                            "category": std.分类,
-                            "is_achieved": is_achieved,
-                            "score": score,
-                            "technical_measures": '',
-                            "standard": standard_selection
-                        }
-                    )
-                except Exception as insert_error:
-                    app.logger.error(f"插入评分记录失败: {str(insert_error)}, 条文号: {std.条文号}")
-        
-        # 提交最后的事务
-        try:
-            db.session.commit()
-            app.logger.info(f"最终提交事务成功")
-        except Exception as commit_error:
-            app.logger.error(f"提交事务失败: {str(commit_error)}")
-            db.session.rollback()
-            app.logger.error(traceback.format_exc())
+        elapsed_ms = (time.perf_counter() - start_time) * 1000
+        app.logger.info(f"创建默认评分记录完成: 项目ID={project_id}, 标准={standard_selection}, 记录数={insert_count}, 耗时={elapsed_ms:.1f}ms")
         return True
     
     except Exception as e:
@@ -892,24 +910,9 @@ def create_default_scores(project_id, project_name, standard_selection):
 
 # 修改项目访问权限检查
 def check_project_access(project_id):
-    """检查当前用户是否有权限访问指定项目"""
+    """检查当前用户是否有权限访问指定项目（创建者或协作者），同一请求内与 get_project_permissions 共用查询结果"""
     try:
-        user_id = session.get('user_id')
-        if not user_id:
-            return False
-        
-        # 检查是否为项目创建者
-        project = Project.query.filter_by(id=project_id, user_id=user_id).first()
-        if project:
-            return True
-        
-        # 检查是否为项目协作者
-        collaborator = ProjectCollaborator.query.filter_by(
-            project_id=project_id, 
-            user_id=user_id
-        ).first()
-        
-        return collaborator is not None
+        return resolve_project_permission(project_id) is not None
     except Exception as e:
         print(f"检查项目访问权限失败: {str(e)}")
         return False
@@ -1003,6 +1006,8 @@ def delete_project(project_id):
             
         db.session.delete(project)
         db.session.commit()
+        bump_project_data_version(project_id)
+        invalidate_tag(cache, project_cache_tag(project_id))
         
         return jsonify({
             'success': True,
@@ -1620,76 +1625,96 @@ def user_guide():
 def logout():
     session.pop('user_id', None)
     return redirect(url_for('login_page'))
+# 项目列表只返回列表页需要的字段；自己创建的项目和参与协作的项目在一条语句中查出，
+# 协作角色和权限直接来自连接的协作者记录，不再逐个项目查询
+PROJECT_LIST_COLUMNS = "p.id, p.name, p.code, p.location, p.standard, p.star_rating_target, p.building_type, p.status, p.created_at"
+PROJECT_LIST_MAX_LIMIT = 500
+
 @app.route('/api/projects', methods=['GET'])
 @login_required
 def get_projects():
+    """
+    获取当前用户创建和参与的项目列表，按项目ID倒序
+
+    可选参数（键集分页）:
+        limit: 每页数量，不传时返回全部项目
+        cursor: 上一页返回的 next_cursor，只返回ID小于该值的项目
+
+    响应带有 ETag，客户端带 If-None-Match 请求且列表未变化时返回 304
+    """
     try:
         # 获取当前用户ID
         user_id = session.get('user_id')
         
         if not user_id:
             return jsonify({'error': '用户未登录'}), 401
-        
-        # 获取该用户创建的所有项目
-        own_projects = Project.query.filter_by(user_id=user_id).order_by(Project.created_at.desc()).all()
-        
-        # 获取用户自己创建的项目ID列表，用于后面去重
-        own_project_ids = [project.id for project in own_projects]
-        
-        # 获取该用户作为协作者参与的所有项目，排除自己创建的项目
-        collaborated_project_ids = db.session.query(ProjectCollaborator.project_id) \
-                                  .filter_by(user_id=user_id) \
-                                  .filter(~ProjectCollaborator.project_id.in_(own_project_ids)) \
-                                  .all()
-        
-        collaborated_project_ids = [pid[0] for pid in collaborated_project_ids]
-        collaborated_projects = []
-        
-        if collaborated_project_ids:
-            collaborated_projects = Project.query.filter(Project.id.in_(collaborated_project_ids)) \
-                                   .order_by(Project.created_at.desc()) \
-                                   .all()
-        
-        # 合并两类项目并转换为JSON格式
-        projects_data = []
-        
-        # 添加用户创建的项目
-        for project in own_projects:
-            # 确保项目对象有效
-            if project is None:
-                continue
-                
-            # 使用to_dict方法获取项目数据
-            project_data = project.to_dict()
-            # 标记为自己创建的项目
-            project_data['is_owner'] = True
-            project_data['role'] = '创建者'
-            project_data['permissions'] = '管理'
-            projects_data.append(project_data)
-        
-        # 添加用户作为协作者参与的项目
-        for project in collaborated_projects:
-            if project is None:
-                continue
-            
-            project_data = project.to_dict()
-            
-            # 获取协作者信息
-            collaborator = ProjectCollaborator.query.filter_by(
-                project_id=project.id,
-                user_id=user_id
-            ).first()
-            
-            # 标记为协作项目
-            project_data['is_owner'] = False
-            project_data['role'] = collaborator.role if collaborator else '参与者'
-            project_data['permissions'] = collaborator.permissions if collaborator else '只读'
-            projects_data.append(project_data)
-        
-        return jsonify({
+
+        limit = request.args.get('limit', type=int)
+        cursor = request.args.get('cursor', type=int)
+        if limit is not None:
+            limit = max(1, min(limit, PROJECT_LIST_MAX_LIMIT))
+
+        params = {'user_id': user_id}
+        cursor_condition = ''
+        if cursor:
+            cursor_condition = 'AND p.id < :cursor'
+            params['cursor'] = cursor
+        limit_clause = ''
+        if limit is not None:
+            # 多取一条用于判断是否还有下一页
+            limit_clause = 'LIMIT :limit'
+            params['limit'] = limit + 1
+
+        rows = db.session.execute(
+            text(f"""
+            SELECT {PROJECT_LIST_COLUMNS}, 1 AS is_owner, '创建者' AS role, '管理' AS permissions
+            FROM projects p
+            WHERE p.user_id = :user_id {cursor_condition}
+            UNION ALL
+            SELECT {PROJECT_LIST_COLUMNS}, 0 AS is_owner, c.role, c.permissions
+            FROM project_collaborators c
+            JOIN projects p ON p.id = c.project_id
+            WHERE c.user_id = :user_id AND p.user_id <> :user_id {cursor_condition}
+            ORDER BY id DESC
+            {limit_clause}
+            """),
+            params
+        ).fetchall()
+
+        next_cursor = None
+        if limit is not None and len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = rows[-1].id
+
+        projects_data = [
+            {
+                'id': row.id,
+                'name': row.name,
+                'code': row.code,
+                'location': row.location,
+                'standard': row.standard,
+                'star_rating_target': row.star_rating_target,
+                'building_type': row.building_type,
+                'status': row.status,
+                'created_at': row.created_at.strftime('%Y-%m-%d %H:%M:%S') if row.created_at else None,
+                'is_owner': bool(row.is_owner),
+                'role': row.role or '参与者',
+                'permissions': row.permissions or '只读',
+            }
+            for row in rows
+        ]
+
+        payload = {
             'success': True,
-            'projects': projects_data
-        })
+            'projects': projects_data,
+            'next_cursor': next_cursor
+        }
+        response = jsonify(payload)
+        # projects 表没有更新时间字段，ETag 由本页返回的全部字段计算，项目修改、删除或权限变化都会改变 ETag
+        etag_source = json.dumps([user_id, cursor, limit, payload], ensure_ascii=False, sort_keys=True, default=str)
+        response.set_etag(hashlib.md5(etag_source.encode('utf-8')).hexdigest())
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response.make_conditional(request)
     except Exception as e:
         app.logger.error(f"获取项目列表时出错: {str(e)}")
         app.logger.error(traceback.format_exc())
@@ -1719,6 +1744,51 @@ def project_info_page():
         app.logger.error(f"访问项目信息页面出错: {str(e)}")
         app.logger.error(traceback.format_exc())
         return render_template('error.html', error=f"获取项目信息失败: {str(e)}")
+# 得分表唯一索引名称：同一项目、同一评价标准下每个条文只有一条记录
+SCORE_UNIQUE_INDEX_NAME = 'uix_score_project_clause_standard'
+
+# 唯一索引是否存在，进程内只检查一次
+_score_unique_index_ready = None
+
+def _score_unique_index_exists():
+    """查询数据库中是否已存在得分表唯一索引"""
+    return bool(db.session.execute(
+        text("""
+        SELECT COUNT(*) FROM information_schema.statistics
+        WHERE table_schema = DATABASE() AND table_name = '得分表' AND index_name = :index_name
+        """),
+        {"index_name": SCORE_UNIQUE_INDEX_NAME}
+    ).scalar())
+
+def score_unique_index_ready():
+    """
+    检查得分表唯一索引是否存在，结果在进程内缓存
+
+    索引由迁移 3f9c1d2a7b10 创建（flask db upgrade），不存在时
+    update_score_direct 退回到先更新、再插入的写法。
+    """
+    global _score_unique_index_ready
+    if _score_unique_index_ready is None:
+        try:
+            exists = _score_unique_index_exists()
+            db.session.commit()
+            _score_unique_index_ready = exists
+        except Exception as e:
+            db.session.rollback()
+            app.logger.error(f"检查得分表唯一索引失败: {str(e)}")
+            return False
+    return _score_unique_index_ready
+
+def score_row_lock_clause():
+    """
+    读取将被修改的得分记录时附加的锁定子句
+
+    MySQL 默认的可重复读下普通 SELECT 读的是快照，其他工作进程在读取和写入之间提交的得分不可见，
+    据此计算的评分汇总增量会出错；FOR UPDATE 读取最新提交的记录并锁定到事务结束
+    （记录不存在时锁定索引间隙，并发插入同一条文时等待）。SQLite 的写事务本身是串行的，不需要也不支持该子句。
+    """
+    return ' FOR UPDATE' if db.engine.dialect.name == 'mysql' else ''
+
 # 添加新的路由用于直接更新得分
 @app.route('/api/update_score_direct', methods=['POST'])
 def update_score_direct():
@@ -1731,120 +1801,120 @@ def update_score_direct():
                 'success': False,
                 'message': '未接收到JSON数据'
             }), 400
-        
+
         # 验证必要参数
         project_id = data.get('project_id')
         clause_number = data.get('clause_number')
         score = data.get('score')
         standard = data.get('standard', '成都市标')
-        
+
         # 可选参数
         is_achieved = data.get('is_achieved', '是')
         technical_measures = data.get('technical_measures', '')
-        
+
         # 记录请求信息
         app.logger.info(f"接收到更新请求: 项目ID={project_id}, 条文号={clause_number}, 得分={score}, 标准={standard}")
-        
+
         # 验证必要参数
         if not all([project_id, clause_number, score is not None]):
             return jsonify({
                 'success': False,
                 'message': '缺少必要参数: project_id, clause_number, score'
             }), 400
-        
+
+        # 得分字段是字符串，写入的值即为 str(score)
+        stored_score = str(score)
+        params = {
+            "project_id": project_id,
+            "clause_number": clause_number,
+            "is_achieved": is_achieved,
+            "score": stored_score,
+            "technical_measures": technical_measures,
+            "standard": standard
+        }
+        use_upsert = score_unique_index_ready()
+
         max_retries = 3
         retry_count = 0
-        
+
         while retry_count < max_retries:
             try:
                 # 使用SQLAlchemy事务管理
                 app.logger.info("开始数据库操作")
-                
-                with db.session.begin():
-                    # 先检查记录是否存在
-                    check_query = """
-                    SELECT COUNT(*) FROM `得分表`
+
+                # 原记录总是读取（按唯一索引只有一行）：其他工作进程可能在写入前刚缓存了评分汇总，
+                # 只在缓存存在时读取会漏掉增量；加锁读取，提交前其他请求无法修改该条文
+                result = db.session.execute(
+                    text("""
+                    SELECT `专业`, `分类`, `是否达标`, `得分`, `评价等级` FROM `得分表`
                     WHERE `项目ID` = :project_id AND `条文号` = :clause_number AND `评价标准` = :standard
-                    """
+                    """ + score_row_lock_clause()),
+                    params
+                )
+                old_rows = [tuple(row) for row in result.fetchall()]
+                new_rows = [
+                    (row[0], row[1], is_achieved, stored_score, row[4]) for row in old_rows
+                ]
+
+                if use_upsert:
+                    # 一条语句完成插入或更新，同时更新得分、是否达标和技术措施
                     result = db.session.execute(
-                        text(check_query), 
-                        {"project_id": project_id, "clause_number": clause_number, "standard": standard}
+                        text("""
+                        INSERT INTO `得分表` (
+                            `项目ID`, `条文号`, `是否达标`, `得分`, `技术措施`, `评价标准`
+                        )
+                        VALUES (:project_id, :clause_number, :is_achieved, :score, :technical_measures, :standard)
+                        ON DUPLICATE KEY UPDATE
+                            `得分` = VALUES(`得分`),
+                            `是否达标` = VALUES(`是否达标`),
+                            `技术措施` = VALUES(`技术措施`)
+                        """),
+                        params
                     )
-                    count = result.fetchone()[0]
-                    
-                    if count > 0:
-                        # 更新现有记录，同时更新得分、是否达标和技术措施
-                        update_query = """
+                    app.logger.info(f"写入记录: 影响行数={result.rowcount}")
+                else:
+                    # 没有唯一索引时先更新，未匹配到记录再插入
+                    result = db.session.execute(
+                        text("""
                         UPDATE `得分表`
                         SET `得分` = :score,
                             `是否达标` = :is_achieved,
-                            `技术措施` = :technical_measures  -- 添加这一行
+                            `技术措施` = :technical_measures
                         WHERE `项目ID` = :project_id AND `条文号` = :clause_number AND `评价标准` = :standard
-                        """
-                        result = db.session.execute(
-                            text(update_query),
-                            {
-                                "score": score,
-                                "is_achieved": is_achieved,
-                                "technical_measures": technical_measures, # 添加这个参数
-                                "project_id": project_id,
-                                "clause_number": clause_number,
-                                "standard": standard
-                            }
-                        )
-                        app.logger.info(f"更新记录: 影响行数={result.rowcount}")
-                    else:
-                        # 插入新记录
-                        insert_query = """
-                        INSERT INTO `得分表` (
-                            `项目ID`, `条文号`, 
-                             `是否达标`, `得分`, `技术措施`, `评价标准`
-                        )
-                        VALUES (:project_id, :clause_number, 
-                               :is_achieved, :score, :technical_measures, :standard)
-                        """
+                        """),
+                        params
+                    )
+                    if result.rowcount == 0:
                         result = db.session.execute(
-                            text(insert_query),
-                            {
-                                "project_id": project_id, 
-                                "clause_number": clause_number,
-                                "is_achieved": is_achieved, 
-                                "score": score, 
-                                "technical_measures": technical_measures, 
-                                "standard": standard
-                            }
+                            text("""
+                            INSERT INTO `得分表` (
+                                `项目ID`, `条文号`, `是否达标`, `得分`, `技术措施`, `评价标准`
+                            )
+                            VALUES (:project_id, :clause_number, :is_achieved, :score, :technical_measures, :standard)
+                            """),
+                            params
                         )
                         app.logger.info(f"插入记录: 影响行数={result.rowcount}")
-                    
-                    # 验证更新是否成功
-                    verify_query = """
-                    SELECT `得分` FROM `得分表`
-                    WHERE `项目ID` = :project_id AND `条文号` = :clause_number AND `评价标准` = :standard
-                    """
-                    result = db.session.execute(
-                        text(verify_query), 
-                        {"project_id": project_id, "clause_number": clause_number, "standard": standard}
-                    )
-                    row = result.fetchone()
-                    
-                    if not row:
-                        raise Exception("验证失败：未找到更新后的记录")
-                    
-                    actual_score = row[0]
-                    app.logger.info(f"验证成功: 条文 {clause_number} 的得分为 {actual_score}")
-                
-                # 清除评分汇总缓存
-                cache_key = f"score_summary_{project_id}_{standard}"
-                if cache.has(cache_key):
-                    cache.delete(cache_key)
-                    app.logger.info(f"清除评分汇总缓存: {cache_key}")
-                
+                    else:
+                        app.logger.info(f"更新记录: 影响行数={result.rowcount}")
+
+                # 读取和写入在同一个事务中，提交后再更新缓存
+                db.session.commit()
+
+                # 该条文在读取时已加锁，提交前没有其他写入，存储值就是本次写入的 stored_score，
+                # 读取原记录（计算汇总增量）和写入需要两条语句，无需第三次查询验证
+                actual_score = stored_score
+
+                # 将得分变化增量应用到评分汇总缓存，无需重新扫描得分表
+                apply_score_summary_delta(project_id, standard, old_rows, new_rows)
+
+                # 得分表和项目表评分都已更新，更新一次数据版本
+                bump_project_data_version(project_id)
+
                 # 清除专业得分缓存
                 specialty_cache_key = get_scores_cache_key('提高级', '建筑专业', project_id, standard)
-                if cache.has(specialty_cache_key):
-                    cache.delete(specialty_cache_key)
-                    app.logger.info(f"清除专业得分缓存: {specialty_cache_key}")
-                
+                delete_cached(cache, specialty_cache_key)
+
                 # 返回成功响应
                 return jsonify({
                     'success': True,
@@ -1858,15 +1928,16 @@ def update_score_direct():
                         'technical_measures': technical_measures
                     }
                 })
-                
-            except Exception as e:
-                # 回滚事务
+
+            except OperationalError as e:
+                # 死锁、锁等待超时等可重试错误：回滚后短暂退避重试
                 db.session.rollback()
                 app.logger.error(f"数据库操作失败: {str(e)}")
                 retry_count += 1
                 if retry_count < max_retries:
                     app.logger.info(f"正在进行第{retry_count}次重试...")
-                    time.sleep(1)  # 等待1秒后重试
+                    # 指数退避加随机抖动（约50ms、100ms），避免长时间占用工作线程
+                    time.sleep(0.05 * (2 ** (retry_count - 1)) * (1 + random.random()))
                 else:
                     app.logger.error("已达到最大重试次数，操作失败")
                     app.logger.error(traceback.format_exc())
@@ -1874,7 +1945,16 @@ def update_score_direct():
                         'success': False,
                         'message': f'数据库操作失败: {str(e)}'
                     }), 500
-    
+            except Exception as e:
+                # 其他错误重试也不会成功，直接返回
+                db.session.rollback()
+                app.logger.error(f"数据库操作失败: {str(e)}")
+                app.logger.error(traceback.format_exc())
+                return jsonify({
+                    'success': False,
+                    'message': f'数据库操作失败: {str(e)}'
+                }), 500
+
     except Exception as e:
         app.logger.error(f"处理请求失败: {str(e)}")
         app.logger.error(traceback.format_exc())
@@ -1882,6 +1962,50 @@ def update_score_direct():
             'success': False,
             'message': f'处理请求失败: {str(e)}'
         }), 500
+# 得分表写入语句，条文已存在时（项目ID、条文号、评价标准相同）直接覆盖
+SCORE_INSERT_SQL = """
+INSERT INTO `得分表` (
+    `项目ID`, `项目名称`, `专业`, `评价等级`, `条文号`, `分类`, `是否达标`, `得分`, `技术措施`, `评价标准`
+) VALUES (:project_id, :project_name, :specialty, :level, :clause_number, :category,
+         :is_achieved, :score, :technical_measures, :standard)
+ON DUPLICATE KEY UPDATE
+    `项目名称` = VALUES(`项目名称`), `专业` = VALUES(`专业`), `评价等级` = VALUES(`评价等级`),
+    `分类` = VALUES(`分类`), `是否达标` = VALUES(`是否达标`), `得分` = VALUES(`得分`),
+    `技术措施` = VALUES(`技术措施`)
+"""
+
+def bulk_insert_scores(score_rows, batch_size=500):
+    """
+    批量写入得分表记录
+
+    每批记录通过一次executemany提交，pymysql会将其合并为一条多行INSERT语句。
+    某一批写入失败时，退回到逐条写入，跳过出错的记录。
+
+    参数:
+        score_rows: 记录参数字典列表，键与SCORE_INSERT_SQL中的参数一致
+        batch_size: 每批记录数
+
+    返回值:
+        成功写入的记录列表
+    """
+    inserted_rows = []
+    for start in range(0, len(score_rows), batch_size):
+        batch = score_rows[start:start + batch_size]
+        try:
+            with db.session.begin_nested():
+                db.session.execute(text(SCORE_INSERT_SQL), batch)
+            inserted_rows.extend(batch)
+        except Exception as batch_error:
+            app.logger.error(f"批量插入评分记录失败，改为逐条插入: {str(batch_error)}")
+            for row in batch:
+                try:
+                    with db.session.begin_nested():
+                        db.session.execute(text(SCORE_INSERT_SQL), row)
+                    inserted_rows.append(row)
+                except Exception as insert_error:
+                    app.logger.error(f"插入评分记录失败: {str(insert_error)}, 条文号: {row.get('clause_number')}")
+    return inserted_rows
+
 # 添加一个函数来生成得分表缓存的键
 def get_scores_cache_key(level, specialty, project_id=None, standard=None):
     """
@@ -2122,15 +2246,12 @@ def get_star_case_scores():
             
             # 提交事务
             db.session.commit()
+            bump_project_data_version(project_id)
             app.logger.info(f"成功插入 {insert_count} 条评分记录, 条文号: {', '.join(saved_clauses[:10])}...(共{len(saved_clauses)}条)")
             
-            # 缓存键
-            cache_key = f"score_summary_{project_id}"
-            
-            # 清除缓存
-            if cache.has(cache_key):
-                cache.delete(cache_key)
-                app.logger.info(f"清除缓存: {cache_key}")
+            # 整表替换后该项目的评分汇总等缓存都需要重新计算
+            cleared_keys = invalidate_tag(cache, project_cache_tag(project_id))
+            app.logger.info(f"清除项目缓存: {', '.join(cleared_keys) or '无'}")
             
             # 返回成功响应
             return jsonify({
@@ -2481,10 +2602,7 @@ def api_get_score_summary():
         # 缓存键
         cache_key = f"score_summary_{project_id}_{project_standard}"
         
-        # 如果强制刷新，清除缓存
-        if force_refresh and cache.has(cache_key):
-            cache.delete(cache_key)
-            app.logger.info(f"清除评分汇总缓存: {cache_key}")
+        # 强制刷新时 get_score_summary 会重新计算并覆盖缓存，无需先删除
         
         # 获取评分汇总数据
         app.logger.info(f"开始获取评分汇总数据")
@@ -2521,6 +2639,226 @@ def api_get_score_summary():
             'message': str(e),
             'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         }), 500
+# 专业名称映射，用于处理数据库中的专业名称与预定义专业名称的不完全匹配
+SCORE_SPECIALTY_MAPPING = {
+    '建筑': '建筑专业',
+    '结构': '结构专业',
+    '给排水': '给排水专业',
+    '电气': '电气专业',
+    '暖通': '暖通专业',
+    '景观': '景观专业',
+    '环境健康与节能': '环境健康与节能专业',
+    '建筑专业': '建筑专业',
+    '结构专业': '结构专业',
+    '给排水专业': '给排水专业',
+    '电气专业': '电气专业',
+    '暖通空调专业': '暖通专业',
+    '暖通专业': '暖通专业',
+    '景观专业': '景观专业'
+}
+
+# 评分汇总中的分类
+SCORE_CATEGORIES = ['安全耐久', '健康舒适', '生活便利', '资源节约', '环境宜居', '提高与创新']
+
+def get_summary_specialties(project_standard):
+    """获取评分汇总包含的专业列表"""
+    specialties = ['建筑专业', '结构专业', '给排水专业', '电气专业', '暖通专业', '景观专业']
+    # 如果是四川省标，添加环境健康与节能专业
+    if project_standard == '四川省标':
+        specialties.append('环境健康与节能专业')
+    return specialties
+
+def map_summary_specialty(specialty):
+    """将得分表中的专业名称映射为评分汇总中的专业名称，无法映射时返回None"""
+    if specialty is None:
+        return None
+    mapped_specialty = SCORE_SPECIALTY_MAPPING.get(specialty)
+    if not mapped_specialty:
+        # 如果没有精确匹配，尝试部分匹配
+        for key, value in SCORE_SPECIALTY_MAPPING.items():
+            if key in specialty or specialty in key:
+                mapped_specialty = value
+                break
+    return mapped_specialty
+
+def get_score_contribution(specialty, category, is_achieved, score, level):
+    """
+    计算一条得分表记录对评分汇总的贡献
+
+    参数顺序与得分表查询列 (专业, 分类, 是否达标, 得分, 评价等级) 一致
+
+    返回值:
+        (汇总专业名称, 分类, 分值)，不计分或无法映射时返回None
+    """
+    mapped_specialty = map_summary_specialty(specialty)
+    if not mapped_specialty:
+        if app.debug and specialty is not None:
+            app.logger.warning(f"未能映射专业名称: {specialty}")
+        return None
+
+    # 处理是否达标字段
+    is_achieved_value = is_achieved.lower() if isinstance(is_achieved, str) else str(is_achieved).lower()
+    is_achieved_flag = is_achieved_value in ['是', 'yes', 'true', '1', 'y']
+
+    # 处理得分字段
+    score_value = 0
+    if score is not None:
+        try:
+            if isinstance(score, (int, float)):
+                score_value = float(score)
+            elif isinstance(score, str) and score.strip():
+                score_value = float(score)
+        except (ValueError, TypeError):
+            # 简化错误处理，不记录详细日志
+            pass
+
+    # 基本级条文必须达标才计分，提高级条文有得分就计分
+    if (level == '基本级' and is_achieved_flag) or (level == '提高级' and score_value > 0):
+        return mapped_specialty, category, score_value
+    return None
+
+def get_evaluation_result(total_score):
+    """根据总分确定评定结果"""
+    if total_score >= 85:
+        return '三星级绿色建筑'
+    elif total_score >= 70:
+        return '二星级绿色建筑'
+    elif total_score >= 55:
+        return '一星级绿色建筑'
+    return '未达标'
+
+def finalize_score_summary(summary_data):
+    """根据分类得分重新计算各专业总分、项目总分和评定结果"""
+    specialty_scores = summary_data['specialty_scores']
+    for specialty, category_scores in summary_data['specialty_scores_by_category'].items():
+        total_score = sum(score for category, score in category_scores.items() if category != '总分')
+        category_scores['总分'] = total_score
+        specialty_scores[specialty] = total_score  # 更新专业总分
+
+    # 计算总分（所有专业分数之和）
+    total_score = sum(specialty_scores.values())
+    summary_data['total_score'] = total_score
+    summary_data['evaluation_result'] = get_evaluation_result(total_score)
+    summary_data['timestamp'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    return summary_data
+
+def apply_score_summary_delta(project_id, project_standard, old_rows, new_rows):
+    """
+    将条文得分的变化增量应用到已缓存的评分汇总，避免重新扫描得分表
+
+    参数:
+        project_id: 项目ID
+        project_standard: 评价标准
+        old_rows: 修改前的记录列表，每条为 (专业, 分类, 是否达标, 得分, 评价等级)
+        new_rows: 修改后的记录列表，格式同上
+
+    返回值:
+        成功应用增量返回True；缓存中没有汇总数据时返回False，由下一次读取重新计算
+
+    项目表评分随汇总一起更新，但不更新项目数据版本：调用方刚修改了得分表，在此之后统一更新一次
+    """
+    cache_key = f"score_summary_{project_id}_{project_standard}"
+    result = {'applied': False, 'changed': False}
+
+    def apply_delta(summary_data):
+        if not summary_data or summary_data.get('project_standard') != project_standard:
+            return None
+
+        by_category = summary_data['specialty_scores_by_category']
+        for rows, sign in ((old_rows, -1), (new_rows, 1)):
+            for row in rows:
+                contribution = get_score_contribution(*row)
+                if not contribution:
+                    continue
+                specialty, category, score_value = contribution
+                category_scores = by_category.get(specialty)
+                # 与全量汇总保持一致：只累计已知专业的已知分类
+                if category_scores is None or category not in category_scores or category == '总分':
+                    continue
+                # 保留4位小数，避免多次增减后出现浮点误差
+                category_scores[category] = round(category_scores[category] + sign * score_value, 4)
+                result['changed'] = True
+
+        result['applied'] = True
+        if result['changed']:
+            finalize_score_summary(summary_data)
+        return summary_data
+
+    try:
+        # 读取、修改、写回在共享缓存的一个写事务中完成，其他工作进程同时保存的增量不会被覆盖
+        summary_data = update_cache_value(cache, cache_key, apply_delta, timeout=28800)
+        if not result['applied']:
+            return False
+        if result['changed']:
+            update_project_scores_efficient(project_id, summary_data, bump_version=False)
+            if app.debug:
+                app.logger.info(f"增量更新评分汇总: 项目ID={project_id}, 总分={summary_data['total_score']}")
+        return True
+    except Exception as e:
+        app.logger.error(f"增量更新评分汇总失败: {str(e)}")
+        # 增量更新失败时清除缓存，下一次读取重新计算
+        cache.delete(cache_key)
+        return False
+
+def compute_score_summary(project_id, project_standard):
+    """从得分表重新计算评分汇总数据，查询失败时返回None"""
+    # 获取所有专业的得分数据
+    specialties = get_summary_specialties(project_standard)
+
+    # 存储各专业得分
+    specialty_scores = {specialty: 0 for specialty in specialties}
+    # 存储各专业按分类的得分
+    specialty_scores_by_category = {}
+
+    # 初始化各专业的分类得分
+    for specialty in specialties:
+        specialty_scores_by_category[specialty] = {category: 0 for category in SCORE_CATEGORIES}
+        specialty_scores_by_category[specialty]['总分'] = 0
+
+    try:
+        # 优化SQL查询：一次获取所有需要的数据
+        sql_query = """
+        SELECT `专业`, `分类`, `是否达标`, `得分`, `评价等级`
+        FROM `得分表`
+        WHERE `项目ID` = :project_id AND `评价标准` = :standard
+        """
+
+        # 执行查询并获取所有结果
+        result = db.session.execute(
+            text(sql_query),
+            {"project_id": project_id, "standard": project_standard}
+        )
+        rows = result.fetchall()
+
+        # 减少日志输出，只记录结果行数
+        if app.debug:
+            app.logger.info(f"查询结果: {len(rows)} 行")
+
+        # 处理查询结果
+        for row in rows:
+            contribution = get_score_contribution(*row)
+            if not contribution:
+                continue
+            mapped_specialty, category, score_value = contribution
+            specialty_scores[mapped_specialty] += score_value
+
+            # 按分类累加得分
+            if category in specialty_scores_by_category[mapped_specialty]:
+                specialty_scores_by_category[mapped_specialty][category] += score_value
+
+        # 构建汇总数据，计算各专业总分、总分和评定结果
+        return finalize_score_summary({
+            'specialty_scores': specialty_scores,
+            'specialty_scores_by_category': specialty_scores_by_category,
+            'project_standard': project_standard
+        })
+
+    except Exception as e:
+        app.logger.error(f"查询得分表失败: {str(e)}")
+        if app.debug:
+            app.logger.error(traceback.format_exc())
+        return None
+
 # 获取评分汇总数据的函数
 def get_score_summary(project_id, force_refresh=False):
     """获取评分汇总数据的函数"""
@@ -2528,183 +2866,37 @@ def get_score_summary(project_id, force_refresh=False):
         # 获取项目信息，确定评价标准
         project = get_project(project_id)
         project_standard = project.standard if project and project.standard else '成都市标'
-        
+
         # 只在强制刷新或开发环境下记录详细日志
         if force_refresh or app.debug:
             app.logger.info(f"获取评分汇总数据: 项目ID={project_id}, 评价标准={project_standard}, 强制刷新={force_refresh}")
-        
+
         # 构建缓存键
         cache_key = f"score_summary_{project_id}_{project_standard}"
-        
-        # 标记是否需要更新项目表
-        need_update_project = force_refresh
-        summary_data = None
-        
-        # 如果强制刷新或缓存中没有数据，则重新计算
-        if force_refresh or not cache.get(cache_key):
-            # 专业名称映射，用于处理数据库中的专业名称与预定义专业名称的不完全匹配
-            specialty_mapping = {
-                '建筑': '建筑专业',
-                '结构': '结构专业',
-                '给排水': '给排水专业',
-                '电气': '电气专业',
-                '暖通': '暖通专业',
-                '景观': '景观专业',
-                '环境健康与节能': '环境健康与节能专业',
-                '建筑专业': '建筑专业',
-                '结构专业': '结构专业',
-                '给排水专业': '给排水专业',
-                '电气专业': '电气专业',
-                '暖通空调专业': '暖通专业',
-                '暖通专业': '暖通专业',
-                '景观专业': '景观专业'
-            }
-            
-            # 获取所有专业的得分数据
-            specialties = ['建筑专业', '结构专业', '给排水专业', '电气专业', '暖通专业', '景观专业']
-            
-            # 如果是四川省标，添加环境健康与节能专业
-            if project_standard == '四川省标':
-                specialties.append('环境健康与节能专业')
-            
-            # 存储各专业得分
-            specialty_scores = {specialty: 0 for specialty in specialties}
-            # 存储各专业按分类的得分
-            specialty_scores_by_category = {}
-            
-            # 初始化各专业的分类得分
-            for specialty in specialties:
-                specialty_scores_by_category[specialty] = {
-                    '安全耐久': 0,
-                    '健康舒适': 0,
-                    '生活便利': 0,
-                    '资源节约': 0,
-                    '环境宜居': 0,
-                    '提高与创新': 0,
-                    '总分': 0
-                }
-            
-            try:
-                # 优化SQL查询：一次获取所有需要的数据
-                sql_query = """
-                SELECT `专业`, `分类`, `是否达标`, `得分`, `评价等级`
-                FROM `得分表`
-                WHERE `项目ID` = :project_id AND `评价标准` = :standard
-                """
-                
-                # 执行查询并获取所有结果
-                result = db.session.execute(
-                    text(sql_query), 
-                    {"project_id": project_id, "standard": project_standard}
-                )
-                rows = result.fetchall()
-                
-                # 减少日志输出，只记录结果行数
-                if app.debug:
-                    app.logger.info(f"查询结果: {len(rows)} 行")
-                
-                # 处理查询结果
-                for row in rows:
-                    specialty = row[0]
-                    category = row[1]
-                    is_achieved = row[2]
-                    score = row[3]
-                    level = row[4]
-                    
-                    # --- 添加检查 --- 
-                    if specialty is None:
-                        # if app.debug:
-                        #     app.logger.warning(f"跳过处理: 项目ID={project_id}, 条文评分记录的专业字段为None")
-                        continue # 跳过这条记录
-                    # --- 检查结束 ---
-                    
-                    # 减少日志记录，提高性能
-                    # 映射专业名称
-                    mapped_specialty = specialty_mapping.get(specialty)
-                    if not mapped_specialty:
-                        # 如果没有精确匹配，尝试部分匹配
-                        for key, value in specialty_mapping.items():
-                            if key in specialty or specialty in key:
-                                mapped_specialty = value
-                                break
-                    
-                    # 如果仍然没有匹配，跳过
-                    if not mapped_specialty:
-                        if app.debug:
-                            app.logger.warning(f"未能映射专业名称: {specialty}")
-                        continue
-                    
-                    # 处理是否达标字段
-                    is_achieved_value = is_achieved.lower() if isinstance(is_achieved, str) else str(is_achieved).lower()
-                    is_achieved_flag = is_achieved_value in ['是', 'yes', 'true', '1', 'y']
-                    
-                    # 处理得分字段
-                    score_value = 0
-                    if score is not None:
-                        try:
-                            if isinstance(score, (int, float)):
-                                score_value = float(score)
-                            elif isinstance(score, str) and score.strip():
-                                score_value = float(score)
-                        except (ValueError, TypeError):
-                            # 简化错误处理，不记录详细日志
-                            pass
-                    
-                    # 基本级条文必须达标才计分，提高级条文有得分就计分
-                    if (level == '基本级' and is_achieved_flag) or (level == '提高级' and score_value > 0):
-                        specialty_scores[mapped_specialty] += score_value
-                        
-                        # 按分类累加得分
-                        if category in specialty_scores_by_category[mapped_specialty]:
-                            specialty_scores_by_category[mapped_specialty][category] += score_value
-                
-                # 计算各专业的总分
-                for specialty in specialties:
-                    category_scores = specialty_scores_by_category[specialty]
-                    total_score = sum(score for category, score in category_scores.items() if category != '总分')
-                    category_scores['总分'] = total_score
-                    specialty_scores[specialty] = total_score  # 更新专业总分
-                
-                # 计算总分（所有专业分数之和）
-                total_score = sum(specialty_scores.values())
-                
-                # 根据总分确定评定结果
-                if total_score >= 85:
-                    evaluation_result = '三星级绿色建筑'
-                elif total_score >= 70:
-                    evaluation_result = '二星级绿色建筑'
-                elif total_score >= 55:
-                    evaluation_result = '一星级绿色建筑'
-                else:
-                    evaluation_result = '未达标'
-                
-                # 构建汇总数据
-                summary_data = {
-                    'specialty_scores': specialty_scores,
-                    'specialty_scores_by_category': specialty_scores_by_category,
-                    'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                    'total_score': total_score,
-                    'project_standard': project_standard,
-                    'evaluation_result': evaluation_result
-                }
-                
+
+        # 标记是否重新计算了汇总数据，重新计算后需要更新项目表
+        computed = []
+
+        def compute_summary():
+            summary = compute_score_summary(project_id, project_standard)
+            computed.append(summary is not None)
+            return summary
+
+        if force_refresh:
+            summary_data = compute_summary()
+            if summary_data:
                 # 缓存结果 - 设置较长的过期时间（8小时）
-                cache.set(cache_key, summary_data, timeout=28800)
-                
-                # 一定需要更新项目表
-                need_update_project = True
-                
-            except Exception as e:
-                app.logger.error(f"查询得分表失败: {str(e)}")
-                if app.debug:
-                    app.logger.error(traceback.format_exc())
-                need_update_project = False
+                set_cached(cache, cache_key, summary_data, timeout=28800, tags=[project_cache_tag(project_id)])
         else:
-            # 从缓存中获取数据
-            if app.debug:
+            # 一次读取缓存，缺失时计算并写入；多个工作进程同时缺失时只计算一次
+            summary_data = get_or_compute(
+                cache, cache_key, compute_summary, timeout=28800, tags=[project_cache_tag(project_id)],
+                metric_name='score_summary'
+            )
+            if not computed and app.debug:
                 app.logger.info(f"从缓存中获取评分汇总数据: {cache_key}")
-            summary_data = cache.get(cache_key)
-            
+        need_update_project = any(computed)
+
         # 如果需要更新项目表，并且有有效的汇总数据
         if need_update_project and summary_data and project_id:
             try:
@@ -2713,9 +2905,9 @@ def get_score_summary(project_id, force_refresh=False):
             except Exception as e:
                 # 仅记录错误，不影响API响应
                 app.logger.error(f"更新项目表评分数据时出错: {str(e)}")
-                
+
         return summary_data
-    
+
     except Exception as e:
         app.logger.error(f"获取评分汇总数据失败: {str(e)}")
         if app.debug:
@@ -2730,8 +2922,12 @@ def get_score_summary(project_id, force_refresh=False):
             'evaluation_result': '未评定'
         }
 
-def update_project_scores_efficient(project_id, scores):
-    """高效更新项目表中的评分数据，不使用with_for_update以避免锁定延迟"""
+def update_project_scores_efficient(project_id, scores, bump_version=True):
+    """
+    高效更新项目表中的评分数据，不使用with_for_update以避免锁定延迟
+
+    bump_version 为 False 时由调用方更新项目数据版本（调用方本身也修改了得分表）
+    """
     try:
         # 使用单独的会话避免锁定主会话
         project = db.session.get(Project, project_id)
@@ -2777,8 +2973,12 @@ def update_project_scores_efficient(project_id, scores):
         # 设置评定结果
         project.evaluation_result = scores.get('evaluation_result', '未评定')
         
-        # 保存更改
+        # 保存更改；评分汇总缓存未命中时也会重新计算并调用这里，项目评分没有变化时不更新数据版本，
+        # 否则每次读取汇总都会使全部导出缓存失效
+        changed = db.session.is_modified(project)
         db.session.commit()
+        if changed and bump_version:
+            bump_project_data_version(project_id)
         
         if app.debug:
             app.logger.debug(f"成功更新项目评分: 项目ID={project_id}, 总分={project.total_score}")
@@ -2811,15 +3011,15 @@ def handle_generate_word():
         # 获取标准参数，默认为成都市标
         standard = data.get('standard', '成都市标')
         
-        # 添加use_cache参数，默认为False，强制从数据库获取最新数据
+        # 导出缓存带有项目数据版本，数据修改后自动失效，可以放心使用缓存
         request_data = {
             'project_id': project_id,
             'standard': standard,
-            'use_cache': False
+            'use_cache': True
         }
         
-        # 调用generate_word函数
-        return generate_word(request_data)
+        # 调用generate_word函数，请求要求后台任务时提交任务后立即返回
+        return run_report('word', lambda: generate_word(request_data))
     except Exception as e:
         app.logger.error(f"处理生成Word请求失败: {str(e)}")
         return jsonify({"error": f"处理请求失败: {str(e)}"}), 500
@@ -2835,23 +3035,26 @@ def generate_decorative_cost_report():
         if not data:
             return jsonify({'error': '没有接收到数据'}), 400
             
-        # 调用新模块中的函数生成文档
-        output_path, error = generate_decorative_cost_report_doc(data, app)
+        def build_report():
+            # 调用新模块中的函数生成文档
+            output_path, error = generate_decorative_cost_report_doc(data, app)
         
-        if error:
-            return jsonify({'error': error}), 500
+            if error:
+                return jsonify({'error': error}), 500
             
-        if not output_path:
-            return jsonify({'error': '生成文档失败'}), 500
+            if not output_path:
+                return jsonify({'error': '生成文档失败'}), 500
             
-        # 获取文件名
-        output_filename = os.path.basename(output_path)
-        
-        # 返回生成的文件
-        return send_file(output_path, 
-                        mimetype='application/vnd.openxmlformats-officedocument.wordprocessingml.document',
-                        as_attachment=True, 
-                        download_name=output_filename)
+            # 获取文件名
+            output_filename = os.path.basename(output_path)
+        
+            # 返回生成的文件
+            return send_file(output_path, 
+                            mimetype='application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+                            as_attachment=True, 
+                            download_name=output_filename)
+
+        return run_report('decorative_cost', build_report)
     
     except Exception as e:
         app.logger.error(f"生成装饰性构件造价比例计算书失败: {str(e)}")
@@ -2874,14 +3077,14 @@ def handle_generate_dwg():
         if not project_id:
             return jsonify({"error": "缺少项目ID参数"}), 400
             
-        # 添加use_cache参数，默认为False，强制从数据库获取最新数据
+        # 导出缓存带有项目数据版本，数据修改后自动失效，可以放心使用缓存
         request_data = {
             'project_id': project_id,
-            'use_cache': False
+            'use_cache': True
         }
         
-        # 调用generate_dwg函数
-        return generate_dwg(request_data)
+        # 调用generate_dwg函数，请求要求后台任务时提交任务后立即返回
+        return run_report('dwg', lambda: generate_dwg(request_data))
     except Exception as e:
         app.logger.error(f"处理生成DWG请求失败: {str(e)}")
         return jsonify({"error": f"处理请求失败: {str(e)}"}), 500
@@ -2996,6 +3199,8 @@ def delete_project_api(project_id):
             # 删除项目
             db.session.delete(project)
             db.session.commit()
+            bump_project_data_version(project_id)
+            invalidate_tag(cache, project_cache_tag(project_id))
             app.logger.info(f"项目 {project_id} 删除成功")
             
             return jsonify({
@@ -3102,17 +3307,63 @@ def save_score():
                 app.logger.error(f"获取项目信息失败: {str(e)}")
         
         try:
+            # 修改前后的记录，用于增量更新评分汇总
+            old_rows = []
+            new_rows = []
+
+            # 先整理所有评分记录，再批量写入，避免逐条往返数据库；
+            # 同一条文提交多次时写入会合并为一行，这里只保留最后一次，评分汇总的增量与表中记录一致
+            rows_by_clause = {}
+            for score_data in scores:
+                # 获取评分数据
+                clause_number = score_data.get('clause_number') or score_data.get('clause')
+
+                # 如果没有条文号，跳过
+                if not clause_number:
+                    continue
+
+                rows_by_clause[clause_number] = {
+                    "project_id": project_id,
+                    "project_name": project_name,
+                    "specialty": specialty,
+                    "level": level,
+                    "clause_number": clause_number,
+                    "category": score_data.get('category'),
+                    "is_achieved": score_data.get('is_achieved'),
+                    "score": score_data.get('score', '0'),
+                    "technical_measures": score_data.get('technical_measures', ''),
+                    "standard": standard
+                }
+            insert_rows = list(rows_by_clause.values())
+            # 记录所有保存的条文号（调试用）
+            saved_clauses = list(rows_by_clause)
+
             # 开始数据库事务
             # 如果提供了项目ID，先删除该项目该专业该级别的所有评分记录
             if project_id:
+                slice_params = {"project_id": project_id, "specialty": specialty, "level": level, "standard": standard}
+                # 原记录包括将被删除的记录，以及本次提交的条文在其他专业或级别下的记录（写入时会被覆盖），
+                # 与删除和写入实际影响的记录一致，评分汇总的增量才准确；加锁读取，提交前其他请求无法修改这些记录
+                clause_params = {f"clause_{index}": clause for index, clause in enumerate(saved_clauses)}
+                clause_condition = ''
+                if clause_params:
+                    clause_condition = f" OR `条文号` IN ({', '.join(':' + name for name in clause_params)})"
+                old_rows_query = f"""
+                SELECT `专业`, `分类`, `是否达标`, `得分`, `评价等级`
+                FROM `得分表`
+                WHERE `项目ID` = :project_id AND `评价标准` = :standard
+                  AND ((`专业` = :specialty AND `评价等级` = :level){clause_condition})
+                {score_row_lock_clause()}"""
+                result = db.session.execute(text(old_rows_query), {**slice_params, **clause_params})
+                old_rows = [tuple(row) for row in result.fetchall()]
+
+                # 与读取原记录使用相同的条件，其他评价标准的记录不受影响
                 delete_query = """
                 DELETE FROM `得分表`
                 WHERE `项目ID` = :project_id AND `专业` = :specialty AND `评价等级` = :level
+                  AND `评价标准` = :standard
                 """
-                result = db.session.execute(
-                    text(delete_query), 
-                    {"project_id": project_id, "specialty": specialty, "level": level}
-                )
+                result = db.session.execute(text(delete_query), slice_params)
                 app.logger.info(f"删除项目 {project_id} 的 {specialty} 专业 {level} 级别的评分记录: {result.rowcount} 条")
             
             # 如果提供了项目名称但没有项目ID，先删除该项目名称该专业该级别的所有评分记录
@@ -3127,92 +3378,44 @@ def save_score():
                 )
                 app.logger.info(f"删除项目 '{project_name}' 的 {specialty} 专业 {level} 级别的评分记录: {result.rowcount} 条")
             
-            # 插入新的评分记录
-            insert_count = 0
-            
-            # 跟踪保存的所有条文号（调试用）
-            saved_clauses = []
-            
-            for score_data in scores:
-                # 获取评分数据
-                clause_number = score_data.get('clause_number') or score_data.get('clause')
-                category = score_data.get('category')
-                is_achieved = score_data.get('is_achieved')
-                score = score_data.get('score', '0')
-                technical_measures = score_data.get('technical_measures', '')
-                
-                # 如果没有条文号，跳过
-                if not clause_number:
-                    continue
-                
-                # 记录所有保存的条文号（调试用）
-                saved_clauses.append(clause_number)
-                
-                # 插入评分记录到得分表
-                insert_query = """
-                INSERT INTO `得分表` (
-                    `项目ID`, `项目名称`, `专业`, `评价等级`, `条文号`, `分类`, `是否达标`, `得分`, `技术措施`, `评价标准`
-                ) VALUES (:project_id, :project_name, :specialty, :level, :clause_number, :category, 
-                         :is_achieved, :score, :technical_measures, :standard)
-                """
-                
-                try:
-                    db.session.execute(
-                        text(insert_query),
-                        {
-                            "project_id": project_id,
-                            "project_name": project_name,
-                            "specialty": specialty,
-                            "level": level,
-                            "clause_number": clause_number,
-                            "category": category,
-                            "is_achieved": is_achieved,
-                            "score": score,
-                            "technical_measures": technical_measures,
-                            "standard": standard
-                        }
-                    )
-                    
-                    insert_count += 1
-                except Exception as insert_error:
-                    app.logger.error(f"插入评分记录失败: {str(insert_error)}, 条文号: {clause_number}")
-                    continue
-            
+            # 批量插入评分记录到得分表
+            inserted_rows = bulk_insert_scores(insert_rows)
+            insert_count = len(inserted_rows)
+            new_rows = [
+                (row["specialty"], row["category"], row["is_achieved"], row["score"], row["level"])
+                for row in inserted_rows
+            ]
+
             # 提交事务
             db.session.commit()
             app.logger.info(f"成功插入 {insert_count} 条评分记录, 条文号: {', '.join(saved_clauses[:10])}...(共{len(saved_clauses)}条)")
             
-            # 缓存键
-            cache_key = get_scores_cache_key(level, specialty, project_id, standard)
-            
-            # 清除缓存
-            if cache.has(cache_key):
-                cache.delete(cache_key)
-                app.logger.info(f"清除缓存: {cache_key}")
-            
             # 清除所有相关缓存，确保评分信息完全刷新
-            cache_keys_to_clear = []
+            cache_keys_to_clear = [get_scores_cache_key(level, specialty, project_id, standard)]
             
             # 1. 清除原始专业名称的缓存
             if original_specialty != specialty:
                 original_cache_key = get_scores_cache_key(level, original_specialty, project_id, standard)
                 cache_keys_to_clear.append(original_cache_key)
             
-            # 2. 清除评分汇总缓存
-            summary_cache_key = f"score_summary_{project_id}"
-            cache_keys_to_clear.append(summary_cache_key)
-            
+            # 2. 将本次保存的增量应用到评分汇总缓存
+            if project_id:
+                if insert_count < len(insert_rows):
+                    # 有记录写入失败被跳过时，被覆盖的原记录无法确定，直接清除汇总，下次读取重新计算
+                    delete_cached(cache, f"score_summary_{project_id}_{standard}")
+                else:
+                    apply_score_summary_delta(project_id, standard, old_rows, new_rows)
+            # 得分表和项目表评分都已更新，更新一次数据版本
+            bump_project_data_version(project_id)
+
             # 3. 清除所有专业的缓存
             all_specialties = ['建筑', '结构', '给排水', '暖通', '电气', '智能化', '景观']
             for other_specialty in all_specialties:
                 other_cache_key = get_scores_cache_key(level, other_specialty, project_id, standard)
                 cache_keys_to_clear.append(other_cache_key)
                 
-            # 批量清除所有相关缓存
-            for key in cache_keys_to_clear:
-                if cache.has(key):
-                    cache.delete(key)
-                    app.logger.info(f"清除相关缓存: {key}")
+            # 批量清除所有相关缓存，一次删除，不存在的键直接忽略
+            delete_cached(cache, *cache_keys_to_clear)
             
             # 返回成功响应
             return jsonify({
@@ -3334,14 +3537,14 @@ def handle_self_assessment_report():
         if not project_id:
             return jsonify({"error": "缺少项目ID参数"}), 400
         
-        # 添加use_cache参数，默认为False，强制从数据库获取最新数据
+        # 导出缓存带有项目数据版本，数据修改后自动失效，可以放心使用缓存
         request_data = {
             'project_id': project_id,
-            'use_cache': False
+            'use_cache': True
         }
         
-        # 调用generate_self_assessment_report函数
-        return generate_self_assessment_report(request_data)
+        # 调用generate_self_assessment_report函数，请求要求后台任务时提交任务后立即返回
+        return run_report('self_assessment', lambda: generate_self_assessment_report(request_data))
     except Exception as e:
         app.logger.error(f"处理生成绿建自评估报告请求失败: {str(e)}")
         return jsonify({"error": f"处理请求失败: {str(e)}"}), 500
@@ -3351,6 +3554,22 @@ def handle_generateljzpwb():
     处理生成绿建专篇文本的请求 (multipart/form-data)
     """
     image_path = None # 初始化 image_path
+    cleanup_handed_off = False # 图片交给 run_report 后由其负责清理（后台任务结束后才能删除）
+
+    def cleanup_image():
+        # 清理临时保存的图片（如果已保存）
+        if image_path and os.path.exists(image_path):
+            try:
+                os.remove(image_path)
+                app.logger.info(f"已清理临时效果图: {image_path}")
+                # 尝试删除临时目录（如果为空）
+                temp_dir = os.path.dirname(image_path)
+                if not os.listdir(temp_dir):
+                    os.rmdir(temp_dir)
+                    app.logger.info(f"已清理临时目录: {temp_dir}")
+            except Exception as cleanup_error:
+                app.logger.warning(f"清理临时文件/目录失败: {cleanup_error}")
+
     try:
         # 检查请求类型
         if not request.content_type.startswith('multipart/form-data'):
@@ -3398,12 +3617,13 @@ def handle_generateljzpwb():
             'renewable_energy_use': renewable_energy_use, # 传递可再生能源利用情况
             'structure_form': structure_form, # <<< 传递结构形式
             'effect_image_path': image_path, # 传递图片路径
-            'use_cache': False # 强制从数据库获取最新数据
+            'use_cache': True # 缓存按项目数据版本校验
         }
 
         # 调用 export.py 中的实际报告生成函数
-        # 它会处理数据获取、模板填充和文件发送
-        return generate_generateljzpwb(report_data)
+        # 它会处理数据获取、模板填充和文件发送；请求要求后台任务时提交任务后立即返回
+        cleanup_handed_off = True
+        return run_report('ljzpwb', lambda: generate_generateljzpwb(report_data), cleanup=cleanup_image)
 
     except Exception as e:
         error_msg = f"处理生成绿建专篇文本请求失败: {str(e)}"
@@ -3411,18 +3631,24 @@ def handle_generateljzpwb():
         app.logger.error(traceback.format_exc())
         return jsonify({"error": error_msg}), 500
     finally:
-        # 清理临时保存的图片（如果已保存）
-        if image_path and os.path.exists(image_path):
-            try:
-                os.remove(image_path)
-                app.logger.info(f"已清理临时效果图: {image_path}")
-                # 尝试删除临时目录（如果为空）
-                temp_dir = os.path.dirname(image_path)
-                if not os.listdir(temp_dir):
-                    os.rmdir(temp_dir)
-                    app.logger.info(f"已清理临时目录: {temp_dir}")
-            except Exception as cleanup_error:
-                app.logger.warning(f"清理临时文件/目录失败: {cleanup_error}")
+        if not cleanup_handed_off:
+            cleanup_image()
+
+@app.route('/api/report_jobs/<job_id>', methods=['GET'])
+def get_report_job_status(job_id):
+    """查询报告后台任务的状态和进度"""
+    job = get_report_job(job_id)
+    if not job:
+        return jsonify({'success': False, 'error': '任务不存在或已过期'}), 404
+    return jsonify({'success': True, **report_job_payload(job)})
+
+@app.route('/api/report_jobs/<job_id>/download', methods=['GET'])
+def download_report_job(job_id):
+    """下载报告后台任务生成的文件"""
+    job = get_report_job(job_id)
+    if not job:
+        return jsonify({'success': False, 'error': '任务不存在或已过期'}), 404
+    return send_report_job_file(job)
 
 # 添加路由处理公共交通报告生成请求
 @app.route('/generate_transport_report', methods=['POST'])
@@ -3439,72 +3665,75 @@ def handle_transport_report():
         app.logger.info(f"拷贝后的 project_info: {data_for_report.get('project_info')}")
         # --- 使用拷贝进行后续处理 --- 
         
-        # 调用报告生成函数 (传入拷贝)
-        output_path = generate_transport_report(data_for_report)
+        def build_report():
+            # 调用报告生成函数 (传入拷贝)
+            output_path = generate_transport_report(data_for_report)
         
-        # 检查生成的文件是否存在
-        if not output_path or not os.path.exists(output_path):
-            # 添加更详细的日志
-            app.logger.error(f"报告生成函数返回无效路径或文件不存在: {output_path}")
-            return jsonify({'success': False, 'error': '报告生成失败，文件未创建'}), 500
+            # 检查生成的文件是否存在
+            if not output_path or not os.path.exists(output_path):
+                # 添加更详细的日志
+                app.logger.error(f"报告生成函数返回无效路径或文件不存在: {output_path}")
+                return jsonify({'success': False, 'error': '报告生成失败，文件未创建'}), 500
         
-        # 获取文件名为项目名称加报告类型
-        file_name = os.path.basename(output_path)
+            # 获取文件名为项目名称加报告类型
+            file_name = os.path.basename(output_path)
         
-        try:
-            # 尝试获取项目名称来为文件命名 (从原始 data 或拷贝 data_for_report 都可以，因为拷贝发生在 info 获取前)
-            # 但为了清晰，我们用原始 data (虽然理论上拷贝时 project_info 应该还是空的)
-            project_info = data.get('project_info', {}) 
-            project_name = ""
-            if isinstance(project_info, dict):
-                project_name = project_info.get('项目名称') or project_info.get('projectName') or ""
+            try:
+                # 尝试获取项目名称来为文件命名 (从原始 data 或拷贝 data_for_report 都可以，因为拷贝发生在 info 获取前)
+                # 但为了清晰，我们用原始 data (虽然理论上拷贝时 project_info 应该还是空的)
+                project_info = data.get('project_info', {}) 
+                project_name = ""
+                if isinstance(project_info, dict):
+                    project_name = project_info.get('项目名称') or project_info.get('projectName') or ""
             
-            file_name = "公共交通站点分析报告.docx"
+                file_name = "公共交通站点分析报告.docx"
                 
-            app.logger.info(f"准备发送文件：{file_name} (来自路径: {output_path})")
+                app.logger.info(f"准备发送文件：{file_name} (来自路径: {output_path})")
             
-            # 直接发送文件给用户下载
-            try:
-                # 确保文件名是纯ASCII或正确编码的
-                # Flask 2.2.3版本的send_file能够自动处理下载文件名的编码
-                return send_file(
-                    output_path,
-                    as_attachment=True,
-                    download_name=file_name,
-                    mimetype='application/vnd.openxmlformats-officedocument.wordprocessingml.document'
-                )
-            except Exception as dlerr:
-                app.logger.error(f"直接发送文件失败: {str(dlerr)}")
-                # 尝试更简单的方式，让Flask自动处理文件名编码
-                return send_file(
-                    output_path,
-                    as_attachment=True
-                )
+                # 直接发送文件给用户下载
+                try:
+                    # 确保文件名是纯ASCII或正确编码的
+                    # Flask 2.2.3版本的send_file能够自动处理下载文件名的编码
+                    return send_file(
+                        output_path,
+                        as_attachment=True,
+                        download_name=file_name,
+                        mimetype='application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+                    )
+                except Exception as dlerr:
+                    app.logger.error(f"直接发送文件失败: {str(dlerr)}")
+                    # 尝试更简单的方式，让Flask自动处理文件名编码
+                    return send_file(
+                        output_path,
+                        as_attachment=True
+                    )
             
-        except Exception as file_error:
-            app.logger.error(f"发送文件失败: {str(file_error)}")
-            app.logger.error(traceback.format_exc())
+            except Exception as file_error:
+                app.logger.error(f"发送文件失败: {str(file_error)}")
+                app.logger.error(traceback.format_exc())
             
-            # 发送失败时回退到旧方式 - 通过URL方式
-            # 复制到static/exports目录
-            if not os.path.exists('static/exports'):
-                os.makedirs('static/exports', exist_ok=True)
+                # 发送失败时回退到旧方式 - 通过URL方式
+                # 复制到static/exports目录
+                if not os.path.exists('static/exports'):
+                    os.makedirs('static/exports', exist_ok=True)
                 
-            target_path = os.path.join('static/exports', file_name)
-            import shutil
-            shutil.copy2(output_path, target_path)
+                target_path = os.path.join('static/exports', file_name)
+                import shutil
+                shutil.copy2(output_path, target_path)
             
-            # 构建文件URL
-            file_url = '/static/exports/' + file_name
+                # 构建文件URL
+                file_url = '/static/exports/' + file_name
             
-            app.logger.info(f"使用备用方式发送文件，URL: {file_url}")
+                app.logger.info(f"使用备用方式发送文件，URL: {file_url}")
             
-            # 返回文件URL
-            return jsonify({
-                'success': True,
-                'file_url': file_url,
-                'message': '公共交通分析报告生成成功(使用URL方式)'
-            })
+                # 返回文件URL
+                return jsonify({
+                    'success': True,
+                    'file_url': file_url,
+                    'message': '公共交通分析报告生成成功(使用URL方式)'
+                })
+
+        return run_report('transport', build_report)
     
     except Exception as e:
         app.logger.error(f"生成公共交通分析报告失败: {str(e)}")
@@ -3747,8 +3976,8 @@ from datetime import timedelta
 def generate_share_link(project_id):
     try:
         # 检查是否为项目创建者或有管理权限的协作者
-        permissions = get_project_permissions(project_id)
-        if not permissions or permissions['permissions'] != '管理':
+        permission = resolve_project_permission(project_id)
+        if not permission or not permission.can_manage:
             return jsonify({'error': '您没有权限分享该项目'}), 403
         
         data = request.get_json()
@@ -3842,6 +4071,7 @@ def join_project_page():
         # invitation.is_active = False
         
         db.session.commit()
+        invalidate_project_permissions(invitation.project_id)
         flash(f'您已成功加入项目：{project.name}', 'success')
         return redirect(url_for('project_detail', project_id=invitation.project_id))
     except Exception as e:
@@ -3896,6 +4126,7 @@ def login():
                     try:
                         db.session.add(collaborator)
                         db.session.commit()
+                        invalidate_project_permissions(invitation.project_id)
                         redirect_url = url_for('project_detail', project_id=invitation.project_id)
                     except Exception as e:
                         db.session.rollback()
@@ -3923,8 +4154,8 @@ def login():
 def remove_collaborator(project_id, collaborator_id):
     try:
         # 检查是否为项目创建者或有管理权限的协作者
-        permissions = get_project_permissions(project_id)
-        if not permissions or permissions['permissions'] != '管理':
+        permission = resolve_project_permission(project_id)
+        if not permission or not permission.can_manage:
             return jsonify({'error': '您没有权限管理协作者'}), 403
         
         # 获取协作者信息
@@ -3941,6 +4172,7 @@ def remove_collaborator(project_id, collaborator_id):
         # 删除协作者
         db.session.delete(collaborator)
         db.session.commit()
+        invalidate_project_permissions(project_id)
         
         return jsonify({
             'success': True,
@@ -3958,8 +4190,8 @@ def remove_collaborator(project_id, collaborator_id):
 def update_collaborator_permissions(project_id, collaborator_id):
     try:
         # 检查是否为项目创建者或有管理权限的协作者
-        permissions = get_project_permissions(project_id)
-        if not permissions or permissions['permissions'] != '管理':
+        permission = resolve_project_permission(project_id)
+        if not permission or not permission.can_manage:
             return jsonify({'error': '您没有权限管理协作者'}), 403
         
         data = request.get_json()
@@ -3982,6 +4214,7 @@ def update_collaborator_permissions(project_id, collaborator_id):
         # 更新权限
         collaborator.permissions = new_permissions
         db.session.commit()
+        invalidate_project_permissions(project_id)
         
         return jsonify({
             'success': True,
@@ -4000,8 +4233,8 @@ def update_collaborator_permissions(project_id, collaborator_id):
 def get_project_invitations(project_id):
     try:
         # 检查是否为项目创建者或有管理权限的协作者
-        permissions = get_project_permissions(project_id)
-        if not permissions or permissions['permissions'] != '管理':
+        permission = resolve_project_permission(project_id)
+        if not permission or not permission.can_manage:
             return jsonify({'error': '您没有权限查看邀请链接'}), 403
         
         # 获取项目的所有活跃邀请
@@ -4043,8 +4276,8 @@ def get_project_invitations(project_id):
 def revoke_invitation(project_id, invitation_id):
     try:
         # 检查是否为项目创建者或有管理权限的协作者
-        permissions = get_project_permissions(project_id)
-        if not permissions or permissions['permissions'] != '管理':
+        permission = resolve_project_permission(project_id)
+        if not permission or not permission.can_manage:
             return jsonify({'error': '您没有权限撤销邀请链接'}), 403
         
         # 获取邀请信息
@@ -4094,6 +4327,7 @@ def leave_project(project_id):
         # 删除协作者记录
         db.session.delete(collaborator)
         db.session.commit()
+        invalidate_project_permissions(project_id)
         
         return jsonify({
             'success': True,
@@ -4107,33 +4341,16 @@ def leave_project(project_id):
 
 # 获取用户对项目的权限
 def get_project_permissions(project_id):
-    """获取当前用户对项目的权限"""
+    """
+    获取当前用户对项目的权限
+
+    返回值:
+        {'role': 角色, 'permissions': 权限} 字典，无权访问时返回None；
+        需要判断权限的代码可以直接使用 resolve_project_permission 返回的 ProjectPermission 对象
+    """
     try:
-        user_id = session.get('user_id')
-        if not user_id:
-            return None
-        
-        # 检查是否为项目创建者
-        project = Project.query.filter_by(id=project_id, user_id=user_id).first()
-        if project:
-            return {
-                'role': '创建者',
-                'permissions': '管理'  # 创建者拥有最高权限
-            }
-        
-        # 检查是否为项目协作者
-        collaborator = ProjectCollaborator.query.filter_by(
-            project_id=project_id, 
-            user_id=user_id
-        ).first()
-        
-        if collaborator:
-            return {
-                'role': collaborator.role,
-                'permissions': collaborator.permissions
-            }
-        
-        return None
+        permission = resolve_project_permission(project_id)
+        return permission.to_dict() if permission else None
     except Exception as e:
         print(f"获取项目权限失败: {str(e)}")
         return None
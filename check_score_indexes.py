@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+得分表索引检查脚本
+对评分接口和导出使用的热点查询执行 EXPLAIN，确认它们都命中了索引
+
+用法: python check_score_indexes.py [项目ID]
+"""
+
+import sys
+from sqlalchemy import text
+from app import app
+from models import db
+
+# 热点查询：名称 -> (SQL, 额外参数)
+HOT_QUERIES = {
+    '评分汇总 get_score_summary': (
+        """
+        SELECT `专业`, `分类`, `是否达标`, `得分`, `评价等级`
+        FROM `得分表`
+        WHERE `项目ID` = :project_id AND `评价标准` = :standard
+        """,
+        {}
+    ),
+    '项目评分 get_project_scores': (
+        """
+        SELECT `条文号`, `分类`, `是否达标`, `得分`, `技术措施`, `专业`, `评价等级`
+        FROM `得分表`
+        WHERE `项目ID` = :project_id AND `评价等级` = :level AND `专业` = :specialty
+        """,
+        {'level': '提高级', 'specialty': '建筑'}
+    ),
+    '条文评分 get_score_by_clause': (
+        """
+        SELECT `得分` FROM `得分表`
+        WHERE `项目ID` = :project_id AND `条文号` = :clause_number AND `评价标准` = :standard
+        """,
+        {'clause_number': '1.0.1'}
+    ),
+    '保存评分 save_score': (
+        """
+        SELECT `专业`, `分类`, `是否达标`, `得分`, `评价等级`
+        FROM `得分表`
+        WHERE `项目ID` = :project_id AND `专业` = :specialty AND `评价等级` = :level
+          AND `评价标准` = :standard
+        """,
+        {'level': '提高级', 'specialty': '建筑'}
+    ),
+    '导出 export': (
+        """
+        SELECT `条文号`, `分类`, `是否达标`, `得分`, `技术措施`
+        FROM `得分表`
+        WHERE `项目ID` = :project_id
+        ORDER BY `条文号`
+        """,
+        {}
+    ),
+}
+
+
+def check_score_indexes(project_id):
+    """执行 EXPLAIN 检查热点查询，返回未使用索引的查询名称列表"""
+    failed = []
+    with app.app_context():
+        standard = db.session.execute(
+            text("SELECT `standard` FROM `projects` WHERE `id` = :project_id"),
+            {'project_id': project_id}
+        ).scalar() or '成都市标'
+
+        for name, (sql, extra_params) in HOT_QUERIES.items():
+            params = {'project_id': project_id, 'standard': standard}
+            params.update(extra_params)
+            rows = db.session.execute(text('EXPLAIN ' + sql), params).mappings().all()
+            for row in rows:
+                key = row.get('key')
+                print(f"{name}: type={row.get('type')}, key={key}, rows={row.get('rows')}, Extra={row.get('Extra')}")
+                if not key or row.get('type') == 'ALL':
+                    failed.append(name)
+    return failed
+
+
+if __name__ == '__main__':
+    project_id = int(sys.argv[1]) if len(sys.argv) > 1 else 1
+    failed = check_score_indexes(project_id)
+    if failed:
+        print(f"以下查询未使用索引: {', '.join(failed)}")
+        print("请执行 flask db upgrade 创建得分表索引")
+        sys.exit(1)
+    print("得分表热点查询均已使用索引")
@@ -5,12 +5,22 @@ from dotenv import load_dotenv
 from docx import Document
 from word_template import process_template, replace_placeholders
 import json
+import copy
+import time
+import threading
+import uuid
+import zipfile
 import traceback
 from sqlalchemy import text
 import pymysql
 from models import db
+from utils.file_retention import mark_file_used
+from utils.dwg_cache import get_dwg_cache_key, get_cached_dwg, store_dwg
+from utils.report_jobs import report_job_progress
+from utils.request_metrics import record_cache_access
 from datetime import datetime
-from update_dwg_attribute import update_attribute_text # 导入本地DWG处理函数
+from update_dwg_attribute import update_attribute_text, submit_dwg_job # 导入本地DWG处理函数
+from utils.dxf_attribute_writer import resolve_dwg_backend, update_attribute_text_dxf, DWG_BACKEND_DXF
 from urllib.parse import quote # 添加导入
 import openpyxl
 from io import BytesIO
@@ -83,6 +93,303 @@ def get_db_connection():
 
 from models import db
 
+# 项目导出字段：(projects表列名, 导出数据键名, 格式)
+# 格式: id -> str(值 or '')，text -> 值 or ''，number -> str(值 or '0')，datetime -> '%Y-%m-%d %H:%M:%S'
+PROJECT_EXPORT_FIELDS = [
+    ('id', '项目ID', 'id'),
+    ('user_id', '用户ID', 'id'),
+    ('name', '项目名称', 'text'),
+    ('code', '项目编号', 'text'),
+    ('construction_unit', '建设单位', 'text'),
+    ('design_unit', '设计单位', 'text'),
+    ('location', '项目地点', 'text'),
+    ('building_area', '建筑面积', 'number'),
+    ('standard', '评价标准', 'text'),
+    ('building_type', '建筑类型', 'text'),
+    ('created_at', '创建时间', 'datetime'),
+    ('climate_zone', '气候区划', 'text'),
+    ('star_rating_target', '星级目标', 'text'),
+    ('total_land_area', '总用地面积', 'number'),
+    ('total_building_area', '总建筑面积', 'number'),
+    ('above_ground_area', '地上建筑面积', 'number'),
+    ('underground_area', '地下建筑面积', 'number'),
+    ('building_height', '建筑高度', 'number'),
+    ('building_floors', '建筑层数', 'text'),
+    ('underground_floor_area', '地下一层建筑面积', 'number'),
+    ('ground_parking_spaces', '地面停车位数量', 'number'),
+    ('plot_ratio', '容积率', 'number'),
+    ('building_base_area', '建筑基底面积', 'number'),
+    ('building_density', '建筑密度', 'number'),
+    ('green_area', '绿地面积', 'number'),
+    ('green_ratio', '绿地率', 'number'),
+    ('residential_units', '住宅户数', 'number'),
+    ('air_conditioning_type', '空调类型', 'text'),
+    ('average_floors', '平均层数', 'text'),
+    ('has_garbage_room', '有无垃圾用房', 'text'),
+    ('has_elevator', '有无电梯', 'text'),
+    ('has_underground_garage', '有无地下车库', 'text'),
+    ('construction_type', '建设情况', 'text'),
+    ('has_water_landscape', '有无景观水体', 'text'),
+    ('is_fully_decorated', '是否全装修', 'text'),
+    ('public_building_type', '公建类型', 'text'),
+    ('public_green_space', '绿地向公众开放', 'text'),
+    ('architecture_score', '建筑总分', 'number'),
+    ('structure_score', '结构总分', 'number'),
+    ('water_supply_score', '给排水总分', 'number'),
+    ('electrical_score', '电气总分', 'number'),
+    ('hvac_score', '暖通总分', 'number'),
+    ('landscape_score', '景观总分', 'number'),
+    ('env_health_energy_score', '环境健康与节能总分', 'number'),
+    ('env_health_energy_innovation_score', '环境健康与节能创新总分', 'number'),
+    ('architecture_innovation_score', '建筑创新总分', 'number'),
+    ('structure_innovation_score', '结构创新总分', 'number'),
+    ('water_supply_innovation_score', '给排水创新总分', 'number'),
+    ('electrical_innovation_score', '电气创新总分', 'number'),
+    ('hvac_innovation_score', '暖通创新总分', 'number'),
+    ('landscape_innovation_score', '景观创新总分', 'number'),
+    ('safety_durability_score', '安全耐久总分', 'number'),
+    ('health_comfort_score', '健康舒适总分', 'number'),
+    ('life_convenience_score', '生活便利总分', 'number'),
+    ('resource_saving_score', '资源节约总分', 'number'),
+    ('environment_livability_score', '环境宜居总分', 'number'),
+    ('improvement_innovation_score', '提高与创新总分', 'number'),
+    ('total_score', '项目总分', 'number'),
+    ('evaluation_result', '评定结果', 'text'),
+]
+
+PROJECT_EXPORT_SQL = (
+    "SELECT " + ", ".join(f"p.{column}" for column, _, _ in PROJECT_EXPORT_FIELDS)
+    + " FROM projects p WHERE p.id = :project_id"
+)
+
+SCORE_EXPORT_SQL = """
+    SELECT 条文号, 分类, 是否达标, 得分, 技术措施
+    FROM 得分表
+    WHERE 项目ID = :project_id
+    ORDER BY 条文号
+"""
+
+# 进程内的项目导出数据快照，按项目数据版本区分，版本不变时多次导出共用一次查询
+EXPORT_DATA_MEMO_MAX = 64
+_export_data_memo = {}
+_export_data_memo_lock = threading.Lock()
+
+# 项目数据版本文件目录，所有工作进程共享；得分表或项目信息变化时更新版本
+PROJECT_VERSION_DIR = os.path.join('temp', 'versions')
+
+
+def _format_export_value(value, kind):
+    """按导出字段格式转换数据库值"""
+    if kind == 'datetime':
+        return value.strftime('%Y-%m-%d %H:%M:%S') if value else ''
+    if kind == 'number':
+        return str(value or '0')
+    if kind == 'id':
+        return str(value or '')
+    return value or ''
+
+
+def get_project_cache_file(project_id):
+    """获取项目导出数据的缓存文件路径"""
+    return os.path.join('temp', f'project_{project_id}_cache.json')
+
+
+def _get_project_version_file(project_id):
+    return os.path.join(PROJECT_VERSION_DIR, f'project_{project_id}.version')
+
+
+def get_project_data_version(project_id):
+    """
+    获取项目数据版本
+
+    返回:
+    - 版本字符串；从未更新过的项目为'0'；读取失败时返回None（不使用缓存）
+    """
+    try:
+        with open(_get_project_version_file(project_id), 'r', encoding='utf-8') as f:
+            return f.read().strip() or '0'
+    except FileNotFoundError:
+        return '0'
+    except Exception as e:
+        print(f"读取项目数据版本失败: {str(e)}")
+        return None
+
+
+def bump_project_data_version(project_id):
+    """
+    更新项目数据版本，使该项目已有的导出快照和缓存文件全部失效
+
+    应在得分表或项目信息的修改提交之后调用。版本文件先写临时文件再替换，
+    其他工作进程不会读到写了一半的内容。
+    """
+    if not project_id:
+        return None
+    version = f"{time.time_ns()}-{uuid.uuid4().hex[:8]}"
+    version_file = _get_project_version_file(project_id)
+    try:
+        os.makedirs(PROJECT_VERSION_DIR, exist_ok=True)
+        tmp_file = f"{version_file}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            f.write(version)
+        os.replace(tmp_file, version_file)
+        return version
+    except Exception as e:
+        print(f"更新项目数据版本失败: {str(e)}")
+        # 无法更新版本时删除缓存文件，避免导出旧数据
+        try:
+            os.remove(get_project_cache_file(project_id))
+        except OSError:
+            pass
+        return None
+
+
+def _fetch_project_export_data(project_id):
+    """从数据库读取项目信息和得分数据，项目不存在时返回None"""
+    print(f"获取项目 {project_id} 的基本信息")
+    project_row = db.session.execute(text(PROJECT_EXPORT_SQL), {"project_id": project_id}).fetchone()
+    if not project_row:
+        print(f"未找到项目数据: ID={project_id}")
+        return None
+
+    project_info = {
+        key: _format_export_value(project_row[index], kind)
+        for index, (_, key, kind) in enumerate(PROJECT_EXPORT_FIELDS)
+    }
+    if not project_info["评价标准"]:
+        project_info["评价标准"] = '成都市标'
+
+    print(f"获取项目 {project_id} 的得分数据")
+    score_rows = db.session.execute(text(SCORE_EXPORT_SQL), {"project_id": project_id}).fetchall()
+    print(f"获取到 {len(score_rows)} 条得分数据")
+
+    data = [project_info]
+    for score_row in score_rows:
+        data.append({
+            "条文号": score_row[0] or '',
+            "分类": score_row[1] or '',
+            "是否达标": score_row[2] or '',
+            "得分": str(score_row[3] or '0'),
+            "技术措施": score_row[4] or ''
+        })
+    return data
+
+
+def _read_project_cache_file(cache_file, version):
+    """读取导出数据缓存文件，文件不存在、版本不一致或内容无效时返回None"""
+    if not os.path.exists(cache_file):
+        return None
+    try:
+        print(f"从缓存文件加载数据: {cache_file}")
+        with open(cache_file, 'r', encoding='utf-8') as f:
+            cached = json.load(f)
+        # 旧格式缓存（直接保存列表）没有版本信息，视为过期
+        if not isinstance(cached, dict) or cached.get('version') != version:
+            print("缓存数据版本已过期，将从数据库重新获取")
+            return None
+        data = cached.get('data')
+        # 检查缓存数据是否有效
+        if not data or len(data) < 1 or not isinstance(data[0], dict) or not data[0].get("项目名称"):
+            print("缓存数据无效，将从数据库重新获取")
+            return None
+        print("成功从缓存加载数据")
+        mark_file_used(cache_file)
+        return data
+    except Exception as e:
+        print(f"读取缓存文件失败: {str(e)}")
+        return None
+
+
+def _write_project_cache_file(cache_file, version, data):
+    """保存导出数据缓存文件，写入数据版本"""
+    try:
+        os.makedirs('temp', exist_ok=True)
+        tmp_file = f"{cache_file}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump({'version': version, 'data': data}, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_file, cache_file)
+        print(f"数据已保存到缓存: {cache_file}")
+    except Exception as e:
+        print(f"保存缓存失败: {str(e)}")
+
+
+def _remember_export_data(memo_key, data):
+    """记录导出数据快照，同一项目只保留最新版本，超过上限时丢弃最早的记录"""
+    with _export_data_memo_lock:
+        for old_key in [key for key in _export_data_memo if key[0] == memo_key[0] and key[1] != memo_key[1]]:
+            _export_data_memo.pop(old_key, None)
+        _export_data_memo[memo_key] = data
+        while len(_export_data_memo) > EXPORT_DATA_MEMO_MAX:
+            _export_data_memo.pop(next(iter(_export_data_memo)))
+
+
+def invalidate_project_export_data(project_id):
+    """使项目的导出数据快照和缓存文件失效"""
+    bump_project_data_version(project_id)
+
+
+def load_project_export_data(project_id, use_cache=True):
+    """
+    加载项目导出数据，供报审表、自评估报告、绿建专篇和DWG导出共用
+
+    快照和缓存文件都带有项目数据版本（见 bump_project_data_version），
+    版本一致时才会使用，因此修改得分或项目信息后的导出总是最新数据。
+
+    返回的数据格式为列表：第一项是项目信息字典，其余为得分记录字典。
+    每次返回独立的副本，调用方可以直接修改。
+
+    参数:
+    - project_id: 项目ID（导出数据包含项目的全部得分记录，与评价标准无关，所有导出共用同一份快照）
+    - use_cache: 是否允许使用快照和缓存文件；为False时直接查询数据库并刷新快照和缓存文件
+
+    返回:
+    - list 或 None（项目不存在）
+    """
+    # 先读取版本再查询数据库：查询期间若有修改，写入的缓存带的是旧版本，不会被误用
+    version = get_project_data_version(project_id)
+    memo_key = (str(project_id), version)
+    cache_file = get_project_cache_file(project_id)
+    data = None
+
+    if use_cache and version is not None:
+        with _export_data_memo_lock:
+            memo = _export_data_memo.get(memo_key)
+        if memo:
+            print(f"使用项目 {project_id} 的导出数据快照 (版本 {version})")
+            record_cache_access('export_data', True)
+            return copy.deepcopy(memo)
+        data = _read_project_cache_file(cache_file, version)
+        record_cache_access('export_data', bool(data))
+
+    if not data:
+        print("从数据库获取数据...")
+        data = _fetch_project_export_data(project_id)
+        if not data:
+            return None
+        if version is not None:
+            _write_project_cache_file(cache_file, version, data)
+
+    if version is not None:
+        _remember_export_data(memo_key, data)
+    return copy.deepcopy(data)
+
+
+def _add_design_date(data, report_name):
+    """在项目信息中补充设计日期（年月日格式）"""
+    if data and isinstance(data[0], dict) and not data[0].get("设计日期"):
+        current_date = datetime.now().strftime("%Y年%m月%d日")
+        data[0]["设计日期"] = current_date
+        print(f"[export.py] 已自动添加设计日期到{report_name}数据: {current_date}")
+
+
+def _placeholder_output_path(placeholder_result):
+    """replace_placeholders 返回 (输出路径, 模板基础名)，兼容旧的字符串返回值"""
+    if isinstance(placeholder_result, tuple):
+        return placeholder_result[0]
+    if isinstance(placeholder_result, str):
+        return placeholder_result
+    return None
+
+
 def generate_word(request_data):
     """
     生成Word文档的函数
@@ -104,298 +411,88 @@ def generate_word(request_data):
         standard = request_data.get('standard', '成都市标')
         print(f"使用评价标准: {standard}")
 
-        # 尝试从缓存获取数据
-        cache_file = os.path.join('temp', f'project_{project_id}_{standard}_cache.json')
-        data = None
-        use_cache = request_data.get('use_cache', True)
-        
-        if use_cache and os.path.exists(cache_file):
-            try:
-                print(f"从缓存文件加载数据: {cache_file}")
-                with open(cache_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                print("成功从缓存加载数据")
-                
-                # 检查缓存数据是否有效
-                if not data or len(data) < 1 or not isinstance(data[0], dict) or not data[0].get("项目名称"):
-                    print("缓存数据无效，将从数据库重新获取")
-                    data = None
-            except Exception as e:
-                print(f"读取缓存文件失败: {str(e)}")
-                data = None
-
-        # 如果缓存不存在或无效，从数据库获取数据
+        # 获取项目导出数据
+        data = load_project_export_data(project_id, use_cache=request_data.get('use_cache', True))
         if not data:
-            print("从数据库获取数据...")
-            
-            # 获取项目基本信息
-            print(f"获取项目 {project_id} 的基本信息")
-            result = db.session.execute(
-                text("""
-                    SELECT p.id, p.user_id, p.name, p.code, p.construction_unit, p.design_unit, p.location, 
-                           p.building_area, p.standard, p.building_type, p.created_at, p.climate_zone, 
-                           p.star_rating_target, p.total_land_area, p.total_building_area, p.above_ground_area, 
-                           p.underground_area, p.building_height, p.building_floors, p.underground_floor_area, 
-                           p.ground_parking_spaces, p.plot_ratio, p.building_base_area, p.building_density, 
-                           p.green_area, p.green_ratio, p.residential_units, p.air_conditioning_type,
-                           p.average_floors, p.has_garbage_room, p.has_elevator, p.has_underground_garage,
-                           p.construction_type, p.has_water_landscape, p.is_fully_decorated, p.public_building_type,
-                           p.public_green_space, p.architecture_score, p.structure_score, p.water_supply_score, 
-                           p.electrical_score, p.hvac_score, p.landscape_score, p.env_health_energy_score,
-                           p.env_health_energy_innovation_score, p.architecture_innovation_score, 
-                           p.structure_innovation_score,p.water_supply_innovation_score, p.electrical_innovation_score,
-                           p.hvac_innovation_score, p.landscape_innovation_score, 
-                           p.safety_durability_score, p.health_comfort_score, p.life_convenience_score, 
-                           p.resource_saving_score, p.environment_livability_score, p.improvement_innovation_score, 
-                           p.total_score, p.evaluation_result
-                    FROM projects p
-                    WHERE p.id = :project_id
-                """),
-                {"project_id": project_id}
-            )
-            project_rows = result.fetchall()
-
-            if not project_rows:
-                print(f"未找到项目数据: ID={project_id}")
-                return jsonify({"error": "未找到项目数据"}), 404
-
-            print(f"获取到项目数据: {project_rows[0]}")
-
-            # 准备数据
-            data = []
-            # 添加项目信息作为第一条数据
-            data.append({
-                "项目ID": str(project_rows[0][0] or ''),
-                "用户ID": str(project_rows[0][1] or ''),
-                "项目名称": project_rows[0][2] or '',
-                "项目编号": project_rows[0][3] or '',
-                "建设单位": project_rows[0][4] or '',
-                "设计单位": project_rows[0][5] or '',
-                "项目地点": project_rows[0][6] or '',
-                "建筑面积": str(project_rows[0][7] or '0'),
-                "评价标准": project_rows[0][8] or '成都市标',
-                "建筑类型": project_rows[0][9] or '',
-                "创建时间": project_rows[0][10].strftime('%Y-%m-%d %H:%M:%S') if project_rows[0][10] else '',
-                "气候区划": project_rows[0][11] or '',
-                "星级目标": project_rows[0][12] or '',
-                "总用地面积": str(project_rows[0][13] or '0'),
-                "总建筑面积": str(project_rows[0][14] or '0'),
-                "地上建筑面积": str(project_rows[0][15] or '0'),
-                "地下建筑面积": str(project_rows[0][16] or '0'),
-                "建筑高度": str(project_rows[0][17] or '0'),
-                "建筑层数": project_rows[0][18] or '',
-                "地下一层建筑面积": str(project_rows[0][19] or '0'),
-                "地面停车位数量": str(project_rows[0][20] or '0'),
-                "容积率": str(project_rows[0][21] or '0'),
-                "建筑基底面积": str(project_rows[0][22] or '0'),
-                "建筑密度": str(project_rows[0][23] or '0'),
-                "绿地面积": str(project_rows[0][24] or '0'),
-                "绿地率": str(project_rows[0][25] or '0'),
-                "住宅户数": str(project_rows[0][26] or '0'),
-                "空调类型": project_rows[0][27] or '',
-                "平均层数": project_rows[0][28] or '',
-                "有无垃圾用房": project_rows[0][29] or '',
-                "有无电梯": project_rows[0][30] or '',
-                "有无地下车库": project_rows[0][31] or '',
-                "建设情况": project_rows[0][32] or '',
-                "有无景观水体": project_rows[0][33] or '',
-                "是否全装修": project_rows[0][34] or '',
-                "公建类型": project_rows[0][35] or '',
-                "绿地向公众开放": project_rows[0][36] or '',
-                "建筑总分": str(project_rows[0][37] or '0'),
-                "结构总分": str(project_rows[0][38] or '0'),
-                "给排水总分": str(project_rows[0][39] or '0'),
-                "电气总分": str(project_rows[0][40] or '0'),
-                "暖通总分": str(project_rows[0][41] or '0'),
-                "景观总分": str(project_rows[0][42] or '0'),
-                "环境健康与节能总分": str(project_rows[0][43] or '0'),
-                "环境健康与节能创新总分": str(project_rows[0][44] or '0'),
-                "建筑创新总分": str(project_rows[0][45] or '0'),
-                "结构创新总分": str(project_rows[0][46] or '0'),
-                "给排水创新总分": str(project_rows[0][47] or '0'),
-                "电气创新总分": str(project_rows[0][48] or '0'),
-                "暖通创新总分": str(project_rows[0][49] or '0'),
-                "景观创新总分": str(project_rows[0][50] or '0'),
-                "安全耐久总分": str(project_rows[0][51] or '0'),
-                "健康舒适总分": str(project_rows[0][52] or '0'),
-                "生活便利总分": str(project_rows[0][53] or '0'),
-                "资源节约总分": str(project_rows[0][54] or '0'),
-                "环境宜居总分": str(project_rows[0][55] or '0'),
-                "提高与创新总分": str(project_rows[0][56] or '0'),
-                "项目总分": str(project_rows[0][57] or '0'),
-                "评定结果": project_rows[0][58] or ''
-            })
-
-            # 获取得分数据
-            print(f"获取项目 {project_id} 的得分数据")
-            result = db.session.execute(
-                text("""
-                    SELECT 条文号, 分类, 是否达标, 得分, 技术措施 
-                    FROM 得分表 
-                    WHERE 项目ID = :project_id
-                    ORDER BY 条文号
-                """),
-                {"project_id": project_id}
-            )
-            score_rows = result.fetchall()
-            
-            print(f"获取到 {len(score_rows)} 条得分数据")
-
-            # 添加得分数据
-            for score_row in score_rows:
-                data.append({
-                    "条文号": score_row[0] or '',
-                    "分类": score_row[1] or '',
-                    "是否达标": score_row[2] or '',
-                    "得分": str(score_row[3] or '0'),
-                    "技术措施": score_row[4] or ''
-                })
-
-            # 保存数据到缓存
-            try:
-                os.makedirs('temp', exist_ok=True)
-                with open(cache_file, 'w', encoding='utf-8') as f:
-                    json.dump(data, f, ensure_ascii=False, indent=2)
-                print(f"数据已保存到缓存: {cache_file}")
-            except Exception as e:
-                print(f"保存缓存失败: {str(e)}")
+            return jsonify({"error": "未找到项目数据"}), 404
+        report_job_progress(10, "正在渲染报审表模板")
 
         # 使用word_template模块处理文档
         print("开始处理Word模板...")
         print(f"数据内容: {json.dumps(data, ensure_ascii=False, indent=2)}")
         
+        # 多个模板并行渲染，每完成一个就写入本次请求独立的内存压缩包；
+        # 文档只在内存中生成，不再写入导出目录，也不再共用固定路径的压缩包文件
+        zip_filename = "报审表文件.zip" # 使用通用名称
+        zip_buffer = BytesIO()
+        finished_outputs = []
+        zip_state = {'zipf': None, 'written': 0}
+
+        def add_output_to_zip(content, base_name):
+            finished_outputs.append((content, base_name))
+            report_job_progress(10 + 15 * len(finished_outputs), f"已生成 {len(finished_outputs)} 个文档")
+            if len(finished_outputs) < 2:
+                return
+            if zip_state['zipf'] is None:
+                zip_state['zipf'] = zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED)
+            for pending_content, pending_name in finished_outputs[zip_state['written']:]:
+                arcname = f"{pending_name}.docx"
+                zip_state['zipf'].writestr(arcname, pending_content)
+                print(f"已添加 {arcname} 到 {zip_filename}")
+            zip_state['written'] = len(finished_outputs)
+
         try:
-            # 调用 process_template 获取文件信息列表
-            # --- 修改：处理新的返回值格式 --- 
-            output_info_list = process_template(data)
-            # --- 添加日志 --- 
-            print(f"process_template 返回值: {output_info_list}")
-            print(f"process_template 返回类型: {type(output_info_list)}")
-            # --- 结束日志 ---
-
-            # --- 修改处理不同返回类型的逻辑 --- 
-            if isinstance(output_info_list, list):
-                # 如果列表为空，表示没有文件生成
-                if not output_info_list:
-                    print("模板处理返回空列表，未生成文件")
-                    return jsonify({"error": "模板处理未生成任何文件"}), 500
-                
-                # --- 修改：处理单个文件情况 --- 
-                elif len(output_info_list) == 1:
-                    # 解包获取路径和基础名
-                    single_file_path, base_template_name = output_info_list[0]
-                    print(f"检测到返回列表只包含单个文件: {single_file_path}, 基础名: {base_template_name}")
-                    # 检查文件是否存在
-                    if not os.path.exists(single_file_path):
-                        print(f"错误：生成的文件不存在: {single_file_path}")
-                        return jsonify({"error": f"生成的文件不存在: {os.path.basename(single_file_path)}"}), 500
-                    
-                    # --- 修改：使用基础名构建下载文件名 --- 
-                    download_filename = f"{base_template_name}.docx"
-                    
-                    print(f"准备下载单个文件 (来自列表): {download_filename}")
-                    return send_file(
-                        single_file_path,
-                        as_attachment=True,
-                        download_name=download_filename,
-                        mimetype='application/vnd.openxmlformats-officedocument.wordprocessingml.document'
-                    )
-                # --- 修改结束 --- 
-                
-                # 如果列表包含多个文件，创建 Zip 文件
-                else:
-                    print("检测到返回值为列表 (多个文件)，准备处理 Zip 文件...")
-                    # --- 修改：修改 Zip 文件名并调整内部文件名 --- 
-                    zip_filename = "报审表文件.zip" # 使用通用名称
-                    zip_filepath = os.path.join('temp', zip_filename)
-
-                    print(f"准备创建压缩文件: {zip_filepath}")
-                    # 导入 zipfile
-                    import zipfile
-                    with zipfile.ZipFile(zip_filepath, 'w') as zipf:
-                        # 遍历信息列表 (包含路径和基础名)
-                        for file_path, base_name in output_info_list:
-                            # 检查每个文件是否存在
-                            if not os.path.exists(file_path):
-                                print(f"错误：生成的文件列表中的文件不存在: {file_path}")
-                                # 如果一个文件丢失，则返回错误
-                                return jsonify({"error": f"生成的文件不存在: {os.path.basename(file_path)}"}), 500
-
-                            # --- 修改：使用基础名作为 arcname --- 
-                            arcname = f"{base_name}.docx"
-                            zipf.write(file_path, arcname=arcname)
-                            print(f"已添加 {arcname} (源: {os.path.basename(file_path)}) 到 {zip_filename}")
-                            # --- 修改结束 ---
-
-                    print(f"准备下载压缩文件: {zip_filename}")
-                    # --- 添加最终发送日志 --- 
-                    print(f"=== 即将发送 Zip 文件 === Path: {zip_filepath}, DownloadName: {zip_filename}, MimeType: application/zip")
-                    # --- 结束日志 --- 
-                    
-                    # 使用 send_file 生成响应对象
-                    response = send_file(
-                        zip_filepath,
-                        as_attachment=True,
-                        download_name=zip_filename,
-                        mimetype='application/zip'
-                    )
-                    
-                    # 尝试显式地设置响应头 (可能有助于某些浏览器)
-                    response.headers["Content-Type"] = "application/zip"
-                    # 确保 Content-Disposition 包含正确的文件名和类型
-                    encoded_filename = quote(zip_filename)
-                    response.headers["Content-Disposition"] = f"attachment; filename*=UTF-8''{encoded_filename}"
-
-                    return response # 返回修改后的响应对象
-                    # --- 修改结束 --- 
-            # --- 旧的单字符串返回处理（理论上已不再需要，但保留以防万一）---
-            elif isinstance(output_info_list, str): 
-                # --- 添加日志 --- 
-                print(f"警告：process_template 返回了单个字符串（旧格式？）: {output_info_list}")
-                # --- 结束日志 --- 
-                single_file_path = output_info_list
-
-                # 检查文件是否存在
-                if not os.path.exists(single_file_path):
-                    print(f"错误：生成的文件不存在: {single_file_path}")
-                    return jsonify({"error": f"生成的文件不存在: {os.path.basename(single_file_path)}"}), 500
-
-                # 尝试从文件名中提取基础名，或使用默认名
-                base_template_name = os.path.splitext(os.path.basename(single_file_path))[0]
-                # 移除可能的项目名前缀和时间戳
-                parts = base_template_name.split('_')
-                if len(parts) > 2: # 假设格式是 项目名_基础名_时间戳
-                    base_template_name = parts[1]
-                elif len(parts) > 1 and parts[-1].isdigit() and len(parts[-1]) > 10: # 假设格式 基础名_时间戳
-                    base_template_name = parts[0]
-                else: # 使用默认名
-                    base_template_name = "报审表"
-                    
-                download_filename = f"{base_template_name}.docx"
+            # 调用 process_template 获取文档内容列表 [(bytes, 模板基础名)]
+            try:
+                output_info_list = process_template(data, on_output=add_output_to_zip, in_memory=True)
+            finally:
+                if zip_state['zipf'] is not None:
+                    zip_state['zipf'].close()
+            print(f"process_template 返回 {len(output_info_list) if output_info_list else 0} 个文档")
+
+            if output_info_list is None:
+                print("模板处理未生成任何文件 (国标非安徽 或 其他错误/无需处理情况)")
+                # 返回特定错误消息给前端
+                return jsonify({"error": "当前地区暂无报审表模板文件！"}), 400 # 使用 400 Bad Request 状态
 
-                print(f"准备下载单个文件 (旧格式处理): {download_filename}")
-                # --- 添加最终发送日志 --- 
-                print(f"=== 即将发送单个文件 === Path: {single_file_path}, DownloadName: {download_filename}, MimeType: application/vnd.openxmlformats-officedocument.wordprocessingml.document")
-                # --- 结束日志 --- 
+            if len(output_info_list) == 1:
+                content, base_template_name = output_info_list[0]
+                # --- 使用基础名构建下载文件名 --- 
+                download_filename = f"{base_template_name}.docx"
+                print(f"准备下载单个文件: {download_filename}")
                 return send_file(
-                    single_file_path,
+                    BytesIO(content),
                     as_attachment=True,
                     download_name=download_filename,
                     mimetype='application/vnd.openxmlformats-officedocument.wordprocessingml.document'
                 )
-            # --- 旧格式处理结束 ---
-            elif output_info_list is None:
-                print("模板处理未生成任何文件 (国标非安徽 或 其他错误/无需处理情况)")
-                # 返回特定错误消息给前端
-                return jsonify({"error": "当前地区暂无报审表模板文件！"}), 400 # 使用 400 Bad Request 状态
-            else:
-                # 处理未预期的返回值类型
-                print(f"错误：模板处理返回了未知的类型: {type(output_info_list)}")
-                return jsonify({"error": "模板处理返回了未知的类型"}), 500
-            # --- 修改结束 --- 
+
+            # 文件已在渲染完成时写入压缩包，这里只确认全部文件都已打包
+            if zip_state['written'] != len(output_info_list):
+                print(f"错误：压缩包中的文件数 {zip_state['written']} 与生成的文件数 {len(output_info_list)} 不一致")
+                return jsonify({"error": "打包生成的文件失败"}), 500
+
+            zip_buffer.seek(0)
+            print(f"=== 即将发送 Zip 文件 === DownloadName: {zip_filename}, Size: {zip_buffer.getbuffer().nbytes}, MimeType: application/zip")
+            response = send_file(
+                zip_buffer,
+                as_attachment=True,
+                download_name=zip_filename,
+                mimetype='application/zip'
+            )
+            
+            # 尝试显式地设置响应头 (可能有助于某些浏览器)
+            response.headers["Content-Type"] = "application/zip"
+            # 确保 Content-Disposition 包含正确的文件名和类型
+            encoded_filename = quote(zip_filename)
+            response.headers["Content-Disposition"] = f"attachment; filename*=UTF-8''{encoded_filename}"
+
+            return response
 
         except Exception as e:
             print(f"处理Word模板失败: {str(e)}")
+            print(f"异常详情: {traceback.format_exc()}")
+            return jsonify({"error": f"处理Word模板失败: {str(e)}"}), 500
 
     except Exception as e:
         print(f"生成Word文档失败: {str(e)}")
@@ -418,15 +515,6 @@ def save_project_info(project_data):
             print("未提供项目ID")
             return jsonify({"error": "请提供项目ID"}), 400
 
-        # 清除旧缓存
-        cache_file = os.path.join('temp', f'project_{project_id}_cache.json')
-        if os.path.exists(cache_file):
-            try:
-                os.remove(cache_file)
-                print(f"已清除旧缓存: {cache_file}")
-            except Exception as e:
-                print(f"清除旧缓存失败: {str(e)}")
-
         # 更新项目信息
         result = db.session.execute(
             text("""
@@ -457,116 +545,15 @@ def save_project_info(project_data):
         db.session.commit()
         print("项目信息已保存到数据库")
         
-        # 创建新的缓存
+        # 清除旧缓存并重新生成
+        invalidate_project_export_data(project_id)
         try:
-            # 获取最新的项目信息
-            result = db.session.execute(
-                text("""
-                    SELECT name, design_unit, construction_unit, total_building_area
-                    FROM projects 
-                    WHERE id = :project_id
-                """),
-                {"project_id": project_id}
-            )
-            project_rows = result.fetchall()
-            
-            if project_rows:
-                # 获取得分数据
-                result = db.session.execute(
-                    text("""
-                        SELECT 条文号, 分类, 是否达标, 得分, 技术措施 
-                        FROM 得分表 
-                        WHERE 项目ID = :project_id
-                        ORDER BY 条文号
-                    """),
-                    {"project_id": project_id}
-                )
-                score_rows = result.fetchall()
-                
-                # 准备数据
-                data = []
-                # 添加项目信息作为第一条数据
-                data.append({
-                    "项目ID": str(project_rows[0][0] or ''),
-                    "用户ID": str(project_rows[0][1] or ''),
-                    "项目名称": project_rows[0][2] or '',
-                    "项目编号": project_rows[0][3] or '',
-                    "建设单位": project_rows[0][4] or '',
-                    "设计单位": project_rows[0][5] or '',
-                    "项目地点": project_rows[0][6] or '',
-                    "建筑面积": str(project_rows[0][7] or '0'),
-                    "评价标准": project_rows[0][8] or '成都市标',
-                    "建筑类型": project_rows[0][9] or '',
-                    "创建时间": project_rows[0][10].strftime('%Y-%m-%d %H:%M:%S') if project_rows[0][10] else '',
-                    "气候区划": project_rows[0][11] or '',
-                    "星级目标": project_rows[0][12] or '',
-                    "总用地面积": str(project_rows[0][13] or '0'),
-                    "总建筑面积": str(project_rows[0][14] or '0'),
-                    "地上建筑面积": str(project_rows[0][15] or '0'),
-                    "地下建筑面积": str(project_rows[0][16] or '0'),
-                    "建筑高度": str(project_rows[0][17] or '0'),
-                    "建筑层数": project_rows[0][18] or '',
-                    "地下一层建筑面积": str(project_rows[0][19] or '0'),
-                    "地面停车位数量": str(project_rows[0][20] or '0'),
-                    "容积率": str(project_rows[0][21] or '0'),
-                    "建筑基底面积": str(project_rows[0][22] or '0'),
-                    "建筑密度": str(project_rows[0][23] or '0'),
-                    "绿地面积": str(project_rows[0][24] or '0'),
-                    "绿地率": str(project_rows[0][25] or '0'),
-                    "住宅户数": str(project_rows[0][26] or '0'),
-                    "空调类型": project_rows[0][27] or '',
-                    "平均层数": project_rows[0][28] or '',
-                    "有无垃圾用房": project_rows[0][29] or '',
-                    "有无电梯": project_rows[0][30] or '',
-                    "有无地下车库": project_rows[0][31] or '',
-                    "建设情况": project_rows[0][32] or '',
-                    "有无景观水体": project_rows[0][33] or '',
-                    "是否全装修": project_rows[0][34] or '',
-                    "公建类型": project_rows[0][35] or '',
-                    "绿地向公众开放": project_rows[0][36] or '',
-                    "建筑总分": str(project_rows[0][37] or '0'),
-                    "结构总分": str(project_rows[0][38] or '0'),
-                    "给排水总分": str(project_rows[0][39] or '0'),
-                    "电气总分": str(project_rows[0][40] or '0'),
-                    "暖通总分": str(project_rows[0][41] or '0'),
-                    "景观总分": str(project_rows[0][42] or '0'),
-                    "环境健康与节能总分": str(project_rows[0][43] or '0'),
-                    "环境健康与节能创新总分": str(project_rows[0][44] or '0'),
-                    "建筑创新总分": str(project_rows[0][45] or '0'),
-                    "结构创新总分": str(project_rows[0][46] or '0'),
-                    "暖通创新总分": str(project_rows[0][47] or '0'),
-                    "景观创新总分": str(project_rows[0][48] or '0'),
-                    "安全耐久总分": str(project_rows[0][49] or '0'),
-                    "健康舒适总分": str(project_rows[0][50] or '0'),
-                    "生活便利总分": str(project_rows[0][51] or '0'),
-                    "资源节约总分": str(project_rows[0][52] or '0'),
-                    "环境宜居总分": str(project_rows[0][53] or '0'),
-                    "提高与创新总分": str(project_rows[0][54] or '0'),
-                    "项目总分": str(project_rows[0][55] or '0'),
-                    "评定结果": project_rows[0][56] or ''
-                })
-                
-                # 添加得分数据
-                for score_row in score_rows:
-                    data.append({
-                        "条文号": score_row[0] or '',
-                        "分类": score_row[1] or '',
-                        "是否达标": score_row[2] or '',
-                        "得分": str(score_row[3] or '0'),
-                        "技术措施": score_row[4] or ''
-                    })
-                
-                # 保存到缓存
-                os.makedirs('temp', exist_ok=True)
-                with open(cache_file, 'w', encoding='utf-8') as f:
-                    json.dump(data, f, ensure_ascii=False, indent=2)
-                print(f"最新项目信息已保存到缓存: {cache_file}")
-            else:
-                print("未找到项目数据，无法创建缓存")
+            load_project_export_data(project_id, use_cache=False)
+            print(f"最新项目信息已保存到缓存: {get_project_cache_file(project_id)}")
         except Exception as e:
             print(f"创建新缓存失败: {str(e)}")
             print(f"异常详情: {traceback.format_exc()}")
-        
+
         return jsonify({"message": "项目信息保存成功"}), 200
 
     except Exception as e:
@@ -601,182 +588,21 @@ def generate_self_assessment_report(request_data):
             return jsonify({"error": f"模板文件不存在: {template_file}"}), 404
         # --- 模板指定结束 ---
 
-        # --- 数据获取逻辑 (保持不变) --- 
-        # 尝试从缓存获取数据
-        cache_file = os.path.join('temp', f'project_{project_id}_cache.json')
-        data = None
-        use_cache = request_data.get('use_cache', True)
-        
-        if use_cache and os.path.exists(cache_file):
-            try:
-                print(f"从缓存文件加载数据: {cache_file}")
-                with open(cache_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                print("成功从缓存加载数据")
-                
-                # 检查缓存数据是否有效
-                if not data or len(data) < 1 or not isinstance(data[0], dict) or not data[0].get("项目名称"):
-                    print("缓存数据无效，将从数据库重新获取")
-                    data = None
-            except Exception as e:
-                print(f"读取缓存文件失败: {str(e)}")
-                data = None
-
-        # 如果缓存不存在或无效，从数据库获取数据
+        # --- 获取项目导出数据 ---
+        data = load_project_export_data(project_id, use_cache=request_data.get('use_cache', True))
         if not data:
-            print("从数据库获取数据...")
-            
-            # 获取项目基本信息
-            print(f"获取项目 {project_id} 的基本信息")
-            result = db.session.execute(
-                text("""
-                    SELECT p.id, p.user_id, p.name, p.code, p.construction_unit, p.design_unit, p.location, 
-                           p.building_area, p.standard, p.building_type, p.created_at, p.climate_zone, 
-                           p.star_rating_target, p.total_land_area, p.total_building_area, p.above_ground_area, 
-                           p.underground_area, p.building_height, p.building_floors, p.underground_floor_area, 
-                           p.ground_parking_spaces, p.plot_ratio, p.building_base_area, p.building_density, 
-                           p.green_area, p.green_ratio, p.residential_units, p.air_conditioning_type,
-                           p.average_floors, p.has_garbage_room, p.has_elevator, p.has_underground_garage,
-                           p.construction_type, p.has_water_landscape, p.is_fully_decorated, p.public_building_type,
-                           p.public_green_space, p.architecture_score, p.structure_score, p.water_supply_score, 
-                           p.electrical_score, p.hvac_score, p.landscape_score, p.env_health_energy_score,
-                           p.env_health_energy_innovation_score, p.architecture_innovation_score, 
-                           p.structure_innovation_score, p.water_supply_innovation_score, p.electrical_innovation_score,
-                           p.hvac_innovation_score, p.landscape_innovation_score, 
-                           p.safety_durability_score, p.health_comfort_score, p.life_convenience_score, 
-                           p.resource_saving_score, p.environment_livability_score, p.improvement_innovation_score, 
-                           p.total_score, p.evaluation_result
-                    FROM projects p
-                    WHERE p.id = :project_id
-                """),
-                {"project_id": project_id}
-            )
-            project_rows = result.fetchall()
-
-            if not project_rows:
-                print(f"未找到项目数据: ID={project_id}")
-                return jsonify({"error": "未找到项目数据"}), 404
-
-            print(f"获取到项目数据: {project_rows[0]}")
-
-            # 准备数据
-            data = []
-            # 添加项目信息作为第一条数据
-            data.append({
-                "项目ID": str(project_rows[0][0] or ''),
-                "用户ID": str(project_rows[0][1] or ''),
-                "项目名称": project_rows[0][2] or '',
-                "项目编号": project_rows[0][3] or '',
-                "建设单位": project_rows[0][4] or '',
-                "设计单位": project_rows[0][5] or '',
-                "项目地点": project_rows[0][6] or '',
-                "建筑面积": str(project_rows[0][7] or '0'),
-                "评价标准": project_rows[0][8] or '成都市标',
-                "建筑类型": project_rows[0][9] or '',
-                "创建时间": project_rows[0][10].strftime('%Y-%m-%d %H:%M:%S') if project_rows[0][10] else '',
-                "气候区划": project_rows[0][11] or '',
-                "星级目标": project_rows[0][12] or '',
-                "总用地面积": str(project_rows[0][13] or '0'),
-                "总建筑面积": str(project_rows[0][14] or '0'),
-                "地上建筑面积": str(project_rows[0][15] or '0'),
-                "地下建筑面积": str(project_rows[0][16] or '0'),
-                "建筑高度": str(project_rows[0][17] or '0'),
-                "建筑层数": project_rows[0][18] or '',
-                "地下一层建筑面积": str(project_rows[0][19] or '0'),
-                "地面停车位数量": str(project_rows[0][20] or '0'),
-                "容积率": str(project_rows[0][21] or '0'),
-                "建筑基底面积": str(project_rows[0][22] or '0'),
-                "建筑密度": str(project_rows[0][23] or '0'),
-                "绿地面积": str(project_rows[0][24] or '0'),
-                "绿地率": str(project_rows[0][25] or '0'),
-                "住宅户数": str(project_rows[0][26] or '0'),
-                "空调类型": project_rows[0][27] or '',
-                "平均层数": project_rows[0][28] or '',
-                "有无垃圾用房": project_rows[0][29] or '',
-                "有无电梯": project_rows[0][30] or '',
-                "有无地下车库": project_rows[0][31] or '',
-                "建设情况": project_rows[0][32] or '',
-                "有无景观水体": project_rows[0][33] or '',
-                "是否全装修": project_rows[0][34] or '',
-                "公建类型": project_rows[0][35] or '',
-                "绿地向公众开放": project_rows[0][36] or '',
-                "建筑总分": str(project_rows[0][37] or '0'),
-                "结构总分": str(project_rows[0][38] or '0'),
-                "给排水总分": str(project_rows[0][39] or '0'),
-                "电气总分": str(project_rows[0][40] or '0'),
-                "暖通总分": str(project_rows[0][41] or '0'),
-                "景观总分": str(project_rows[0][42] or '0'),
-                "环境健康与节能总分": str(project_rows[0][43] or '0'),
-                "环境健康与节能创新总分": str(project_rows[0][44] or '0'),
-                "建筑创新总分": str(project_rows[0][45] or '0'),
-                "结构创新总分": str(project_rows[0][46] or '0'),
-                "给排水创新总分": str(project_rows[0][47] or '0'),
-                "电气创新总分": str(project_rows[0][48] or '0'),
-                "暖通创新总分": str(project_rows[0][49] or '0'),
-                "景观创新总分": str(project_rows[0][50] or '0'),
-                "安全耐久总分": str(project_rows[0][51] or '0'),
-                "健康舒适总分": str(project_rows[0][52] or '0'),
-                "生活便利总分": str(project_rows[0][53] or '0'),
-                "资源节约总分": str(project_rows[0][54] or '0'),
-                "环境宜居总分": str(project_rows[0][55] or '0'),
-                "提高与创新总分": str(project_rows[0][56] or '0'),
-                "项目总分": str(project_rows[0][57] or '0'),
-                "评定结果": project_rows[0][58] or ''
-            })
-
-            # 获取得分数据
-            print(f"获取项目 {project_id} 的得分数据")
-            result = db.session.execute(
-                text("""
-                    SELECT 条文号, 分类, 是否达标, 得分, 技术措施 
-                    FROM 得分表 
-                    WHERE 项目ID = :project_id
-                    ORDER BY 条文号
-                """),
-                {"project_id": project_id}
-            )
-            score_rows = result.fetchall()
-            
-            print(f"获取到 {len(score_rows)} 条得分数据")
-
-            # 添加得分数据
-            for score_row in score_rows:
-                data.append({
-                    "条文号": score_row[0] or '',
-                    "分类": score_row[1] or '',
-                    "是否达标": score_row[2] or '',
-                    "得分": str(score_row[3] or '0'),
-                    "技术措施": score_row[4] or ''
-                })
-
-            # --- 添加设计日期 --- 
-            if data and isinstance(data[0], dict):
-                # 检查 "设计日期" 是否已存在，如果不存在或为空，则添加/更新
-                if not data[0].get("设计日期"):
-                    current_date = datetime.now().strftime("%Y年%m月%d日") # 使用 年月日 格式
-                    data[0]["设计日期"] = current_date
-                    print(f"[export.py] 已自动添加设计日期到自评估报告数据: {current_date}")
-            # --- 设计日期添加结束 ---
-            
-            # 保存数据到缓存
-            try:
-                os.makedirs('temp', exist_ok=True)
-                with open(cache_file, 'w', encoding='utf-8') as f:
-                    json.dump(data, f, ensure_ascii=False, indent=2)
-                print(f"数据已保存到缓存: {cache_file}")
-            except Exception as e:
-                print(f"保存缓存失败: {str(e)}")
-        # --- 数据获取逻辑结束 --- 
+            return jsonify({"error": "未找到项目数据"}), 404
+        _add_design_date(data, '自评估报告')
+        # --- 数据获取逻辑结束 ---
 
         # --- 直接调用 replace_placeholders 处理指定模板 --- 
         print(f"开始使用模板 {template_file} 处理占位符...")
         try:
             # 调用word_template模块的replace_placeholders函数处理占位符
             placeholder_result = replace_placeholders(template_path, data)
-            output_file = None # 初始化
+            output_file = _placeholder_output_path(placeholder_result)
             
-            if isinstance(placeholder_result, str):
-                 output_file = placeholder_result # 赋值给 output_file
+            if output_file:
                  print(f"占位符替换完成，输出文件: {output_file}")
             else:
                  print(f"replace_placeholders 处理失败或返回无效值: {placeholder_result}")
@@ -839,208 +665,32 @@ def generate_generateljzpwb(request_data):
             print(f"模板文件不存在: {template_path}")
             return jsonify({"error": f"模板文件不存在: {template_file}"}), 404
 
-        # 尝试从缓存获取数据
-        cache_file = os.path.join('temp', f'project_{project_id}_cache.json')
-        data = None
-        use_cache = request_data.get('use_cache', True)
-        
-        if use_cache and os.path.exists(cache_file):
-            try:
-                print(f"从缓存文件加载数据: {cache_file}")
-                with open(cache_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                print("成功从缓存加载数据")
-                
-                # 检查缓存数据是否有效
-                if not data or len(data) < 1 or not isinstance(data[0], dict) or not data[0].get("项目名称"):
-                    print("缓存数据无效，将从数据库重新获取")
-                    data = None
-            except Exception as e:
-                print(f"读取缓存文件失败: {str(e)}")
-                data = None
-
-        # 如果缓存不存在或无效，从数据库获取数据
+        # 获取项目导出数据
+        data = load_project_export_data(project_id, use_cache=request_data.get('use_cache', True))
         if not data:
-            print("从数据库获取数据...")
-            
-            # 获取项目基本信息
-            print(f"获取项目 {project_id} 的基本信息")
-            result = db.session.execute(
-                text("""
-                    SELECT p.id, p.user_id, p.name, p.code, p.construction_unit, p.design_unit, p.location, 
-                           p.building_area, p.standard, p.building_type, p.created_at, p.climate_zone, 
-                           p.star_rating_target, p.total_land_area, p.total_building_area, p.above_ground_area, 
-                           p.underground_area, p.building_height, p.building_floors, p.underground_floor_area, 
-                           p.ground_parking_spaces, p.plot_ratio, p.building_base_area, p.building_density, 
-                           p.green_area, p.green_ratio, p.residential_units, p.air_conditioning_type,
-                           p.average_floors, p.has_garbage_room, p.has_elevator, p.has_underground_garage,
-                           p.construction_type, p.has_water_landscape, p.is_fully_decorated, p.public_building_type,
-                           p.public_green_space, p.architecture_score, p.structure_score, p.water_supply_score, 
-                           p.electrical_score, p.hvac_score, p.landscape_score, p.env_health_energy_score,
-                           p.env_health_energy_innovation_score, p.architecture_innovation_score, 
-                           p.structure_innovation_score, p.water_supply_innovation_score, p.electrical_innovation_score,
-                           p.hvac_innovation_score, p.landscape_innovation_score, 
-                           p.safety_durability_score, p.health_comfort_score, p.life_convenience_score, 
-                           p.resource_saving_score, p.environment_livability_score, p.improvement_innovation_score, 
-                           p.total_score, p.evaluation_result
-                    FROM projects p
-                    WHERE p.id = :project_id
-                """),
-                {"project_id": project_id}
-            )
-            project_rows = result.fetchall()
-
-            if not project_rows:
-                print(f"未找到项目数据: ID={project_id}")
-                return jsonify({"error": "未找到项目数据"}), 404
-
-            print(f"获取到项目数据: {project_rows[0]}")
-
-            # 准备数据
-            data = []
-            # --- 明确从传入的 request_data 获取图片路径 --- 
-            image_path_from_request = request_data.get('effect_image_path')
-            print(f"[export.py] 从 request_data 获取到的 effect_image_path: {image_path_from_request}")
-            # --- 获取用地性质和可再生能源 --- 
-            land_use_nature = request_data.get('land_use_nature', '') # 默认为空字符串
-            renewable_energy_use = request_data.get('renewable_energy_use', '') # 默认为空字符串
-            structure_form = request_data.get('structure_form', '') # <<< 获取结构形式
-            print(f"[export.py] 从 request_data 获取到的 用地性质: {land_use_nature}, 可再生能源: {renewable_energy_use}, 结构形式: {structure_form}") # <<< 添加日志
-            # --- 获取结束 ---
-
-            # 添加项目信息作为第一条数据
-            project_info_dict = {
-                "项目ID": str(project_rows[0][0] or ''),
-                "用户ID": str(project_rows[0][1] or ''),
-                "项目名称": project_rows[0][2] or '',
-                "项目编号": project_rows[0][3] or '',
-                "建设单位": project_rows[0][4] or '',
-                "设计单位": project_rows[0][5] or '',
-                "项目地点": project_rows[0][6] or '',
-                "建筑面积": str(project_rows[0][7] or '0'),
-                "评价标准": project_rows[0][8] or '成都市标',
-                "建筑类型": project_rows[0][9] or '',
-                "创建时间": project_rows[0][10].strftime('%Y-%m-%d %H:%M:%S') if project_rows[0][10] else '',
-                "气候区划": project_rows[0][11] or '',
-                "星级目标": project_rows[0][12] or '',
-                "总用地面积": str(project_rows[0][13] or '0'),
-                "总建筑面积": str(project_rows[0][14] or '0'),
-                "地上建筑面积": str(project_rows[0][15] or '0'),
-                "地下建筑面积": str(project_rows[0][16] or '0'),
-                "建筑高度": str(project_rows[0][17] or '0'),
-                "建筑层数": project_rows[0][18] or '',
-                "地下一层建筑面积": str(project_rows[0][19] or '0'),
-                "地面停车位数量": str(project_rows[0][20] or '0'),
-                "容积率": str(project_rows[0][21] or '0'),
-                "建筑基底面积": str(project_rows[0][22] or '0'),
-                "建筑密度": str(project_rows[0][23] or '0'),
-                "绿地面积": str(project_rows[0][24] or '0'),
-                "绿地率": str(project_rows[0][25] or '0'),
-                "住宅户数": str(project_rows[0][26] or '0'),
-                "空调类型": project_rows[0][27] or '',
-                "平均层数": project_rows[0][28] or '',
-                "有无垃圾用房": project_rows[0][29] or '',
-                "有无电梯": project_rows[0][30] or '',
-                "有无地下车库": project_rows[0][31] or '',
-                "建设情况": project_rows[0][32] or '',
-                "有无景观水体": project_rows[0][33] or '',
-                "是否全装修": project_rows[0][34] or '',
-                "公建类型": project_rows[0][35] or '',
-                "绿地向公众开放": project_rows[0][36] or '',
-                "建筑总分": str(project_rows[0][37] or '0'),
-                "结构总分": str(project_rows[0][38] or '0'),
-                "给排水总分": str(project_rows[0][39] or '0'),
-                "电气总分": str(project_rows[0][40] or '0'),
-                "暖通总分": str(project_rows[0][41] or '0'),
-                "景观总分": str(project_rows[0][42] or '0'),
-                "环境健康与节能总分": str(project_rows[0][43] or '0'),
-                "环境健康与节能创新总分": str(project_rows[0][44] or '0'),
-                "建筑创新总分": str(project_rows[0][45] or '0'),
-                "结构创新总分": str(project_rows[0][46] or '0'),
-                "给排水创新总分": str(project_rows[0][47] or '0'),
-                "电气创新总分": str(project_rows[0][48] or '0'),
-                "暖通创新总分": str(project_rows[0][49] or '0'),
-                "景观创新总分": str(project_rows[0][50] or '0'),
-                "安全耐久总分": str(project_rows[0][51] or '0'),
-                "健康舒适总分": str(project_rows[0][52] or '0'),
-                "生活便利总分": str(project_rows[0][53] or '0'),
-                "资源节约总分": str(project_rows[0][54] or '0'),
-                "环境宜居总分": str(project_rows[0][53] or '0'),
-                "提高与创新总分": str(project_rows[0][56] or '0'),
-                "项目总分": str(project_rows[0][57] or '0'),
-                "评定结果": project_rows[0][58] or '',
-                # --- 直接使用上面获取的路径 --- 
-                "鸟瞰图_path": image_path_from_request, 
-                # --- 添加新字段 --- 
-                "用地性质": land_use_nature,
-                "可再生能源": renewable_energy_use,
-                # --- 添加模板需要的额外字段映射 ---
-                "停车位数量": str(project_rows[0][20] or '0'),  # 使用 地面停车位数量 的值
-                "空调形式": project_rows[0][27] or '',        # 使用 空调类型 的值
-                "地上层数": project_rows[0][18] or '',         # 使用 建筑层数 的值
-                "结构形式": structure_form # <<< 添加结构形式字段
-            }
-            print(f"[export.py] 添加到 data[0] 的鸟瞰图_path: {project_info_dict.get('鸟瞰图_path')}")
-            data.append(project_info_dict)
-
-            # 获取得分数据
-            print(f"获取项目 {project_id} 的得分数据")
-            result = db.session.execute(
-                text("""
-                    SELECT 条文号, 分类, 是否达标, 得分, 技术措施 
-                    FROM 得分表 
-                    WHERE 项目ID = :project_id
-                    ORDER BY 条文号
-                """),
-                {"project_id": project_id}
-            )
-            score_rows = result.fetchall()
-            
-            print(f"获取到 {len(score_rows)} 条得分数据")
-
-            # 添加得分数据
-            for score_row in score_rows:
-                data.append({
-                    "条文号": score_row[0] or '',
-                    "分类": score_row[1] or '',
-                    "是否达标": score_row[2] or '',
-                    "得分": str(score_row[3] or '0'),
-                    "技术措施": score_row[4] or ''
-                })
-
-            # --- 添加设计日期 (针对 generate_generateljzpwb) ---
-            if data and isinstance(data[0], dict):
-                # 检查 "设计日期" 是否已存在，如果不存在或为空，则添加/更新
-                if not data[0].get("设计日期"):
-                    current_date = datetime.now().strftime("%Y年%m月%d日") # 使用 年月日 格式
-                    data[0]["设计日期"] = current_date
-                    print(f"[export.py] 已自动添加设计日期到绿建专篇文本数据: {current_date}")
-            # --- 设计日期添加结束 ---
-
-            # 保存数据到缓存
-            try:
-                os.makedirs('temp', exist_ok=True)
-                with open(cache_file, 'w', encoding='utf-8') as f:
-                    json.dump(data, f, ensure_ascii=False, indent=2)
-                print(f"数据已保存到缓存: {cache_file}")
-            except Exception as e:
-                print(f"保存缓存失败: {str(e)}")
-
-        # --- 如果是从缓存加载的，也需要确保图片路径被添加/更新 --- 
-        elif data and isinstance(data, list) and len(data) > 0 and isinstance(data[0], dict):
-            image_path_from_request = request_data.get('effect_image_path')
-            print(f"[export.py] 处理缓存数据，从 request_data 获取到的 effect_image_path: {image_path_from_request}")
-            # 检查缓存中是否已有路径，如果没有，从 request_data 添加
-            if '鸟瞰图_path' not in data[0] or not data[0]['鸟瞰图_path']:
-                data[0]['鸟瞰图_path'] = image_path_from_request
-                print(f"[export.py] 缓存中无路径，已添加: {data[0]['鸟瞰图_path']}")
-            # 如果缓存中有路径但 request_data 中有新的路径（意味着用户新上传了），则更新
-            elif image_path_from_request and data[0].get('鸟瞰图_path') != image_path_from_request:
-                 data[0]['鸟瞰图_path'] = image_path_from_request
-                 print(f"[export.py] 缓存中有旧路径，已更新为新路径: {data[0]['鸟瞰图_path']}")
-            else:
-                 print(f"[export.py] 缓存中已有路径，且与请求一致或请求中无新路径: {data[0].get('鸟瞰图_path')}")
-            
+            return jsonify({"error": "未找到项目数据"}), 404
+
+        # --- 请求中的字段只用于本次导出，不写入缓存 ---
+        image_path_from_request = request_data.get('effect_image_path')
+        print(f"[export.py] 从 request_data 获取到的 effect_image_path: {image_path_from_request}")
+        land_use_nature = request_data.get('land_use_nature', '') # 默认为空字符串
+        renewable_energy_use = request_data.get('renewable_energy_use', '') # 默认为空字符串
+        structure_form = request_data.get('structure_form', '') # <<< 获取结构形式
+        print(f"[export.py] 从 request_data 获取到的 用地性质: {land_use_nature}, 可再生能源: {renewable_energy_use}, 结构形式: {structure_form}")
+
+        project_info_dict = data[0]
+        project_info_dict.update({
+            "鸟瞰图_path": image_path_from_request,
+            "用地性质": land_use_nature,
+            "可再生能源": renewable_energy_use,
+            # --- 添加模板需要的额外字段映射 ---
+            "停车位数量": project_info_dict["地面停车位数量"],  # 使用 地面停车位数量 的值
+            "空调形式": project_info_dict["空调类型"],        # 使用 空调类型 的值
+            "地上层数": project_info_dict["建筑层数"],         # 使用 建筑层数 的值
+            "结构形式": structure_form
+        })
+        _add_design_date(data, '绿建专篇文本')
+
         # 使用word_template模块处理文档
         print("开始处理Word模板...")
         # --- 添加日志，确认最终传递给 replace_placeholders 的图片路径 --- 
@@ -1050,7 +700,7 @@ def generate_generateljzpwb(request_data):
         try:
             template_path = os.path.join(current_app.static_folder, 'templates', '绿建专篇文本.docx')
             # 调用word_template模块的replace_placeholders函数处理占位符
-            output_file = replace_placeholders(template_path, data)
+            output_file = _placeholder_output_path(replace_placeholders(template_path, data))
             print(f"占位符替换完成，输出文件: {output_file}")
         except Exception as e:
             print(f"处理占位符时出错: {str(e)}")
@@ -1060,7 +710,7 @@ def generate_generateljzpwb(request_data):
         print(f"Word文档生成成功: {output_file}")
         
         # 检查生成的文件是否存在
-        if not os.path.exists(output_file):
+        if not output_file or not os.path.exists(output_file):
             print(f"生成的文件不存在: {output_file}")
             return jsonify({"error": "生成的文件不存在"}), 500
             
@@ -1093,86 +743,16 @@ def generate_dwg(request_data):
             return jsonify({"error": "未提供项目ID"}), 400
 
         # 获取项目信息和评分数据
-        result = db.session.execute(
-            text("""
-                SELECT 
-                    p.id,
-                    p.user_id,
-                    p.name,
-                    p.code,
-                    p.construction_unit,
-                    p.design_unit,
-                    p.location,
-                    p.building_area,
-                    p.standard,
-                    p.building_type,
-                    p.created_at,
-                    p.climate_zone,
-                    p.star_rating_target,
-                    p.total_land_area,
-                    p.total_building_area,
-                    p.above_ground_area,
-                    p.underground_area,
-                    p.building_height,
-                    p.building_floors,
-                    p.underground_floor_area,
-                    p.ground_parking_spaces,
-                    p.plot_ratio,
-                    p.building_base_area,
-                    p.building_density,
-                    p.green_area,
-                    p.green_ratio,
-                    p.residential_units,
-                    p.air_conditioning_type,
-                    p.average_floors,
-                    p.has_garbage_room,
-                    p.has_elevator,
-                    p.has_underground_garage,
-                    p.construction_type,
-                    p.has_water_landscape,
-                    p.is_fully_decorated,
-                    p.public_building_type,
-                    p.public_green_space,
-                    p.architecture_score,
-                    p.structure_score,
-                    p.water_supply_score,
-                    p.electrical_score,
-                    p.hvac_score,
-                    p.landscape_score,
-                    p.env_health_energy_score,
-                    p.env_health_energy_innovation_score,
-                    p.architecture_innovation_score,
-                    p.structure_innovation_score,
-                    p.water_supply_innovation_score,
-                    p.electrical_innovation_score,
-                    p.hvac_innovation_score,
-                    p.landscape_innovation_score,
-                    p.safety_durability_score,
-                    p.health_comfort_score,
-                    p.life_convenience_score,
-                    p.resource_saving_score,
-                    p.environment_livability_score,
-                    p.improvement_innovation_score,
-                    p.total_score,
-                    p.evaluation_result
-                FROM projects p
-                WHERE p.id = :project_id
-            """),
-            {"project_id": project_id}
-        )
-        project_rows = result.fetchall()
-
-        if not project_rows:
-            print(f"未找到项目数据: ID={project_id}")
+        data = load_project_export_data(project_id, use_cache=request_data.get('use_cache', True))
+        if not data:
             return jsonify({"error": "未找到项目数据"}), 404
+        project_info = data[0]
+
+        standard = project_info["评价标准"]  # 使用数据库中的评价标准
+        star_rating_target = project_info["星级目标"]  # 星级目标
 
-        print(f"获取到项目数据: {project_rows[0]}")
-        
-        standard = project_rows[0][8]  # 使用数据库中的评价标准
-        star_rating_target = project_rows[0][12] or ''  # 星级目标
-        
         print(f"项目评价标准: {standard}, 星级目标: {star_rating_target}")
-        
+
         # 根据评价标准和星级目标选择模板文件
         template_filename = ""
         if standard == '成都市标':
@@ -1184,7 +764,7 @@ def generate_dwg(request_data):
                 template_filename = '绿色建筑设计专篇(省标2024).dwg'
         elif standard == '国标':
             # 检查是否为内蒙古地区且非基本级
-            location = project_rows[0][6] or ''  # 获取项目地点
+            location = project_info["项目地点"]  # 获取项目地点
             if '内蒙古' in location and star_rating_target != '基本级':
                 template_filename = '绿色建筑设计专篇-内蒙古.dwg'
             elif star_rating_target == '基本级':
@@ -1202,198 +782,10 @@ def generate_dwg(request_data):
             print(f"CAD模板文件不存在: {template_path}")
             return jsonify({"error": f"CAD模板文件不存在，请确保templates目录下有{template_filename}文件"}), 404
 
-        # 移除 project_scores 同步逻辑
-
-        # 尝试从缓存获取数据
-        cache_file = os.path.join('temp', f'project_{project_id}_cache.json')
-        data = None
-        use_cache = request_data.get('use_cache', False)  # 默认不使用缓存
-        
-        if use_cache and os.path.exists(cache_file):
-            try:
-                print(f"从缓存文件加载数据: {cache_file}")
-                with open(cache_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                print("成功从缓存加载数据")
-                
-                # 检查缓存数据是否有效
-                if not data or len(data) < 1 or not isinstance(data[0], dict) or not data[0].get("项目名称"):
-                    print("缓存数据无效，将从数据库重新获取")
-                    data = None
-            except Exception as e:
-                print(f"读取缓存文件失败: {str(e)}")
-                data = None
-
-        # 如果缓存不存在或无效，从数据库获取数据
-        if not data:
-            # 获取得分数据
-            print(f"获取项目 {project_id} 的得分数据")
-            result = db.session.execute(
-                text("""
-                    SELECT 条文号, 分类, 是否达标, 得分, 技术措施 
-                    FROM 得分表 
-                    WHERE 项目ID = :project_id
-                    ORDER BY 条文号
-                """),
-                {"project_id": project_id}
-            )
-            score_rows = result.fetchall()
-            
-            print(f"获取到 {len(score_rows)} 条得分数据")
-
-            # 准备数据
-            data = []
-            # 添加项目信息作为第一条数据
-            data.append({
-                "项目ID": str(project_rows[0][0] or ''),
-                "用户ID": str(project_rows[0][1] or ''),
-                "项目名称": project_rows[0][2] or '',
-                "项目编号": project_rows[0][3] or '',
-                "建设单位": project_rows[0][4] or '',
-                "设计单位": project_rows[0][5] or '',
-                "项目地点": project_rows[0][6] or '',
-                "建筑面积": str(project_rows[0][7] or '0'),
-                "评价标准": project_rows[0][8] or '成都市标',
-                "建筑类型": project_rows[0][9] or '',
-                "创建时间": project_rows[0][10].strftime('%Y-%m-%d %H:%M:%S') if project_rows[0][10] else '',
-                "气候区划": project_rows[0][11] or '',
-                "星级目标": project_rows[0][12] or '',
-                "总用地面积": str(project_rows[0][13] or '0'),
-                "总建筑面积": str(project_rows[0][14] or '0'),
-                "地上建筑面积": str(project_rows[0][15] or '0'),
-                "地下建筑面积": str(project_rows[0][16] or '0'),
-                "建筑高度": str(project_rows[0][17] or '0'),
-                "建筑层数": project_rows[0][18] or '',
-                "地下一层建筑面积": str(project_rows[0][19] or '0'),
-                "地面停车位数量": str(project_rows[0][20] or '0'),
-                "容积率": str(project_rows[0][21] or '0'),
-                "建筑基底面积": str(project_rows[0][22] or '0'),
-                "建筑密度": str(project_rows[0][23] or '0'),
-                "绿地面积": str(project_rows[0][24] or '0'),
-                "绿地率": str(project_rows[0][25] or '0'),
-                "住宅户数": str(project_rows[0][26] or '0'),
-                "空调类型": project_rows[0][27] or '',
-                "平均层数": project_rows[0][28] or '',
-                "有无垃圾用房": project_rows[0][29] or '',
-                "有无电梯": project_rows[0][30] or '',
-                "有无地下车库": project_rows[0][31] or '',
-                "建设情况": project_rows[0][32] or '',
-                "有无景观水体": project_rows[0][33] or '',
-                "是否全装修": project_rows[0][34] or '',
-                "公建类型": project_rows[0][35] or '',
-                "绿地向公众开放": project_rows[0][36] or '',
-                "建筑总分": str(project_rows[0][37] or '0'),
-                "结构总分": str(project_rows[0][38] or '0'),
-                "给排水总分": str(project_rows[0][39] or '0'),
-                "电气总分": str(project_rows[0][40] or '0'),
-                "暖通总分": str(project_rows[0][41] or '0'),
-                "景观总分": str(project_rows[0][42] or '0'),
-                "环境健康与节能总分": str(project_rows[0][43] or '0'),
-                "环境健康与节能创新总分": str(project_rows[0][44] or '0'),
-                "建筑创新总分": str(project_rows[0][45] or '0'),
-                "结构创新总分": str(project_rows[0][46] or '0'),
-                "给排水创新总分": str(project_rows[0][47] or '0'),
-                "电气创新总分": str(project_rows[0][48] or '0'),
-                "暖通创新总分": str(project_rows[0][49] or '0'),
-                "景观创新总分": str(project_rows[0][50] or '0'),
-                "安全耐久总分": str(project_rows[0][51] or '0'),
-                "健康舒适总分": str(project_rows[0][52] or '0'),
-                "生活便利总分": str(project_rows[0][53] or '0'),
-                "资源节约总分": str(project_rows[0][54] or '0'),
-                "环境宜居总分": str(project_rows[0][55] or '0'),
-                "提高与创新总分": str(project_rows[0][56] or '0'),
-                "项目总分": str(project_rows[0][57] or '0'),
-                "评定结果": project_rows[0][58] or ''
-
-            })
-
-            # 添加得分数据
-            for score_row in score_rows:
-                data.append({
-                    "条文号": score_row[0] or '',
-                    "分类": score_row[1] or '',
-                    "是否达标": score_row[2] or '',
-                    "得分": str(score_row[3] or '0'),
-                    "技术措施": score_row[4] or ''
-                })
-
-            # 保存数据到缓存
-            try:
-                os.makedirs('temp', exist_ok=True)
-                with open(cache_file, 'w', encoding='utf-8') as f:
-                    json.dump(data, f, ensure_ascii=False, indent=2)
-                print(f"数据已保存到缓存: {cache_file}")
-            except Exception as e:
-                print(f"保存缓存失败: {str(e)}")
-
-        # 准备属性块数据
-        attributes = {}
-        
-        # 添加项目所有信息
-        attributes["项目ID"] = str(project_rows[0][0] or '')
-        attributes["用户ID"] = str(project_rows[0][1] or '')
-        attributes["项目名称"] = project_rows[0][2] or ''
-        attributes["项目编号"] = project_rows[0][3] or ''
-        attributes["建设单位"] = project_rows[0][4] or ''
-        attributes["设计单位"] = project_rows[0][5] or ''
-        attributes["项目地点"] = project_rows[0][6] or ''
-        attributes["建筑面积"] = str(project_rows[0][7] or '0')
-        attributes["评价标准"] = project_rows[0][8] or '成都市标'
-        attributes["建筑类型"] = project_rows[0][9] or ''
-        attributes["创建时间"] = project_rows[0][10].strftime('%Y-%m-%d %H:%M:%S') if project_rows[0][10] else ''
-        attributes["气候区划"] = project_rows[0][11] or ''
-        attributes["星级目标"] = project_rows[0][12] or ''
-        attributes["总用地面积"] = str(project_rows[0][13] or '0')
-        attributes["总建筑面积"] = str(project_rows[0][14] or '0')
-        attributes["地上建筑面积"] = str(project_rows[0][15] or '0')
-        attributes["地下建筑面积"] = str(project_rows[0][16] or '0')
-        attributes["建筑高度"] = str(project_rows[0][17] or '0')
-        attributes["建筑层数"] = project_rows[0][18] or ''
-        attributes["地下一层建筑面积"] = str(project_rows[0][19] or '0')
-        attributes["地面停车位数量"] = str(project_rows[0][20] or '0')
-        attributes["容积率"] = str(project_rows[0][21] or '0')
-        attributes["建筑基底面积"] = str(project_rows[0][22] or '0')
-        attributes["建筑密度"] = str(project_rows[0][23] or '0')
-        attributes["绿地面积"] = str(project_rows[0][24] or '0')
-        attributes["绿地率"] = str(project_rows[0][25] or '0')
-        attributes["住宅户数"] = str(project_rows[0][26] or '0')
-        attributes["空调类型"] = project_rows[0][27] or ''
-        attributes["平均层数"] = project_rows[0][28] or ''
-        attributes["有无垃圾用房"] = project_rows[0][29] or ''
-        attributes["有无电梯"] = project_rows[0][30] or ''
-        attributes["有无地下车库"] = project_rows[0][31] or ''
-        attributes["建设情况"] = project_rows[0][32] or ''
-        attributes["有无景观水体"] = project_rows[0][33] or ''
-        attributes["是否全装修"] = project_rows[0][34] or ''
-        attributes["公建类型"] = project_rows[0][35] or ''
-        attributes["绿地向公众开放"] = project_rows[0][36] or ''
+        # 准备属性块数据：项目所有信息和评分数据
+        attributes = dict(project_info)
         attributes["设计日期"] = datetime.now().strftime('%Y年%m月%d日')
-        # 添加评分数据
-
-        attributes["建筑总分"] = str(project_rows[0][37] or '0')
-        attributes["结构总分"] = str(project_rows[0][38] or '0')
-        attributes["给排水总分"] = str(project_rows[0][39] or '0')
-        attributes["电气总分"] = str(project_rows[0][40] or '0')
-        attributes["暖通总分"] = str(project_rows[0][41] or '0')
-        attributes["景观总分"] = str(project_rows[0][42] or '0')
-        attributes["环境健康与节能总分"] = str(project_rows[0][43] or '0')
-        attributes["环境健康与节能创新总分"] = str(project_rows[0][44] or '0')
-        attributes["建筑创新总分"] = str(project_rows[0][45] or '0')
-        attributes["结构创新总分"] = str(project_rows[0][46] or '0')
-        attributes["给排水创新总分"] = str(project_rows[0][47] or '0')
-        attributes["电气创新总分"] = str(project_rows[0][48] or '0')
-        attributes["暖通创新总分"] = str(project_rows[0][49] or '0')
-        attributes["景观创新总分"] = str(project_rows[0][50] or '0')
-        attributes["安全耐久总分"] = str(project_rows[0][51] or '0')
-        attributes["健康舒适总分"] = str(project_rows[0][52] or '0')
-        attributes["生活便利总分"] = str(project_rows[0][53] or '0')
-        attributes["资源节约总分"] = str(project_rows[0][54] or '0')
-        attributes["环境宜居总分"] = str(project_rows[0][55] or '0')
-        attributes["提高与创新总分"] = str(project_rows[0][56] or '0')
-        attributes["项目总分"] = str(project_rows[0][57] or '0')
-        attributes["评定结果"] = project_rows[0][58] or ''
-        attributes["设计日期"] = datetime.now().strftime('%Y年%m月%d日')
-        project_total_score = project_rows[0][57] if project_rows[0][57] is not None else 0
+        project_total_score = float(project_info["项目总分"] or 0)
         attributes["标准总分"] = f"{(project_total_score + 400) / 10:.1f}"
         # 添加得分数据
         for item in data[1:]:  # 跳过第一项（项目信息）
@@ -1448,14 +840,53 @@ def generate_dwg(request_data):
         os.makedirs(temp_dir, exist_ok=True)
         output_path = os.path.join(temp_dir, f"绿建设计专篇_{project_name}_{timestamp}.dwg")
         
-        # 移除环境判断，始终使用本地处理
-        print("使用Windows本地AutoCAD处理DWG文件")
+        # DWG生成后端：autocad（Windows COM）或 dxf（ezdxf 直接写文件，可在Linux上并发执行）
+        dwg_backend = resolve_dwg_backend(current_app.config.get('DWG_BACKEND', 'auto'))
+
+        report_job_progress(10, "正在生成图纸")
+
+        # 模板和属性都相同的图纸直接使用缓存，无需再次生成
+        cache_key = None
+        if current_app.config.get('DWG_CACHE_ENABLED', True):
+            try:
+                cache_key = get_dwg_cache_key(template_path, attributes, dwg_backend)
+                cached_path = get_cached_dwg(cache_key)
+                if cached_path:
+                    print(f"命中DWG缓存: {cached_path}")
+                    cached_ext = os.path.splitext(cached_path)[1]
+                    return send_file(
+                        cached_path,
+                        as_attachment=True,
+                        download_name=os.path.splitext(download_name)[0] + cached_ext,
+                        mimetype='application/dxf' if cached_ext.lower() == '.dxf' else 'application/acad'
+                    )
+            except Exception as cache_error:
+                print(f"检查DWG缓存失败: {str(cache_error)}")
+                cache_key = None
+
         try:
             print(f"使用本地函数更新CAD文件，使用模板: {template_path}...")
             print(f"更新的属性数量: {len(attributes)}")
             
-            # 调用update_attribute_text函数
-            update_attribute_text(template_path, output_path, attributes)
+            if dwg_backend == DWG_BACKEND_DXF:
+                # 无法输出DWG时返回的是同名DXF文件路径
+                output_path = update_attribute_text_dxf(template_path, output_path, attributes)
+            elif current_app.config.get('DWG_ACAD_WORKER_ENABLED', True):
+                # 交给常驻AutoCAD工作进程，并发请求在队列中排队
+                print("使用AutoCAD工作进程处理DWG文件")
+                output_path = submit_dwg_job(template_path, output_path, attributes)
+            else:
+                print("使用Windows本地AutoCAD处理DWG文件")
+                update_attribute_text(template_path, output_path, attributes)
+            output_ext = os.path.splitext(output_path)[1]
+            download_name = os.path.splitext(download_name)[0] + output_ext
+            
+            # 生成的图纸移入缓存，后续相同的导出直接返回
+            if cache_key and os.path.exists(output_path):
+                stored_path = store_dwg(cache_key, output_path)
+                if stored_path == output_path:
+                    print(f"警告: DWG未能存入缓存，直接发送生成的文件: {output_path}")
+                output_path = stored_path
             
             # 检查文件是否存在
             if os.path.exists(output_path):
@@ -1469,19 +900,19 @@ def generate_dwg(request_data):
                         output_path,
                         as_attachment=True,
                         download_name=download_name,
-                        mimetype='application/acad'
+                        mimetype='application/dxf' if output_ext.lower() == '.dxf' else 'application/acad'
                     )
                 except Exception as send_error:
                     print(f"直接发送文件失败: {str(send_error)}")
                     print(traceback.format_exc())
                     
                     # 发送失败时回退到旧方式 - 通过保存到static/exports目录
-                    target_path = os.path.join(output_dir, f"绿建设计专篇_{project_name}_{timestamp}.dwg")
+                    target_path = os.path.join(output_dir, f"绿建设计专篇_{project_name}_{timestamp}{output_ext}")
                     import shutil
                     shutil.copy2(output_path, target_path)
                     
                     # 构建文件URL
-                    file_url = f'/static/exports/绿建设计专篇_{project_name}_{timestamp}.dwg'
+                    file_url = f'/static/exports/绿建设计专篇_{project_name}_{timestamp}{output_ext}'
                     
                     print(f"使用备用方式发送文件，URL: {file_url}")
                     
@@ -12,6 +12,7 @@ from docx.oxml.ns import qn
 from process_custom_placeholders import process_custom_placeholders
 # 导入目录更新函数
 from utils.document_generator import update_toc
+from utils.placeholder_engine import iter_document_paragraphs
 
 def generate_transport_report(data):
     """
@@ -177,34 +178,17 @@ def set_replaced_text_font(docx_path, project_data):
             if key not in ['地图截图', '公交站点列表'] and value:
                 replacement_values.append(str(value))
         
-        # 遍历所有段落
-        for paragraph in doc.paragraphs:
+        # 遍历所有段落（包括表格中的段落）
+        for paragraph in iter_document_paragraphs(doc):
             # 检查段落文本是否包含我们的替换值
-            for value in replacement_values:
-                if value in paragraph.text:
-                    # 找到了可能包含替换值的段落，设置所有run的字体
-                    for run in paragraph.runs:
-                        if any(val in run.text for val in replacement_values):
-                            # 这个run包含我们替换的值
-                            run.font.name = '宋体'
-                            run.font.size = Pt(12)  # 小四字号为12磅
-                            run._element.rPr.rFonts.set(qn('w:eastAsia'), '宋体')
-        
-        # 遍历所有表格
-        for table in doc.tables:
-            for row in table.rows:
-                for cell in row.cells:
-                    for paragraph in cell.paragraphs:
-                        # 检查段落文本是否包含我们的替换值
-                        for value in replacement_values:
-                            if value in paragraph.text:
-                                # 找到了可能包含替换值的段落，设置所有run的字体
-                                for run in paragraph.runs:
-                                    if any(val in run.text for val in replacement_values):
-                                        # 这个run包含我们替换的值
-                                        run.font.name = '宋体'
-                                        run.font.size = Pt(12)  # 小四字号为12磅
-                                        run._element.rPr.rFonts.set(qn('w:eastAsia'), '宋体')
+            if not any(value in paragraph.text for value in replacement_values):
+                continue
+            # 找到了可能包含替换值的段落，设置包含替换值的 run 的字体
+            for run in paragraph.runs:
+                if any(val in run.text for val in replacement_values):
+                    run.font.name = '宋体'
+                    run.font.size = Pt(12)  # 小四字号为12磅
+                    run._element.rPr.rFonts.set(qn('w:eastAsia'), '宋体')
         
         # 保存修改后的文档
         doc.save(docx_path)
@@ -0,0 +1,116 @@
+"""得分表复合索引
+
+Revision ID: 3f9c1d2a7b10
+Revises:
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+import logging
+from alembic import op
+import sqlalchemy as sa
+
+logger = logging.getLogger('alembic.runtime.migration')
+
+
+# revision identifiers, used by Alembic.
+revision = '3f9c1d2a7b10'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+TABLE_NAME = '得分表'
+# 删除前把重复记录原样复制到这张表中，人工核对后可以删除，或从中恢复需要的记录
+BACKUP_TABLE_NAME = '得分表_重复记录备份'
+
+# 索引名称 -> (是否唯一, 索引列)，与 models.ScoreRecord 中的定义一致
+SCORE_INDEXES = {
+    'uix_score_project_clause_standard': (True, ['项目ID', '条文号', '评价标准']),
+    'ix_score_project_standard_specialty_level': (False, ['项目ID', '评价标准', '专业', '评价等级']),
+    'ix_score_project_specialty_level': (False, ['项目ID', '专业', '评价等级']),
+}
+
+
+# 同一项目、条文、评价标准的重复记录（旧的逐条写入方式可能留下），只保留序号最大（最后写入）的一条。
+# 评价标准为 NULL 的记录不影响唯一索引，不做处理；子查询包一层派生表，MySQL 才允许引用被删除的表
+DUPLICATE_FILTER = """
+FROM `得分表`
+WHERE `评价标准` IS NOT NULL
+  AND `序号` NOT IN (
+      SELECT keep_id FROM (
+          SELECT MAX(`序号`) AS keep_id FROM `得分表`
+          WHERE `评价标准` IS NOT NULL
+          GROUP BY `项目ID`, `条文号`, `评价标准`
+      ) AS keep_rows
+  )
+"""
+
+
+def backup_duplicate_scores(bind):
+    """把将被删除的重复记录复制到备份表，备份表已存在（上次迁移中途失败）时追加"""
+    if sa.inspect(bind).has_table(BACKUP_TABLE_NAME):
+        bind.execute(sa.text(f"INSERT INTO `{BACKUP_TABLE_NAME}` SELECT * {DUPLICATE_FILTER}"))
+    else:
+        bind.execute(sa.text(f"CREATE TABLE `{BACKUP_TABLE_NAME}` AS SELECT * {DUPLICATE_FILTER}"))
+    return bind.execute(sa.text(f"SELECT COUNT(*) FROM `{BACKUP_TABLE_NAME}`")).scalar()
+
+
+def remove_duplicate_scores(bind):
+    """先备份再删除重复的条文记录，返回删除的行数"""
+    duplicates = bind.execute(sa.text(f"SELECT COUNT(*) {DUPLICATE_FILTER}")).scalar()
+    if duplicates:
+        backed_up = backup_duplicate_scores(bind)
+        if backed_up < duplicates:
+            raise RuntimeError(
+                f"备份重复的得分记录失败（应备份 {duplicates} 条，备份表中只有 {backed_up} 条），未删除任何记录"
+            )
+        bind.execute(sa.text(f"DELETE {DUPLICATE_FILTER}"))
+        logger.warning(
+            f"得分表中有 {duplicates} 条重复的条文记录：已复制到 {BACKUP_TABLE_NAME} 表，"
+            f"每个条文保留序号最大的记录并删除其余记录，请核对备份表后自行删除"
+        )
+    return duplicates
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+
+    # 全新数据库中得分表可能尚不存在
+    table_exists = inspector.has_table(TABLE_NAME)
+    if not table_exists:
+        op.create_table(
+            TABLE_NAME,
+            sa.Column('序号', sa.Integer(), primary_key=True, autoincrement=True),
+            sa.Column('项目ID', sa.Integer(), nullable=False),
+            sa.Column('项目名称', sa.String(length=100)),
+            sa.Column('专业', sa.String(length=50)),
+            sa.Column('评价等级', sa.String(length=20)),
+            sa.Column('条文号', sa.String(length=20), nullable=False),
+            sa.Column('分类', sa.String(length=50)),
+            sa.Column('是否达标', sa.String(length=10)),
+            sa.Column('得分', sa.String(length=10)),
+            sa.Column('技术措施', sa.Text()),
+            sa.Column('评价标准', sa.String(length=20)),
+        )
+        existing = set()
+    else:
+        # 跳过已存在的索引（例如以前手动创建过的唯一索引）
+        existing = {index['name'] for index in inspector.get_indexes(TABLE_NAME)}
+        existing.update(
+            constraint['name'] for constraint in inspector.get_unique_constraints(TABLE_NAME)
+        )
+
+    if table_exists and 'uix_score_project_clause_standard' not in existing:
+        # 表中有重复记录时无法创建唯一索引
+        remove_duplicate_scores(op.get_bind())
+
+    for name, (unique, columns) in SCORE_INDEXES.items():
+        if name not in existing:
+            op.create_index(name, TABLE_NAME, columns, unique=unique)
+
+
+def downgrade():
+    inspector = sa.inspect(op.get_bind())
+    existing = {index['name'] for index in inspector.get_indexes(TABLE_NAME)}
+    for name in SCORE_INDEXES:
+        if name in existing:
+            op.drop_index(name, table_name=TABLE_NAME)
@@ -240,6 +240,32 @@ class review_standard(db.Model):
     标准名称 = db.Column(db.String(20))  # 标准名称字段
     图片路径 = db.Column(db.String(255))  # 条文图片路径字段
 
+class ScoreRecord(db.Model):
+    """得分表模型，索引与评分接口和导出查询的过滤条件对应"""
+    __tablename__ = '得分表'
+    __table_args__ = (
+        # 条文级查询与写入：update_score_direct、get_score_by_clause，导出时按项目ID过滤并按条文号排序
+        db.UniqueConstraint('项目ID', '条文号', '评价标准', name='uix_score_project_clause_standard'),
+        # 评分汇总：按项目ID和评价标准过滤，可附加专业和评价等级
+        db.Index('ix_score_project_standard_specialty_level', '项目ID', '评价标准', '专业', '评价等级'),
+        # 保存评分、获取项目评分：按项目ID、专业和评价等级过滤
+        db.Index('ix_score_project_specialty_level', '项目ID', '专业', '评价等级'),
+        {'extend_existing': True}
+    )
+
+    # 使用中文字段名
+    序号 = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    项目ID = db.Column(db.Integer, nullable=False)
+    项目名称 = db.Column(db.String(100))
+    专业 = db.Column(db.String(50))
+    评价等级 = db.Column(db.String(20))  # 基本级、提高级
+    条文号 = db.Column(db.String(20), nullable=False)
+    分类 = db.Column(db.String(50))
+    是否达标 = db.Column(db.String(10))
+    得分 = db.Column(db.String(10))
+    技术措施 = db.Column(db.Text)
+    评价标准 = db.Column(db.String(20))
+
 class FormData(db.Model):
     __tablename__ = 'form_data'
     
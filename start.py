@@ -16,9 +16,13 @@ if not os.path.exists('logs'):
 logging.basicConfig(level=logging.WARNING)
 logger = logging.getLogger(__name__)
 
+# gunicorn 工作进程数；app 据此平分模板渲染进程等按进程分配的资源，Windows 下 waitress 为单进程
+if platform.system() != 'Windows':
+    os.environ.setdefault('SERVER_WORKERS', '3')
+
 def init_database():
     """初始化数据库并创建管理员用户（如果不存在）"""
-    from app import app
+    from app import app, score_unique_index_ready
     from models import db, User
     
     try:
@@ -27,6 +31,10 @@ def init_database():
             db.create_all()
             logger.info("数据库表已创建")
             
+            # 得分表唯一索引由迁移创建，update_score_direct 依赖它完成单语句写入
+            if not score_unique_index_ready():
+                logger.warning("得分表缺少唯一索引 uix_score_project_clause_standard，请执行 flask db upgrade")
+            
             # 检查是否需要创建管理员用户
             admin = User.query.filter_by(role='admin').first()
             if not admin:
@@ -103,7 +111,7 @@ def start_server():
         
         options = {
             'bind': f'0.0.0.0:{port}', # 使用从环境变量获取的端口
-            'workers': 3,
+            'workers': int(os.environ.get('SERVER_WORKERS', '3')),
             'worker_class': 'sync',
             'threads': 4,
             'timeout': 300,
@@ -337,7 +337,7 @@ document.addEventListener('DOMContentLoaded', function() {
             
             // 发送请求到后端API
             try {
-                const response = await fetch('/api/generate_decorative_cost_report', {
+                const response = await fetchReportJob('/api/generate_decorative_cost_report', {
                     method: 'POST',
                     headers: {
                         'Content-Type': 'application/json',
@@ -2526,7 +2526,7 @@
                 console.log("发送到后端的数据:", JSON.stringify(data));
                 
                 // 发送数据到后端
-                const response = await fetch('/generate_transport_report', {
+                const response = await fetchReportJob('/generate_transport_report', {
                     method: 'POST',
                     headers: {
                         'Content-Type': 'application/json',
@@ -0,0 +1,71 @@
+/**
+ * 报告导出后台任务
+ *
+ * fetchReportJob 的用法与 fetch 相同：以后台任务方式提交导出请求，轮询任务状态，
+ * 完成后返回下载文件的 Response；任务失败时返回与原同步接口相同状态码的 JSON 错误响应，
+ * 调用方原有的 response.ok / response.json() / response.blob() 处理逻辑无需修改。
+ */
+(function (window) {
+    const POLL_INTERVAL = 1000;      // 轮询间隔（毫秒）
+    const MAX_WAIT = 30 * 60 * 1000; // 最长等待时间（毫秒）
+
+    function sleep(ms) {
+        return new Promise(resolve => setTimeout(resolve, ms));
+    }
+
+    function jsonResponse(data, status) {
+        return new Response(JSON.stringify(data), {
+            status: status,
+            headers: { 'Content-Type': 'application/json' }
+        });
+    }
+
+    /**
+     * @param {string} url 导出接口地址
+     * @param {object} options fetch 参数
+     * @param {function} [onProgress] 进度回调 (progress, message)
+     * @returns {Promise<Response>}
+     */
+    async function fetchReportJob(url, options, onProgress) {
+        options = Object.assign({}, options || {});
+        options.headers = Object.assign({}, options.headers || {}, { 'X-Report-Job': '1' });
+
+        const submitResponse = await fetch(url, options);
+        // 参数校验失败等情况接口直接返回结果，不创建任务
+        if (submitResponse.status !== 202) {
+            return submitResponse;
+        }
+        const submitted = await submitResponse.json();
+        const startedAt = Date.now();
+
+        while (Date.now() - startedAt < MAX_WAIT) {
+            await sleep(POLL_INTERVAL);
+            let statusResponse;
+            try {
+                statusResponse = await fetch(submitted.status_url, { credentials: 'same-origin' });
+            } catch (error) {
+                console.warn('查询导出任务状态失败，稍后重试:', error);
+                continue;
+            }
+            if (!statusResponse.ok) {
+                return statusResponse;
+            }
+            const job = await statusResponse.json();
+            if (onProgress) {
+                onProgress(job.progress, job.message);
+            }
+            if (job.status === 'succeeded') {
+                if (job.file_url) {
+                    return jsonResponse({ success: true, file_url: job.file_url, message: job.message }, 200);
+                }
+                return fetch(job.download_url, { credentials: 'same-origin' });
+            }
+            if (job.status === 'failed') {
+                return jsonResponse({ success: false, error: job.error }, job.status_code || 500);
+            }
+        }
+        return jsonResponse({ success: false, error: '生成超时，请稍后重试' }, 504);
+    }
+
+    window.fetchReportJob = fetchReportJob;
+})(window);
@@ -0,0 +1,56 @@
+"""
+测试公共配置
+
+app.py 在导入时读取环境变量并使用相对路径（logs/、temp/、cache/），
+这里在临时目录中导入应用，数据库使用 SQLite，不依赖 MySQL。
+"""
+
+import os
+import sys
+
+import pytest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+
+@pytest.fixture(scope='session')
+def app_module(tmp_path_factory):
+    work_dir = tmp_path_factory.mktemp('greenscore')
+    (work_dir / 'logs').mkdir()
+    os.chdir(work_dir)
+    os.environ['DATABASE_URL'] = f"sqlite:///{work_dir / 'test.db'}"
+    os.environ['CACHE_TYPE'] = 'SimpleCache'
+    os.environ['METRICS_ENABLED'] = 'false'
+    os.environ['FILE_RETENTION_ENABLED'] = 'false'
+    os.environ['QUERY_PROFILER_ENABLED'] = 'false'
+
+    import app as app_module
+    from models import db
+
+    app_module.app.config['TESTING'] = True
+    with app_module.app.app_context():
+        db.create_all()
+    return app_module
+
+
+@pytest.fixture
+def logged_in_client(app_module):
+    """已登录普通用户的测试客户端"""
+    from models import db, User
+
+    with app_module.app.app_context():
+        user = User.query.filter_by(email='scorer@example.com').first()
+        if user is None:
+            user = User(email='scorer@example.com', role='user')
+            user.set_password('password')
+            db.session.add(user)
+            db.session.commit()
+        user_id = user.id
+    client = app_module.app.test_client()
+    with client.session_transaction() as sess:
+        sess['_user_id'] = str(user_id)
+        sess['_fresh'] = True
+        sess['user_id'] = user_id
+    return client
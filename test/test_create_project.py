@@ -0,0 +1,27 @@
+"""创建项目：默认评分数据写入失败时项目一并回滚"""
+
+
+def _project_count(app_module, name):
+    with app_module.app.app_context():
+        return app_module.Project.query.filter_by(name=name).count()
+
+
+def test_project_rolled_back_when_default_scores_fail(app_module, logged_in_client, monkeypatch):
+    monkeypatch.setattr(app_module, 'create_default_scores', lambda *args: False)
+
+    response = logged_in_client.post('/create_project', json={'name': '评分失败项目', 'standard': '成都市标'})
+
+    assert response.status_code == 500
+    assert '项目未创建' in response.get_json()['error']
+    assert _project_count(app_module, '评分失败项目') == 0
+
+
+def test_project_created_with_default_scores(app_module, logged_in_client, monkeypatch):
+    seeded = []
+    monkeypatch.setattr(app_module, 'create_default_scores', lambda *args: seeded.append(args) or True)
+
+    response = logged_in_client.post('/create_project', json={'name': '正常项目', 'standard': '成都市标'})
+
+    assert response.status_code == 200, response.get_json()
+    assert seeded and seeded[0][1:] == ('正常项目', '成都市标')
+    assert _project_count(app_module, '正常项目') == 1
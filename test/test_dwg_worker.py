@@ -0,0 +1,153 @@
+"""AutoCAD 工作进程的输出文件能够移入 DWG 缓存（使用模拟的 AutoCAD 对象）"""
+
+import os
+import queue
+import threading
+
+import update_dwg_attribute
+from utils import dwg_cache
+
+
+class FakeAttribute:
+    def __init__(self, tag, text):
+        self.TagString = tag
+        self.TextString = text
+
+
+class FakeBlock:
+    ObjectName = 'AcDbBlockReference'
+    HasAttributes = True
+
+    def __init__(self, attributes):
+        self._attributes = attributes
+
+    def GetAttributes(self):
+        return self._attributes
+
+
+class FakeDocument:
+    def __init__(self, path):
+        self.path = path
+        self.ModelSpace = [FakeBlock([FakeAttribute('项目名称', '模板'), FakeAttribute('建筑面积', '0')])]
+
+    def SaveAs(self, path):
+        # 与 AutoCAD 相同：保存后文档绑定到新文件
+        with open(path, 'w', encoding='utf-8') as f:
+            for block in self.ModelSpace:
+                for attrib in block.GetAttributes():
+                    f.write(f"{attrib.TagString}={attrib.TextString}\n")
+        self.path = path
+
+    def Close(self, save=False):
+        pass
+
+
+class FakeDocuments:
+    def __init__(self):
+        self.opened = []
+
+    def Open(self, path):
+        document = FakeDocument(path)
+        self.opened.append(document)
+        return document
+
+
+class FakeAcad:
+    def __init__(self):
+        self.Documents = FakeDocuments()
+
+
+def _run_jobs(jobs):
+    job_queue = queue.Queue()
+    result_queue = queue.Queue()
+    for job in jobs:
+        job_queue.put(job)
+    job_queue.put(None)
+    update_dwg_attribute._acad_worker_main(job_queue, result_queue)
+    return [result_queue.get_nowait() for _ in jobs]
+
+
+def test_worker_output_is_released_and_cached(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    acad = FakeAcad()
+    monkeypatch.setattr(update_dwg_attribute, 'get_acad_application', lambda: acad)
+    template_path = tmp_path / 'template.dwg'
+    template_path.write_text('template', encoding='utf-8')
+
+    outputs = [str(tmp_path / 'out1.dwg'), str(tmp_path / 'out2.dwg')]
+    results = _run_jobs([
+        {'job_id': 'a', 'template_path': str(template_path), 'output_path': outputs[0],
+         'attributes': {'项目名称': '项目一', '建筑面积': '100'}},
+        {'job_id': 'b', 'template_path': str(template_path), 'output_path': outputs[1],
+         'attributes': {'项目名称': '项目二'}},
+    ])
+    assert all(result['success'] for result in results)
+
+    # 模板只打开一次，文档绑定在工作进程的暂存文件上，而不是任何一个输出文件
+    assert len(acad.Documents.opened) == 1
+    document = acad.Documents.opened[0]
+    assert document.path not in outputs
+    assert os.path.dirname(document.path) == os.path.abspath(update_dwg_attribute.ACAD_SCRATCH_DIR)
+
+    # 第二个任务未提供的属性恢复为模板原始内容
+    assert open(outputs[1], encoding='utf-8').read() == '项目名称=项目二\n建筑面积=0\n'
+
+    cache_key = dwg_cache.get_dwg_cache_key(str(template_path), {'项目名称': '项目二'})
+    cached_path = dwg_cache.store_dwg(cache_key, outputs[1])
+    assert cached_path != outputs[1]
+    assert not os.path.exists(outputs[1])
+    assert dwg_cache.get_cached_dwg(cache_key) == cached_path
+
+
+class FakeProcess:
+    def __init__(self, alive=True):
+        self.pid = id(self)
+        self.alive = alive
+        self.terminated = False
+
+    def is_alive(self):
+        return self.alive
+
+    def terminate(self):
+        self.terminated = True
+        self.alive = False
+
+    def join(self, timeout=None):
+        pass
+
+
+def _pending(process):
+    return {'event': threading.Event(), 'result': None, 'submitted_at': 0, 'process': process}
+
+
+def test_old_worker_fails_only_its_own_jobs(monkeypatch):
+    old, new = FakeProcess(alive=False), FakeProcess()
+    jobs = {'old': _pending(old), 'new': _pending(new)}
+    monkeypatch.setattr(update_dwg_attribute, '_pending_jobs', dict(jobs))
+
+    update_dwg_attribute._fail_pending_jobs(old, "AutoCAD工作进程已退出")
+
+    assert jobs['old']['event'].is_set() and not jobs['old']['result']['success']
+    assert not jobs['new']['event'].is_set()
+    assert list(update_dwg_attribute._pending_jobs) == ['new']
+
+
+def test_hung_worker_is_terminated_and_replaced(monkeypatch):
+    hung = FakeProcess()
+    queued = _pending(hung)
+    started = []
+    monkeypatch.setattr(update_dwg_attribute, '_worker_process', hung)
+    monkeypatch.setattr(update_dwg_attribute, '_pending_jobs', {'queued': queued})
+    monkeypatch.setattr(update_dwg_attribute, '_ensure_worker', lambda: started.append(True))
+
+    update_dwg_attribute._restart_hung_worker(hung)
+
+    assert hung.terminated
+    assert started == [True]
+    # 排在无响应任务后面的任务立即失败，不再等到超时
+    assert queued['event'].is_set() and not queued['result']['success']
+
+    # 其他请求随后超时，工作进程已经换过，不再重复重启
+    monkeypatch.setattr(update_dwg_attribute, '_worker_process', FakeProcess())
+    update_dwg_attribute._restart_hung_worker(hung)
+    assert started == [True]
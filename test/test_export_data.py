@@ -0,0 +1,27 @@
+"""项目导出数据快照：同一版本的多次导出只查询一次数据库"""
+
+import export
+
+
+def test_export_data_snapshot_shared_and_versioned(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    calls = []
+
+    def fake_fetch(project_id):
+        calls.append(project_id)
+        return [{'项目名称': f"项目{len(calls)}", '评价标准': '成都市标'}]
+
+    monkeypatch.setattr(export, '_fetch_project_export_data', fake_fetch)
+    monkeypatch.setattr(export, '_export_data_memo', {})
+
+    first = export.load_project_export_data(7)
+    second = export.load_project_export_data(7)
+    assert calls == [7]
+    assert first == second
+    # 返回副本，调用方修改不影响快照
+    first[0]['项目名称'] = '已修改'
+    assert export.load_project_export_data(7)[0]['项目名称'] == '项目1'
+
+    export.bump_project_data_version(7)
+    assert export.load_project_export_data(7)[0]['项目名称'] == '项目2'
+    assert calls == [7, 7]
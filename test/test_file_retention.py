@@ -0,0 +1,44 @@
+"""文件清理：后台线程在第一个请求时启动，任务状态和指标快照不被清理"""
+
+import os
+import time
+
+from flask import Flask
+
+from utils import file_retention
+
+
+def test_sweeper_starts_on_first_request(monkeypatch):
+    started = []
+    monkeypatch.setattr(file_retention, '_sweeper_loop', lambda: started.append(os.getpid()))
+    monkeypatch.setattr(file_retention, '_sweeper_thread', None)
+    monkeypatch.setattr(file_retention, '_sweeper_pid', None)
+
+    app = Flask(__name__)
+    app.add_url_rule('/ping', 'ping', lambda: 'ok')
+    file_retention.init_file_retention(app)
+    # 导入应用（gunicorn 主进程、一次性脚本）时不启动
+    assert file_retention._sweeper_thread is None
+
+    app.test_client().get('/ping')
+    file_retention._sweeper_thread.join(1)
+    assert started == [os.getpid()]
+    assert file_retention._sweeper_pid == os.getpid()
+
+
+def test_temp_rule_keeps_job_status_and_metrics(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    old = time.time() - 2 * 24 * 3600
+    for rel_path in ('report_jobs/job.json', 'metrics/123.json', 'versions/1.json', 'old.docx'):
+        path = tmp_path / 'temp' / rel_path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text('{}', encoding='utf-8')
+        os.utime(path, (old, old))
+
+    temp_rule = next(rule for rule in file_retention.DEFAULT_RETENTION_RULES if rule['path'] == 'temp')
+    result = file_retention.sweep_directory(temp_rule)
+
+    assert result['files_deleted'] == 1
+    assert not (tmp_path / 'temp' / 'old.docx').exists()
+    assert (tmp_path / 'temp' / 'report_jobs' / 'job.json').exists()
+    assert (tmp_path / 'temp' / 'metrics' / '123.json').exists()
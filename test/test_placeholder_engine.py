@@ -0,0 +1,78 @@
+"""占位符替换：占位符被 Word 拆分到多个 run 中"""
+
+from docx import Document
+
+from utils.placeholder_engine import (
+    replace_placeholders_in_runs,
+    replace_placeholders_in_document,
+    find_placeholder_paragraph,
+    iter_document_paragraphs,
+)
+from word_template import replace_generic_placeholders
+
+
+def _split_paragraph(container, parts):
+    paragraph = container.add_paragraph()
+    for part in parts:
+        paragraph.add_run(part)
+    return paragraph
+
+
+def test_placeholder_split_across_runs_keeps_first_run_format():
+    doc = Document()
+    paragraph = _split_paragraph(doc, ['项目：', '{项', '目名', '称}', '，完毕'])
+    paragraph.runs[1].bold = True
+
+    count = replace_placeholders_in_runs(paragraph.runs, {'项目名称': '绿色建筑'})
+
+    assert count == 1
+    assert paragraph.text == '项目：绿色建筑，完毕'
+    # 替换值写入占位符开始所在的 run，其余 run 被清空
+    assert [run.text for run in paragraph.runs] == ['项目：', '绿色建筑', '', '', '，完毕']
+    assert paragraph.runs[1].bold is True
+
+
+def test_multiple_placeholders_sharing_runs():
+    doc = Document()
+    paragraph = _split_paragraph(doc, ['{a', '}-{', 'b}{c}', '{未知}'])
+
+    count = replace_placeholders_in_runs(paragraph.runs, {'a': '1', 'b': '22', 'c': 333})
+
+    assert count == 3
+    assert paragraph.text == '1-22333{未知}'
+
+
+def test_document_tables_and_merged_cells():
+    doc = Document()
+    _split_paragraph(doc, ['{建筑', '面积}'])
+    table = doc.add_table(rows=1, cols=2)
+    merged = table.cell(0, 0).merge(table.cell(0, 1))
+    merged.paragraphs[0].add_run('{城')
+    merged.paragraphs[0].add_run('市}')
+
+    replacements = {'建筑面积': '100', '城市': '成都'}
+    # 合并单元格中的段落只处理一次
+    assert replace_placeholders_in_document(doc, replacements) == 2
+    assert doc.paragraphs[0].text == '100'
+    assert table.cell(0, 0).text == '成都'
+
+
+def test_find_placeholder_paragraph_across_runs():
+    doc = Document()
+    _split_paragraph(doc, ['普通段落'])
+    target = _split_paragraph(doc, ['{地图', '截图}'])
+
+    assert find_placeholder_paragraph(iter_document_paragraphs(doc), '地图截图')._p is target._p
+    assert find_placeholder_paragraph(doc.paragraphs, '公交站点列表') is None
+
+
+def test_replace_generic_placeholders_file(tmp_path):
+    doc = Document()
+    _split_paragraph(doc, ['地址：{项目', '地址}', '，编号：{编号}'])
+    doc_path = str(tmp_path / 'report.docx')
+    doc.save(doc_path)
+
+    assert replace_generic_placeholders(doc_path, {'项目地址': '成都市', '编号': None}) is True
+    assert Document(doc_path).paragraphs[0].text == '地址：成都市，编号：'
+    # 没有可替换的占位符时不改动文件
+    assert replace_generic_placeholders(doc_path, {'项目地址': '重庆市'}) is False
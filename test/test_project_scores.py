@@ -0,0 +1,31 @@
+"""项目表评分：重新计算的汇总与已保存的评分相同时不更新项目数据版本"""
+
+from models import db, User
+
+
+def test_unchanged_scores_do_not_bump_version(app_module, logged_in_client, monkeypatch):
+    bumped = []
+    monkeypatch.setattr(app_module, 'bump_project_data_version', bumped.append)
+    scores = {
+        'specialty_scores': {'建筑专业': 12.5},
+        'specialty_scores_by_category': {'建筑专业': {'安全耐久': 12.5}},
+        'total_score': 52.5,
+        'evaluation_result': '基本级',
+    }
+
+    with app_module.app.app_context():
+        user = User.query.filter_by(email='scorer@example.com').first()
+        project = app_module.Project(name='汇总项目', standard='成都市标', user_id=user.id)
+        db.session.add(project)
+        db.session.commit()
+        project_id = project.id
+
+        assert app_module.update_project_scores_efficient(project_id, scores)
+        assert bumped == [project_id]
+        # 缓存未命中时重新计算出同样的汇总
+        assert app_module.update_project_scores_efficient(project_id, dict(scores))
+        assert bumped == [project_id]
+        # 调用方自行更新版本
+        assert app_module.update_project_scores_efficient(project_id, dict(scores, total_score=60), bump_version=False)
+        assert bumped == [project_id]
+        assert db.session.get(app_module.Project, project_id).total_score == 60
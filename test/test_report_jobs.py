@@ -0,0 +1,63 @@
+"""报告任务：执行进程退出后轮询立即返回失败"""
+
+import os
+import subprocess
+import sys
+import time
+
+from utils import report_jobs
+
+
+def _dead_pid():
+    process = subprocess.Popen([sys.executable, '-c', 'pass'])
+    process.wait()
+    return process.pid
+
+
+def _write(job_id, **fields):
+    job = {'job_id': job_id, 'type': 'word', 'status': 'running', 'progress': 5,
+           'user_id': None, 'pid': os.getpid(), 'created_at': time.time()}
+    job.update(fields)
+    report_jobs._write_job(job)
+
+
+def test_job_of_dead_process_fails_immediately(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs(report_jobs.REPORT_JOB_DIR)
+
+    dead, alive, queued, stuck = (f"{index:032x}" for index in range(1, 5))
+    _write(dead, pid=_dead_pid(), started_at=time.time())
+    _write(alive, started_at=time.time())
+    # 排队很久但进程仍在运行
+    _write(queued, status='queued', created_at=time.time() - 2 * report_jobs.REPORT_JOB_STALE_AGE)
+    _write(stuck, started_at=time.time() - report_jobs.REPORT_JOB_STALE_AGE - 1)
+
+    assert report_jobs.get_report_job(dead)['status'] == 'failed'
+    assert report_jobs.get_report_job(alive)['status'] == 'running'
+    assert report_jobs.get_report_job(queued)['status'] == 'queued'
+    assert report_jobs.get_report_job(stuck)['status'] == 'failed'
+    # 失败状态写回文件，其他进程轮询时看到同样的结果
+    assert report_jobs._read_job(dead)['error'] == '任务已中断，请重新生成'
+
+
+def test_expire_finished_jobs(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs(report_jobs.REPORT_JOB_DIR)
+    old = time.time() - report_jobs.REPORT_JOB_RETENTION - 60
+
+    finished, recent, queued = (f"{index:032x}" for index in range(1, 4))
+    _write(finished, status='succeeded', finished_at=old)
+    _write(recent, status='succeeded', finished_at=time.time())
+    _write(queued, status='queued', created_at=old)
+    for job_id in (finished, recent):
+        with open(report_jobs._job_data_file(job_id), 'wb') as f:
+            f.write(b'docx')
+    for job_id in (finished, queued):
+        for path in (report_jobs._job_status_file(job_id), report_jobs._job_data_file(job_id)):
+            if os.path.exists(path):
+                os.utime(path, (old, old))
+
+    assert report_jobs.expire_report_jobs() == 1
+    assert sorted(os.listdir(report_jobs.REPORT_JOB_DIR)) == sorted([
+        f"{queued}.json", f"{recent}.json", f"{recent}.data",
+    ])
@@ -0,0 +1,58 @@
+"""请求统计：工作进程重启后计数器不减少"""
+
+import json
+import os
+import subprocess
+import sys
+
+from utils import request_metrics
+
+
+def _dead_pid():
+    process = subprocess.Popen([sys.executable, '-c', 'pass'])
+    process.wait()
+    return process.pid
+
+
+def _requests_total(output, endpoint):
+    prefix = f'greenscore_http_requests_total{{endpoint="{endpoint}",method="GET",status="200"}} '
+    for line in output.splitlines():
+        if line.startswith(prefix):
+            return int(line[len(prefix):])
+    return 0
+
+
+def test_dead_worker_counts_are_archived(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs(request_metrics.METRICS_DIR)
+    monkeypatch.setattr(request_metrics, '_requests', {('index', 'GET', '200'): 2})
+    dead_file = os.path.join(request_metrics.METRICS_DIR, f"{_dead_pid()}-0123456789ab.json")
+    with open(dead_file, 'w', encoding='utf-8') as f:
+        json.dump({'requests': [[['index', 'GET', '200'], 5]], 'sql': [[['index'], [3, 0.5]]]}, f)
+
+    first = request_metrics.render_prometheus_metrics()
+    assert _requests_total(first, 'index') == 7
+    assert 'greenscore_metrics_workers 1' in first
+    # 已退出进程的快照并入归档后删除
+    assert not os.path.exists(dead_file)
+    assert os.path.exists(request_metrics.METRICS_ARCHIVE_FILE)
+
+    second = request_metrics.render_prometheus_metrics()
+    assert _requests_total(second, 'index') == 7
+    assert 'greenscore_db_queries_total{endpoint="index"} 3' in second
+
+
+def test_folded_snapshot_left_behind_is_not_counted_twice(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs(request_metrics.METRICS_DIR)
+    monkeypatch.setattr(request_metrics, '_requests', {})
+    name = f"{_dead_pid()}-0123456789ab.json"
+    snapshot = {'requests': [[['index', 'GET', '200'], 5]]}
+    with open(os.path.join(request_metrics.METRICS_DIR, name), 'w', encoding='utf-8') as f:
+        json.dump(snapshot, f)
+    # 模拟归档写入后、删除快照前进程退出
+    with open(request_metrics.METRICS_ARCHIVE_FILE, 'w', encoding='utf-8') as f:
+        json.dump(dict(snapshot, folded=[name]), f)
+
+    assert _requests_total(request_metrics.render_prometheus_metrics(), 'index') == 5
+    assert _requests_total(request_metrics.render_prometheus_metrics(), 'index') == 5
@@ -0,0 +1,42 @@
+"""缓存读取-修改-写回：并发增量不丢失，不支持原子更新的后端在启动时报错"""
+
+import threading
+
+import pytest
+from flask import Flask
+from flask_caching import Cache
+
+from utils.shared_cache import update_cache_value, check_cache_backend
+
+
+def _make_cache(tmp_path, cache_type):
+    app = Flask(__name__)
+    return Cache(app, config={'CACHE_TYPE': cache_type, 'CACHE_DIR': str(tmp_path)})
+
+
+def _increment_concurrently(cache, threads=8, times=50):
+    def worker():
+        for _ in range(times):
+            update_cache_value(cache, 'counter', lambda value: (value or 0) + 1)
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return cache.get('counter')
+
+
+@pytest.mark.parametrize('cache_type', ['SimpleCache', 'utils.shared_cache.SQLiteCache'])
+def test_concurrent_updates_are_not_lost(tmp_path, cache_type):
+    cache = _make_cache(tmp_path, cache_type)
+    check_cache_backend(cache)
+    assert _increment_concurrently(cache) == 8 * 50
+
+
+def test_non_atomic_backend_is_rejected(tmp_path):
+    cache = _make_cache(tmp_path, 'FileSystemCache')
+    with pytest.raises(RuntimeError):
+        check_cache_backend(cache)
+    with pytest.raises(RuntimeError):
+        update_cache_value(cache, 'tag:project:1', lambda keys: {'score_summary_1'})
@@ -0,0 +1,29 @@
+"""update_score_direct 在已登录请求中连续调用"""
+
+from sqlalchemy import text
+
+from models import db
+
+
+def test_update_score_direct_twice_when_logged_in(app_module, logged_in_client, monkeypatch):
+    # SQLite 不支持 ON DUPLICATE KEY UPDATE，使用先更新、再插入的写法
+    monkeypatch.setattr(app_module, '_score_unique_index_ready', False)
+    client = logged_in_client
+
+    for score in ('1', 2):
+        response = client.post('/api/update_score_direct', json={
+            'project_id': 1,
+            'clause_number': '7.2.1',
+            'score': score,
+            'standard': '成都市标',
+        })
+        assert response.status_code == 200, response.get_json()
+        assert response.get_json()['success'] is True
+        # 返回的是得分字段实际保存的字符串
+        assert response.get_json()['data']['score'] == str(score)
+
+    with app_module.app.app_context():
+        rows = db.session.execute(text(
+            "SELECT `得分` FROM `得分表` WHERE `项目ID` = 1 AND `条文号` = '7.2.1' AND `评价标准` = '成都市标'"
+        )).fetchall()
+    assert [row[0] for row in rows] == ['2']
@@ -1,5 +1,11 @@
 import os
 import time
+import shutil
+import hashlib
+import uuid
+import queue
+import threading
+import multiprocessing
 from typing import Optional
 import platform
 
@@ -55,6 +61,49 @@ def get_acad_application(max_retries: int = 3, retry_delay: float = 2.0) -> Opti
                     return None
     return None
 
+def build_attribute_index(model_space) -> dict:
+    """
+    遍历一次模型空间，建立 属性标签 -> [[属性对象, 模板原始文字], ...] 的索引
+
+    模板原始文字用于复用已打开的模板时，把本次未提供的属性恢复为模板中的内容。
+    """
+    attribute_index = {}
+    for item in model_space:
+        try:
+            if item.ObjectName != "AcDbBlockReference" or not item.HasAttributes:
+                continue
+            for attrib in item.GetAttributes():
+                attribute_index.setdefault(attrib.TagString, []).append([attrib, attrib.TextString])
+        except Exception as e:
+            print(f"获取实体属性标签时出错: {str(e)}")
+            continue
+    return attribute_index
+
+def write_attributes(attribute_index: dict, attributes: dict[str, str], restore_missing: bool = False) -> set:
+    """
+    按索引写入属性文字，返回已更新的属性标签集合
+
+    restore_missing 为 True 时，attributes 中没有的标签恢复为模板原始文字
+    """
+    updated_attributes = set()
+    for tag_name, attribs in attribute_index.items():
+        if tag_name in attributes:
+            attr_value = attributes.get(tag_name)
+            attr_value = "" if attr_value is None else str(attr_value)
+        elif restore_missing:
+            attr_value = None
+        else:
+            continue
+        for attrib, original_text in attribs:
+            try:
+                attrib.TextString = original_text if attr_value is None else attr_value
+            except Exception as e:
+                print(f"更新属性 {tag_name} 时出错: {str(e)}")
+                continue
+            if attr_value is not None:
+                updated_attributes.add(tag_name)
+    return updated_attributes
+
 def update_attribute_text(template_path: str, output_path: str, attributes: dict[str, str]):
     # 检查文件是否存在
     template_path = os.path.abspath(template_path)
@@ -104,52 +153,16 @@ def update_attribute_text(template_path: str, output_path: str, attributes: dict
                     return
                 
                 print("正在查找带有属性的块引用...")
-                block_refs = [item for item in model_space if item.ObjectName == "AcDbBlockReference" and item.HasAttributes]
-                print(f"找到 {len(block_refs)} 个带有属性的块引用")
-                
-                # 记录已更新的属性
-                updated_attributes = set()
-                
-                # 记录所有可用的属性标签
-                all_tags = set()
-                
-                # 首先收集所有可用的属性标签
-                for entity in block_refs:
-                    try:
-                        for attrib in entity.GetAttributes():
-                            tag_name = attrib.TagString
-                            all_tags.add(tag_name)
-                    except Exception as e:
-                        print(f"获取实体属性标签时出错: {str(e)}")
-                        continue
-                
-                print(f"DWG文件中找到的属性标签: {', '.join(sorted(all_tags))}")
+                attribute_index = build_attribute_index(model_space)
+                print(f"DWG文件中找到的属性标签: {', '.join(sorted(attribute_index))}")
                 print(f"需要更新的属性标签: {', '.join(sorted(attributes.keys()))}")
                 
                 # 检查哪些属性标签在DWG文件中不存在
-                missing_tags = set(attributes.keys()) - all_tags
+                missing_tags = set(attributes.keys()) - set(attribute_index)
                 if missing_tags:
                     print(f"警告: 以下属性标签在DWG文件中不存在: {', '.join(sorted(missing_tags))}")
                 
-                for entity in block_refs:
-                    try:
-                        # 遍历所有属性
-                        for attrib in entity.GetAttributes():
-                            # 检查标签名称是否在需要更新的属性字典中
-                            tag_name = attrib.TagString
-                            if tag_name in attributes:
-                                # 获取属性值，确保不为None
-                                attr_value = attributes.get(tag_name, "")
-                                if attr_value is None:
-                                    attr_value = ""
-                                
-                                # 更新文字内容
-                                attrib.TextString = attr_value
-                                updated_attributes.add(tag_name)
-                                print(f"已更新属性: {tag_name} = {attr_value[:30] + '...' if len(attr_value) > 30 else attr_value}")
-                    except Exception as e:
-                        print(f"处理实体属性时出错: {str(e)}")
-                        continue
+                updated_attributes = write_attributes(attribute_index, attributes)
                 
                 # 检查是否所有属性都已更新
                 not_updated = set(attributes.keys()) - updated_attributes
@@ -181,3 +194,258 @@ def update_attribute_text(template_path: str, output_path: str, attributes: dict
             pythoncom.CoUninitialize()
         except:
             pass
+
+
+# ---------------------------------------------------------------------------
+# 常驻 AutoCAD 工作进程
+#
+# 每次调用 update_attribute_text 都要初始化COM、连接AutoCAD、等待加载并打开模板，多个请求同时导出时
+# 还会争用同一个AutoCAD实例而超时。工作进程只连接一次AutoCAD，模板打开后保持打开状态，
+# 导出任务通过队列逐个处理，并发请求排队等待并可以查询排队情况。
+# 任务等待超时说明工作进程卡住（COM调用无响应），终止它并启动新的工作进程，后面排队的任务不会一直等下去。
+# ---------------------------------------------------------------------------
+
+# 单个任务（含排队时间）的最长等待秒数
+ACAD_JOB_TIMEOUT = 300
+# 工作进程中保持打开的模板数量上限
+ACAD_MAX_OPEN_TEMPLATES = 8
+# 工作进程自己的暂存文件目录：打开的模板另存到这里，再复制到输出路径
+ACAD_SCRATCH_DIR = os.path.join('temp', 'acad_worker')
+
+_worker_lock = threading.Lock()
+_worker_process = None
+_job_queue = None
+_result_queue = None
+_result_thread = None
+# 等待结果的任务: job_id -> {'event', 'result', 'submitted_at', 'process'}，process 为接收该任务的工作进程
+_pending_jobs = {}
+_worker_stats = {'completed': 0, 'failed': 0, 'timeouts': 0, 'restarts': 0}
+
+
+def _close_template(entry):
+    try:
+        entry['doc'].Close(False)
+    except Exception as e:
+        print(f"关闭DWG模板时出错: {str(e)}")
+
+
+def _scratch_path(template_path: str) -> str:
+    """模板对应的暂存文件，每个模板一个，由工作进程独占"""
+    name = hashlib.md5(os.path.abspath(template_path).encode('utf-8')).hexdigest()
+    return os.path.abspath(os.path.join(ACAD_SCRATCH_DIR, f"{name}.dwg"))
+
+
+def _get_open_template(acad, templates: dict, template_path: str) -> dict:
+    """获取已打开的模板，未打开或模板文件已修改时重新打开"""
+    mtime = os.path.getmtime(template_path)
+    entry = templates.get(template_path)
+    if entry and entry['mtime'] == mtime:
+        return entry
+    if entry:
+        _close_template(templates.pop(template_path))
+
+    print(f"AutoCAD工作进程正在打开模板: {template_path}")
+    doc = acad.Documents.Open(template_path)
+    if not doc:
+        raise RuntimeError(f"无法打开DWG文件: {template_path}")
+    entry = {
+        'doc': doc,
+        'mtime': mtime,
+        'attribute_index': build_attribute_index(doc.ModelSpace),
+    }
+    templates[template_path] = entry
+    # 超过上限时关闭最早打开的模板
+    while len(templates) > ACAD_MAX_OPEN_TEMPLATES:
+        _close_template(templates.pop(next(iter(templates))))
+    return entry
+
+
+def _acad_worker_main(job_queue, result_queue):
+    """工作进程入口：保持AutoCAD连接，逐个处理队列中的导出任务"""
+    try:
+        pythoncom.CoInitialize()
+    except Exception:
+        pass
+    acad = None
+    templates = {}
+    try:
+        while True:
+            job = job_queue.get()
+            if job is None:
+                break
+            job_id = job['job_id']
+            template_path = job['template_path']
+            try:
+                if acad is None:
+                    acad = get_acad_application()
+                    if not acad:
+                        raise RuntimeError("无法连接到AutoCAD应用程序")
+                entry = _get_open_template(acad, templates, template_path)
+                # 复用的模板上可能保留着上一个任务的文字，未提供的标签恢复为模板原始内容
+                write_attributes(entry['attribute_index'], job['attributes'], restore_missing=True)
+                # SaveAs 之后 AutoCAD 把保存的文件作为当前文档一直占用（Windows下被锁定），
+                # 直接保存到输出路径会导致移入DWG缓存和清理都失败。这里保存到工作进程自己的暂存文件，
+                # 再复制出一份不被占用的输出文件
+                scratch_path = _scratch_path(template_path)
+                os.makedirs(os.path.dirname(scratch_path), exist_ok=True)
+                entry['doc'].SaveAs(scratch_path)
+                shutil.copyfile(scratch_path, job['output_path'])
+                result_queue.put({'job_id': job_id, 'success': True, 'output_path': job['output_path']})
+            except Exception as e:
+                print(f"AutoCAD工作进程处理任务失败: {str(e)}")
+                # 文档或AutoCAD连接可能已失效，下一个任务重新打开模板并重新连接
+                entry = templates.pop(template_path, None)
+                if entry:
+                    _close_template(entry)
+                acad = None
+                result_queue.put({'job_id': job_id, 'success': False, 'error': str(e)})
+    finally:
+        for entry in templates.values():
+            _close_template(entry)
+        try:
+            pythoncom.CoUninitialize()
+        except Exception:
+            pass
+
+
+def _fail_pending_jobs(process, error: str):
+    """使交给指定工作进程的任务失败，已交给新工作进程的任务不受影响"""
+    with _worker_lock:
+        job_ids = [job_id for job_id, pending in _pending_jobs.items() if pending['process'] is process]
+        jobs = [_pending_jobs.pop(job_id) for job_id in job_ids]
+    for pending in jobs:
+        pending['result'] = {'success': False, 'error': error}
+        pending['event'].set()
+
+
+def _result_loop(result_queue, process):
+    """接收工作进程返回的结果，唤醒等待的请求线程"""
+    while True:
+        try:
+            result = result_queue.get(timeout=5)
+        except queue.Empty:
+            if not process.is_alive():
+                print("AutoCAD工作进程已退出")
+                _fail_pending_jobs(process, "AutoCAD工作进程已退出")
+                return
+            continue
+        except (EOFError, OSError):
+            _fail_pending_jobs(process, "AutoCAD工作进程已退出")
+            return
+        with _worker_lock:
+            pending = _pending_jobs.pop(result['job_id'], None)
+            _worker_stats['completed' if result['success'] else 'failed'] += 1
+        if pending:
+            pending['result'] = result
+            pending['event'].set()
+
+
+def _ensure_worker():
+    """
+    启动工作进程，进程已退出时重新启动
+
+    返回:
+    - tuple: (工作进程, 任务队列)
+    """
+    global _worker_process, _job_queue, _result_queue, _result_thread
+    with _worker_lock:
+        if _worker_process is not None and _worker_process.is_alive():
+            return _worker_process, _job_queue
+        if _worker_process is not None:
+            _worker_stats['restarts'] += 1
+        _job_queue = multiprocessing.Queue()
+        _result_queue = multiprocessing.Queue()
+        _worker_process = multiprocessing.Process(
+            target=_acad_worker_main,
+            args=(_job_queue, _result_queue),
+            name='acad-worker',
+            daemon=True,
+        )
+        _worker_process.start()
+        _result_thread = threading.Thread(
+            target=_result_loop,
+            args=(_result_queue, _worker_process),
+            name='acad-worker-results',
+            daemon=True,
+        )
+        _result_thread.start()
+        print(f"AutoCAD工作进程已启动, PID: {_worker_process.pid}")
+        return _worker_process, _job_queue
+
+
+def _restart_hung_worker(process):
+    """终止无响应的工作进程并启动新的工作进程，交给它的其余任务立即失败"""
+    with _worker_lock:
+        if process is not _worker_process:
+            # 其他等待超时的请求已经重启过
+            return
+    if process.is_alive():
+        print(f"AutoCAD工作进程无响应，终止并重新启动, PID: {process.pid}")
+        process.terminate()
+        process.join(5)
+    _fail_pending_jobs(process, "AutoCAD工作进程无响应，已重新启动，请重试")
+    _ensure_worker()
+
+
+def submit_dwg_job(template_path: str, output_path: str, attributes: dict[str, str], timeout: float = ACAD_JOB_TIMEOUT) -> str:
+    """
+    将DWG导出任务交给常驻AutoCAD工作进程，等待完成
+
+    返回:
+    - str: 生成的DWG文件路径
+
+    异常:
+    - TimeoutError: 排队和处理总时间超过 timeout
+    - RuntimeError: 工作进程处理失败
+    """
+    if not IS_WINDOWS:
+        raise RuntimeError("DWG导出功能仅支持Windows环境")
+    template_path = os.path.abspath(template_path)
+    output_path = os.path.abspath(output_path)
+    if not os.path.exists(template_path):
+        raise FileNotFoundError(f"模板文件不存在: {template_path}")
+
+    process, job_queue = _ensure_worker()
+    job_id = uuid.uuid4().hex
+    pending = {'event': threading.Event(), 'result': None, 'submitted_at': time.time(), 'process': process}
+    with _worker_lock:
+        queued_ahead = len(_pending_jobs)
+        _pending_jobs[job_id] = pending
+    if queued_ahead:
+        print(f"DWG导出任务排队中，前面还有 {queued_ahead} 个任务")
+    job_queue.put({
+        'job_id': job_id,
+        'template_path': template_path,
+        'output_path': output_path,
+        'attributes': {key: ("" if value is None else str(value)) for key, value in attributes.items()},
+    })
+
+    if not pending['event'].wait(timeout):
+        with _worker_lock:
+            timed_out = _pending_jobs.pop(job_id, None) is not None
+            if timed_out:
+                _worker_stats['timeouts'] += 1
+        if timed_out:
+            # 工作进程 is_alive() 仍为 True，_ensure_worker 不会重启它，这里主动终止
+            _restart_hung_worker(process)
+            raise TimeoutError(f"DWG导出任务等待超时（{timeout}秒），当前排队任务 {queued_ahead} 个")
+        # 结果恰好在超时时到达，结果线程已取走任务，马上会设置结果
+        pending['event'].wait()
+
+    result = pending['result']
+    if not result['success']:
+        raise RuntimeError(result['error'])
+    return result['output_path']
+
+
+def get_acad_worker_status() -> dict:
+    """返回工作进程状态、排队任务数和累计处理统计"""
+    with _worker_lock:
+        now = time.time()
+        return {
+            'running': _worker_process is not None and _worker_process.is_alive(),
+            'pid': _worker_process.pid if _worker_process is not None else None,
+            'queued_jobs': len(_pending_jobs),
+            'oldest_wait_seconds': round(max((now - job['submitted_at'] for job in _pending_jobs.values()), default=0), 1),
+            **_worker_stats,
+        }
@@ -0,0 +1,92 @@
+"""
+缓存访问层
+
+评分相关接口原来先 cache.has 再 cache.get / cache.delete，每个键要访问两次缓存；保存评分时逐个检查并删除十个键。
+这里提供统一的访问方式：
+- get_or_compute: 一次读取，缺失时计算并写入（共享缓存后端保证只有一个进程计算）；
+- delete_cached: 多个键一次删除，不存在的键直接忽略，无需先检查；
+- 标签: 写入时把键登记到标签下（例如 "project:12" 表示项目12的全部缓存），invalidate_tag 一次清除标签下的所有键。
+"""
+
+import logging
+from utils.shared_cache import get_or_set_cache_value, update_cache_value
+from utils.request_metrics import record_cache_access
+
+logger = logging.getLogger('greenscore')
+
+_TAG_PREFIX = 'tag:'
+
+
+def project_cache_tag(project_id):
+    """项目相关缓存的标签"""
+    return f"project:{project_id}"
+
+
+def _tag_key(tag):
+    return f"{_TAG_PREFIX}{tag}"
+
+
+def _register_tags(cache, key, tags):
+    for tag in tags:
+        try:
+            # 标签本身不过期，随 invalidate_tag 一起删除
+            update_cache_value(cache, _tag_key(tag), lambda keys: set(keys or ()) | {key}, timeout=0)
+        except Exception as e:
+            logger.warning(f"登记缓存标签失败: {tag}, {str(e)}")
+
+
+def get_or_compute(cache, key, compute, timeout=None, tags=(), metric_name='cache'):
+    """
+    读取缓存，不存在时调用 compute 计算并写入
+
+    参数:
+    - compute: 无参数函数，返回 None 表示不缓存
+    - tags: 新写入的键登记到这些标签下
+    - metric_name: 命中统计中的缓存名称，见 utils/request_metrics.py
+
+    返回:
+    - 缓存值或计算结果
+    """
+    computed = []
+
+    def compute_value():
+        value = compute()
+        computed.append(value is not None)
+        return value
+
+    value = get_or_set_cache_value(cache, key, compute_value, timeout=timeout)
+    record_cache_access(metric_name, not computed)
+    if tags and any(computed):
+        _register_tags(cache, key, tags)
+    return value
+
+
+def set_cached(cache, key, value, timeout=None, tags=()):
+    """写入缓存并登记标签"""
+    cache.set(key, value, timeout=timeout)
+    if tags:
+        _register_tags(cache, key, tags)
+
+
+def delete_cached(cache, *keys):
+    """一次删除多个键，不存在的键直接忽略"""
+    keys = [key for key in dict.fromkeys(keys) if key]
+    if keys:
+        cache.delete_many(*keys)
+    return keys
+
+
+def invalidate_tag(cache, *tags):
+    """
+    删除登记在标签下的全部缓存
+
+    返回:
+    - list: 删除的键
+    """
+    tag_keys = [_tag_key(tag) for tag in tags]
+    keys = []
+    for tagged in cache.get_many(*tag_keys):
+        if tagged:
+            keys.extend(tagged)
+    delete_cached(cache, *keys, *tag_keys)
+    return keys
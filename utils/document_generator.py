@@ -15,6 +15,8 @@ from docx.oxml.ns import qn
 import io
 from flask import jsonify, send_file
 from models import Project
+from utils.template_cache import load_template_document
+from utils.placeholder_engine import replace_placeholders_in_runs, iter_document_paragraphs
 import logging
 
 logger = logging.getLogger('greenscore')
@@ -27,61 +29,19 @@ def replace_placeholders_with_format(paragraph, project_info):
         paragraph: 要处理的段落对象
         project_info: 包含替换值的字典
     """
-    # 使用正则表达式找出所有占位符
-    pattern = r'\{([^{}]+)\}'
-    matches = re.finditer(pattern, paragraph.text)
-    
-    # 如果没有找到占位符，直接返回
-    if not re.search(pattern, paragraph.text):
-        return
-        
-    # 对于找到的每个占位符，保留段落的格式进行替换
-    for match in list(re.finditer(pattern, paragraph.text)):
-        placeholder = match.group(0)  # 完整的占位符，例如 {项目名称}
-        key = match.group(1)  # 占位符中的键，例如 项目名称
-        
+    def lookup(key):
         # 跳过项目概况占位符和示意图占位符，它们有专门的处理方法
         if key == "项目概况" or key == "示意图":
-            continue
-            
-        if key in project_info and project_info[key]:
-            # 获取占位符的起始位置和结束位置
-            start = match.start()
-            end = match.end()
-            
-            # 在指定位置替换文本
-            runs = paragraph.runs
-            
-            # 记录当前的位置和处理的字符数
-            current_pos = 0
-            for run in runs:
-                run_len = len(run.text)
-                run_start = current_pos
-                run_end = run_start + run_len
-                
-                # 检查这个run是否包含占位符的部分
-                if run_end > start and run_start < end:
-                    # 计算占位符在这个run中的相对位置
-                    rel_start = max(0, start - run_start)
-                    rel_end = min(run_len, end - run_start)
-                    
-                    # 替换这个run中的占位符部分
-                    run.text = run.text[:rel_start] + str(project_info[key]) + run.text[rel_end:]
-                
-                current_pos += run_len
-                
-                # 替换完成后退出循环
-                if current_pos > end:
-                    break
-        else:
-            # 如果没有对应的值，则将占位符替换为空字符串
-            for run in paragraph.runs:
-                if placeholder in run.text:
-                    run.text = run.text.replace(placeholder, "")
+            return None
+        # 如果没有对应的值，则将占位符替换为空字符串
+        value = project_info.get(key)
+        return value if value else ""
+
+    return replace_placeholders_in_runs(paragraph.runs, lookup)
 
 def replace_placeholders_simple(paragraph, project_info):
     """
-    使用简单的字符串替换方法替换段落中的项目概况占位符
+    替换段落中的项目概况占位符，占位符可以跨越多个run
     
     参数:
         paragraph: 要处理的段落对象
@@ -90,51 +50,15 @@ def replace_placeholders_simple(paragraph, project_info):
     返回:
         是否成功替换了占位符
     """
-    # 记录替换前的文本
-    original_text = paragraph.text
-    
-    # 检查是否包含项目概况占位符
-    placeholder = "{项目概况}"
-    if placeholder in original_text and "项目概况" in project_info:
-        logger.info(f"发现项目概况占位符: {original_text}")
-        
-        # 方法1: 尝试直接在每个run中替换文本
-        replaced = False
-        for run in paragraph.runs:
-            if placeholder in run.text:
-                # 替换run中的占位符
-                run.text = run.text.replace(placeholder, project_info["项目概况"])
-                replaced = True
-        
-        # 方法2: 如果方法1未成功（占位符跨runs），尝试清空所有runs并重设内容
-        if not replaced and placeholder in paragraph.text:
-            logger.info("占位符可能跨越多个run，尝试重构整个段落")
-            
-            # 保存第一个run的样式
-            if len(paragraph.runs) > 0:
-                first_run = paragraph.runs[0]
-                # 清空所有runs
-                for run in paragraph.runs:
-                    run.text = ""
-                
-                # 将替换后的文本设置到第一个run
-                first_run.text = original_text.replace(placeholder, project_info["项目概况"])
-                replaced = True
-        
-        # 方法3: 如果上述方法都失败，则尝试直接替换段落文本
-        if not replaced:
-            logger.info("尝试使用更直接的方法重建段落")
-            # 清空段落
-            for run in paragraph.runs:
-                run.text = ""
-            
-            # 创建新的run并设置替换后的文本
-            new_text = original_text.replace(placeholder, project_info["项目概况"])
-            new_run = paragraph.add_run(new_text)
-        
-        return True
-    
-    return False
+    if "项目概况" not in project_info:
+        return False
+    replaced = replace_placeholders_in_runs(
+        paragraph.runs,
+        lambda key: project_info["项目概况"] if key == "项目概况" else None
+    )
+    if replaced:
+        logger.info(f"已替换项目概况占位符: {replaced} 处")
+    return replaced > 0
 
 def replace_image_placeholders(paragraph, doc, project_info):
     """
@@ -262,53 +186,25 @@ def process_document_placeholders(doc, project_info, app=None):
         project_info: 包含替换值的字典
         app: Flask应用实例（可选）
     """
-    # 替换段落中的项目概况占位符
+    # 替换项目概况占位符
     overview_count = 0
-    for para in doc.paragraphs:
+    for para in iter_document_paragraphs(doc):
         if "{项目概况}" in para.text:
             if replace_placeholders_simple(para, project_info):
                 overview_count += 1
     
-    # 替换表格中的项目概况占位符
-    for table in doc.tables:
-        for row in table.rows:
-            for cell in row.cells:
-                for para in cell.paragraphs:
-                    if "{项目概况}" in para.text:
-                        if replace_placeholders_simple(para, project_info):
-                            overview_count += 1
-    
-    # 替换段落中的示意图占位符
+    # 替换示意图占位符（包括编号式占位符）
     image_count = 0
-    
-    # 查找所有段落中的示意图占位符（包括编号式占位符）
-    pattern = r'\{示意图(\d*)\}'
-    
-    for para in doc.paragraphs:
-        if re.search(pattern, para.text):
+    pattern = re.compile(r'\{示意图(\d*)\}')
+    for para in iter_document_paragraphs(doc):
+        if pattern.search(para.text):
             if replace_image_placeholders(para, doc, project_info):
                 image_count += 1
     
-    # 替换表格中的示意图占位符
-    for table in doc.tables:
-        for row in table.rows:
-            for cell in row.cells:
-                for para in cell.paragraphs:
-                    if re.search(pattern, para.text):
-                        if replace_image_placeholders(para, doc, project_info):
-                            image_count += 1
-    
-    # 处理其他占位符
-    for para in doc.paragraphs:
+    # 处理其他占位符（插入图片后段落有变化，重新获取段落列表）
+    for para in iter_document_paragraphs(doc):
         replace_placeholders_with_format(para, project_info)
     
-    # 处理表格中的其他占位符
-    for table in doc.tables:
-        for row in table.rows:
-            for cell in row.cells:
-                for para in cell.paragraphs:
-                    replace_placeholders_with_format(para, project_info)
-    
     if app and overview_count > 0:
         app.logger.info(f"已处理 {overview_count} 处项目概况内容")
     elif overview_count > 0:
@@ -476,13 +372,11 @@ def generate_decorative_cost_report_doc(data, app=None):
         # 确保临时目录存在
         os.makedirs('temp', exist_ok=True)
         
-        # 复制模板文件到临时位置，以免修改原始模板
         output_filename = f"{project_info.get('项目名称', '项目')}-装饰性构件造价比例计算书.docx"
         temp_output_path = os.path.join('temp', output_filename)
-        shutil.copy2(abs_template_path, temp_output_path)
         
-        # 打开复制的文件进行编辑
-        doc = Document(temp_output_path)
+        # 从模板缓存获取文档副本进行编辑，原始模板不会被修改
+        doc, _ = load_template_document(abs_template_path)
         
         # 生成项目概况文本
         overview_text = f"本项目规划建设用地面积为{project_info.get('总用地面积', '')}㎡，"
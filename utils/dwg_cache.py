@@ -0,0 +1,162 @@
+"""
+DWG 导出结果缓存
+
+按内容寻址：缓存键为 "模板文件MD5_属性数据MD5"。模板和全部属性都相同的导出直接返回已生成的图纸，
+不再驱动 AutoCAD。索引保存在 dwg_cache/cache_index.json 中：
+- 只记录文件名（相对缓存目录），Windows 和 Linux 部署之间可以共用；旧索引中的反斜杠路径读取时自动转换；
+- 写入时先写临时文件再替换，其他进程不会读到写了一半的索引；
+- 条目数超过 DWG_CACHE_MAX_ENTRIES 时删除最久未使用的图纸。
+"""
+
+import os
+import json
+import time
+import shutil
+import hashlib
+import threading
+import logging
+from utils.file_retention import mark_file_used
+from utils.request_metrics import record_cache_access
+
+logger = logging.getLogger('greenscore')
+
+DWG_CACHE_DIR = 'dwg_cache'
+DWG_CACHE_INDEX_FILE = os.path.join(DWG_CACHE_DIR, 'cache_index.json')
+DWG_CACHE_MAX_ENTRIES = 200
+
+_index_lock = threading.Lock()
+# 模板文件哈希：路径 -> (修改时间, 大小, MD5)，模板不变时不重复计算
+_template_hashes = {}
+
+
+def _file_md5(file_path):
+    md5 = hashlib.md5()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            md5.update(chunk)
+    return md5.hexdigest()
+
+
+def get_template_hash(template_path):
+    """计算模板文件的MD5，按修改时间和大小缓存结果"""
+    stat = os.stat(template_path)
+    cached = _template_hashes.get(template_path)
+    if cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+        return cached[2]
+    digest = _file_md5(template_path)
+    _template_hashes[template_path] = (stat.st_mtime_ns, stat.st_size, digest)
+    return digest
+
+
+def get_dwg_cache_key(template_path, attributes, backend=None):
+    """根据模板内容和属性数据生成缓存键，不同生成后端（输出格式可能不同）使用不同的键"""
+    attributes_json = json.dumps(attributes, ensure_ascii=False, sort_keys=True, default=str)
+    attributes_hash = hashlib.md5(attributes_json.encode('utf-8')).hexdigest()
+    cache_key = f"{get_template_hash(template_path)}_{attributes_hash}"
+    if backend and backend != 'autocad':
+        cache_key = f"{cache_key}_{backend}"
+    return cache_key
+
+
+def _entry_file_name(entry, key):
+    # 旧索引记录的是 "dwg_cache\\xxx.dwg" 形式的完整路径，只取文件名
+    file_path = entry.get('file_path') or f"{key}.dwg"
+    return file_path.replace('\\', '/').rsplit('/', 1)[-1]
+
+
+def _load_index():
+    try:
+        with open(DWG_CACHE_INDEX_FILE, 'r', encoding='utf-8') as f:
+            raw_index = json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        logger.warning(f"读取DWG缓存索引失败，将重建索引: {str(e)}")
+        return {}
+    index = {}
+    for key, entry in raw_index.items():
+        if isinstance(entry, dict):
+            index[key] = {
+                'created_at': entry.get('created_at', 0),
+                'file_path': _entry_file_name(entry, key),
+            }
+    return index
+
+
+def _save_index(index):
+    os.makedirs(DWG_CACHE_DIR, exist_ok=True)
+    tmp_file = f"{DWG_CACHE_INDEX_FILE}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(index, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_file, DWG_CACHE_INDEX_FILE)
+
+
+def get_cached_dwg(cache_key):
+    """
+    查找缓存的DWG文件
+
+    返回:
+    - 缓存文件路径；未命中时返回 None
+    """
+    with _index_lock:
+        entry = _load_index().get(cache_key)
+    cached_path = os.path.join(DWG_CACHE_DIR, entry['file_path']) if entry else None
+    if not cached_path or not os.path.exists(cached_path):
+        record_cache_access('dwg', False)
+        return None
+    record_cache_access('dwg', True)
+    # 更新文件使用时间，容量清理按最近使用顺序进行
+    mark_file_used(cached_path)
+    return cached_path
+
+
+def store_dwg(cache_key, output_path):
+    """
+    将新生成的DWG文件移入缓存
+
+    参数:
+    - cache_key: get_dwg_cache_key 返回的缓存键
+    - output_path: 生成的DWG（或DXF）文件，移入缓存后原路径不再存在
+
+    返回:
+    - 缓存文件路径；失败时返回原路径
+    """
+    extension = os.path.splitext(output_path)[1] or '.dwg'
+    file_name = f"{cache_key}{extension}"
+    cached_path = os.path.join(DWG_CACHE_DIR, file_name)
+    try:
+        os.makedirs(DWG_CACHE_DIR, exist_ok=True)
+        tmp_path = f"{cached_path}.{os.getpid()}.tmp"
+        shutil.move(output_path, tmp_path)
+        os.replace(tmp_path, cached_path)
+
+        with _index_lock:
+            index = _load_index()
+            index[cache_key] = {'created_at': time.time(), 'file_path': file_name}
+            _evict_entries(index)
+            _save_index(index)
+        return cached_path
+    except Exception as e:
+        logger.error(f"保存DWG缓存失败: {str(e)}")
+        return output_path if os.path.exists(output_path) else cached_path
+
+
+def _evict_entries(index):
+    """移除文件已不存在的条目，条目超过上限时删除最久未使用的图纸"""
+    last_used = {}
+    for key, entry in list(index.items()):
+        try:
+            last_used[key] = os.path.getmtime(os.path.join(DWG_CACHE_DIR, entry['file_path']))
+        except OSError:
+            index.pop(key)
+
+    overflow = len(index) - DWG_CACHE_MAX_ENTRIES
+    if overflow <= 0:
+        return
+    for key in sorted(index, key=lambda k: last_used[k])[:overflow]:
+        entry = index.pop(key)
+        try:
+            os.remove(os.path.join(DWG_CACHE_DIR, entry['file_path']))
+        except OSError:
+            pass
+    logger.info(f"DWG缓存超过 {DWG_CACHE_MAX_ENTRIES} 条，已删除 {overflow} 个最久未使用的图纸")
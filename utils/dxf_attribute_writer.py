@@ -0,0 +1,128 @@
+"""
+不依赖 AutoCAD 的 DWG 属性块写入
+
+update_dwg_attribute.update_attribute_text 通过 COM 驱动 AutoCAD，只能在装有 AutoCAD 的 Windows 上逐个处理图纸。
+这里用 ezdxf 直接读写图纸文件，填写绿色建筑设计专篇模板中的属性块，可以在 Linux 工作进程中并发执行：
+- 模板旁边有同名 .dxf 文件（例如 绿色建筑设计专篇(国标2024).dxf）时直接读取 DXF；
+- 否则安装了 ODA File Converter 时，通过 ezdxf.addons.odafc 读取 DWG；
+- 输出 .dwg 需要 ODA File Converter，未安装时输出同名 .dxf 文件，AutoCAD 可直接打开。
+
+通过 app.config['DWG_BACKEND'] 选择后端：autocad / dxf / auto（Windows 使用 AutoCAD，其他系统使用 DXF）。
+"""
+
+import os
+import platform
+import logging
+
+try:
+    import ezdxf
+    from ezdxf.addons import odafc
+except ImportError:
+    ezdxf = None
+    odafc = None
+    print("警告: ezdxf模块未安装，DXF方式导出DWG将不可用")
+    print("请运行 'pip install ezdxf' 安装所需模块")
+
+logger = logging.getLogger('greenscore')
+
+DWG_BACKEND_AUTOCAD = 'autocad'
+DWG_BACKEND_DXF = 'dxf'
+# 输出 DWG 时使用的文件版本
+DWG_OUTPUT_VERSION = 'R2018'
+
+
+def resolve_dwg_backend(backend):
+    """将配置的后端名称解析为 autocad 或 dxf，auto 按操作系统选择"""
+    backend = (backend or 'auto').lower()
+    if backend in (DWG_BACKEND_AUTOCAD, DWG_BACKEND_DXF):
+        return backend
+    return DWG_BACKEND_AUTOCAD if platform.system() == 'Windows' else DWG_BACKEND_DXF
+
+
+def _odafc_installed():
+    try:
+        return odafc is not None and odafc.is_installed()
+    except Exception:
+        return False
+
+
+def _load_template(template_path):
+    """读取模板，优先使用同名 DXF 文件"""
+    root, ext = os.path.splitext(template_path)
+    if ext.lower() == '.dxf':
+        return ezdxf.readfile(template_path)
+    dxf_path = root + '.dxf'
+    if os.path.exists(dxf_path):
+        return ezdxf.readfile(dxf_path)
+    if _odafc_installed():
+        return odafc.readfile(template_path)
+    raise RuntimeError(
+        f"无法读取DWG模板: {template_path}。请在模板目录放置同名DXF文件，或安装ODA File Converter"
+    )
+
+
+def _build_attribute_index(doc):
+    """一次遍历所有布局中的块引用，建立 属性标签 -> 属性实体列表 的索引"""
+    index = {}
+    for layout in doc.layouts:
+        for insert in layout.query('INSERT'):
+            for attrib in insert.attribs:
+                index.setdefault(attrib.dxf.tag, []).append(attrib)
+    return index
+
+
+def _set_attribute_text(attrib, value):
+    attrib.dxf.text = value
+    # 多行属性的文字保存在内嵌的 MTEXT 中，需要同时更新
+    if attrib.has_embedded_mtext_entity:
+        mtext = attrib.virtual_mtext_entity()
+        mtext.text = value
+        attrib.embed_mtext(mtext)
+
+
+def update_attribute_text_dxf(template_path, output_path, attributes):
+    """
+    填写模板中的属性块并保存
+
+    参数:
+    - template_path: DWG 模板路径（或 DXF 模板路径）
+    - output_path: 输出路径；无法输出 DWG 时改为同名 .dxf 文件
+    - attributes: 属性标签到文字的字典
+
+    返回:
+    - str: 实际生成的文件路径
+    """
+    if ezdxf is None:
+        raise RuntimeError("ezdxf模块未安装，无法使用DXF方式生成图纸")
+
+    template_path = os.path.abspath(template_path)
+    output_path = os.path.abspath(output_path)
+    if not os.path.exists(template_path):
+        raise FileNotFoundError(f"模板文件不存在: {template_path}")
+
+    doc = _load_template(template_path)
+    attribute_index = _build_attribute_index(doc)
+    logger.info(f"DXF模板属性标签 {len(attribute_index)} 个, 需要更新 {len(attributes)} 个")
+
+    updated_count = 0
+    for tag_name, attribs in attribute_index.items():
+        if tag_name not in attributes:
+            continue
+        value = attributes.get(tag_name)
+        value = '' if value is None else str(value)
+        for attrib in attribs:
+            _set_attribute_text(attrib, value)
+            updated_count += 1
+
+    missing_tags = set(attributes) - set(attribute_index)
+    if missing_tags:
+        logger.debug(f"以下属性标签在图纸中不存在: {', '.join(sorted(missing_tags))}")
+
+    if output_path.lower().endswith('.dwg') and _odafc_installed():
+        odafc.export_dwg(doc, output_path, version=DWG_OUTPUT_VERSION, replace=True)
+    else:
+        output_path = os.path.splitext(output_path)[0] + '.dxf'
+        doc.saveas(output_path)
+
+    logger.info(f"DXF方式更新属性 {updated_count} 处，保存到: {output_path}")
+    return output_path
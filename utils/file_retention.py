@@ -0,0 +1,324 @@
+"""
+生成文件保留与清理
+
+static/exports、temp 和 dwg_cache 中的导出文档、DWG 图纸、压缩包和 JSON 缓存都可以重新生成。
+这里按目录配置最长保留时间和容量上限，由后台线程定期清理：
+1. 删除超过保留时间的文件；
+2. 目录总大小仍超过上限时，按最后使用时间从旧到新删除（LRU），缓存命中时通过 mark_file_used 更新使用时间。
+刚生成的文件（MIN_FILE_AGE 内）不会被删除，避免影响正在进行的请求。
+
+多个工作进程共用一个锁文件，同一时间只有一个进程执行清理，上次清理结果保存在 RETENTION_STATE_FILE 中。
+后台线程在进程处理第一个请求时启动，gunicorn 主进程和导入 app 的一次性脚本不会启动清理。
+"""
+
+import os
+import json
+import time
+import random
+import threading
+import logging
+
+logger = logging.getLogger('greenscore')
+
+# 默认清理规则，可通过 app.config['FILE_RETENTION_RULES'] 覆盖
+# max_age: 最长保留秒数；max_bytes: 目录容量上限；exclude: 不清理的文件或子目录（相对目录的路径）
+DEFAULT_RETENTION_RULES = [
+    {
+        'path': os.path.join('static', 'exports'),
+        'max_age': 24 * 3600,
+        'max_bytes': 1024 * 1024 * 1024,
+        'exclude': [],
+    },
+    {
+        'path': 'temp',
+        'max_age': 24 * 3600,
+        'max_bytes': 2 * 1024 * 1024 * 1024,
+        # 项目数据版本文件不能删除，否则旧的导出缓存可能重新被视为有效；
+        # acad_worker 中是 AutoCAD 工作进程打开着的暂存文件；
+        # report_jobs、metrics 是报告任务状态和各进程的指标快照，由各自的模块维护
+        'exclude': ['versions', 'acad_worker', 'report_jobs', 'metrics', '.retention.lock', '.retention.json'],
+    },
+    {
+        'path': 'dwg_cache',
+        'max_age': 30 * 24 * 3600,
+        'max_bytes': 2 * 1024 * 1024 * 1024,
+        'exclude': ['cache_index.json'],
+    },
+]
+
+# 清理间隔（秒）
+DEFAULT_SWEEP_INTERVAL = 30 * 60
+# 最近修改的文件不清理（秒）
+MIN_FILE_AGE = 10 * 60
+# 锁文件超过该时间视为上次清理异常退出后遗留（秒）
+LOCK_STALE_AGE = 60 * 60
+
+RETENTION_LOCK_FILE = os.path.join('temp', '.retention.lock')
+RETENTION_STATE_FILE = os.path.join('temp', '.retention.json')
+
+_retention_rules = DEFAULT_RETENTION_RULES
+_sweep_interval = DEFAULT_SWEEP_INTERVAL
+_sweeper_thread = None
+_sweeper_pid = None
+_sweeper_lock = threading.Lock()
+
+# 本进程的累计清理统计
+_metrics_lock = threading.Lock()
+_metrics = {
+    'sweeps': 0,
+    'files_deleted': 0,
+    'bytes_reclaimed': 0,
+    'errors': 0,
+}
+
+
+def mark_file_used(file_path):
+    """更新文件的使用时间，缓存命中时调用，使容量清理按最近使用顺序进行"""
+    try:
+        os.utime(file_path, None)
+    except OSError:
+        pass
+
+
+def _is_excluded(rel_path, exclude):
+    rel_path = rel_path.replace(os.sep, '/')
+    for name in exclude:
+        name = name.replace(os.sep, '/')
+        if rel_path == name or rel_path.startswith(name + '/'):
+            return True
+    return False
+
+
+def _scan_files(root, exclude):
+    """列出目录中可清理的文件 [(路径, 大小, 修改时间)] 以及子目录列表"""
+    files = []
+    directories = []
+    stack = [root]
+    while stack:
+        current = stack.pop()
+        try:
+            entries = list(os.scandir(current))
+        except OSError:
+            continue
+        for entry in entries:
+            rel_path = os.path.relpath(entry.path, root)
+            if _is_excluded(rel_path, exclude):
+                continue
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    directories.append(entry.path)
+                    stack.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    stat = entry.stat(follow_symlinks=False)
+                    files.append((entry.path, stat.st_size, stat.st_mtime))
+            except OSError:
+                continue
+    return files, directories
+
+
+def _remove_file(file_path, result):
+    try:
+        os.remove(file_path)
+        return True
+    except FileNotFoundError:
+        return False
+    except OSError as e:
+        result['errors'] += 1
+        logger.warning(f"清理文件失败: {file_path}, {str(e)}")
+        return False
+
+
+def sweep_directory(rule, now=None):
+    """
+    按规则清理一个目录
+
+    返回:
+    - dict: 清理统计 (files_deleted, bytes_reclaimed, remaining_files, remaining_bytes, errors)
+    """
+    now = now or time.time()
+    root = rule['path']
+    result = {
+        'path': root,
+        'files_deleted': 0,
+        'bytes_reclaimed': 0,
+        'remaining_files': 0,
+        'remaining_bytes': 0,
+        'errors': 0,
+    }
+    if not os.path.isdir(root):
+        return result
+
+    files, directories = _scan_files(root, rule.get('exclude', []))
+    max_age = rule.get('max_age')
+    max_bytes = rule.get('max_bytes')
+
+    kept = []
+    for file_path, size, mtime in files:
+        age = now - mtime
+        if max_age and age > max_age and age > MIN_FILE_AGE:
+            if _remove_file(file_path, result):
+                result['files_deleted'] += 1
+                result['bytes_reclaimed'] += size
+            continue
+        kept.append((file_path, size, mtime))
+
+    total_bytes = sum(size for _, size, _ in kept)
+    if max_bytes and total_bytes > max_bytes:
+        # 超过容量上限时从最久未使用的文件开始删除
+        kept.sort(key=lambda item: item[2])
+        remaining = []
+        for file_path, size, mtime in kept:
+            if total_bytes > max_bytes and now - mtime > MIN_FILE_AGE and _remove_file(file_path, result):
+                total_bytes -= size
+                result['files_deleted'] += 1
+                result['bytes_reclaimed'] += size
+            else:
+                remaining.append((file_path, size, mtime))
+        kept = remaining
+
+    # 删除清理后留下的空子目录（从最深的目录开始）
+    for directory in sorted(directories, key=len, reverse=True):
+        try:
+            if not os.listdir(directory) and now - os.path.getmtime(directory) > MIN_FILE_AGE:
+                os.rmdir(directory)
+        except OSError:
+            pass
+
+    result['remaining_files'] = len(kept)
+    result['remaining_bytes'] = total_bytes
+    return result
+
+
+def _acquire_sweep_lock():
+    os.makedirs(os.path.dirname(RETENTION_LOCK_FILE), exist_ok=True)
+    try:
+        if time.time() - os.path.getmtime(RETENTION_LOCK_FILE) > LOCK_STALE_AGE:
+            os.remove(RETENTION_LOCK_FILE)
+    except OSError:
+        pass
+    try:
+        fd = os.open(RETENTION_LOCK_FILE, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        os.write(fd, str(os.getpid()).encode())
+        os.close(fd)
+        return True
+    except FileExistsError:
+        return False
+
+
+def _release_sweep_lock():
+    try:
+        os.remove(RETENTION_LOCK_FILE)
+    except OSError:
+        pass
+
+
+def _read_state():
+    try:
+        with open(RETENTION_STATE_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_state(state):
+    tmp_file = f"{RETENTION_STATE_FILE}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(state, f, ensure_ascii=False)
+        os.replace(tmp_file, RETENTION_STATE_FILE)
+    except OSError as e:
+        logger.warning(f"保存清理状态失败: {str(e)}")
+
+
+def run_retention_sweep(force=False):
+    """
+    执行一次清理
+
+    参数:
+    - force: 为 True 时忽略清理间隔立即执行（仍需获得锁）
+
+    返回:
+    - dict: 本次清理结果；其他进程正在清理或未到清理时间时返回 None
+    """
+    if not force:
+        state = _read_state()
+        if state and time.time() - state.get('finished_at', 0) < _sweep_interval:
+            return None
+    if not _acquire_sweep_lock():
+        return None
+
+    started_at = time.time()
+    try:
+        directories = [sweep_directory(rule, started_at) for rule in _retention_rules]
+        state = {
+            'started_at': started_at,
+            'finished_at': time.time(),
+            'duration_ms': round((time.time() - started_at) * 1000, 1),
+            'files_deleted': sum(item['files_deleted'] for item in directories),
+            'bytes_reclaimed': sum(item['bytes_reclaimed'] for item in directories),
+            'errors': sum(item['errors'] for item in directories),
+            'directories': directories,
+        }
+        _write_state(state)
+        with _metrics_lock:
+            _metrics['sweeps'] += 1
+            _metrics['files_deleted'] += state['files_deleted']
+            _metrics['bytes_reclaimed'] += state['bytes_reclaimed']
+            _metrics['errors'] += state['errors']
+        if state['files_deleted']:
+            logger.info(
+                f"文件清理完成: 删除 {state['files_deleted']} 个文件, "
+                f"释放 {state['bytes_reclaimed'] / 1024 / 1024:.1f} MB, 耗时 {state['duration_ms']} ms"
+            )
+        return state
+    except Exception as e:
+        logger.error(f"文件清理失败: {str(e)}")
+        with _metrics_lock:
+            _metrics['errors'] += 1
+        return None
+    finally:
+        _release_sweep_lock()
+
+
+def get_retention_metrics():
+    """返回本进程的累计清理统计以及最近一次清理（任意进程）的结果"""
+    with _metrics_lock:
+        metrics = dict(_metrics)
+    metrics['sweep_interval'] = _sweep_interval
+    metrics['last_sweep'] = _read_state()
+    return metrics
+
+
+def _sweeper_loop():
+    # 启动后稍等片刻再清理，多个工作进程错开执行
+    time.sleep(60 + random.uniform(0, 60))
+    while True:
+        try:
+            run_retention_sweep()
+        except Exception as e:
+            logger.error(f"后台文件清理异常: {str(e)}")
+        time.sleep(_sweep_interval + random.uniform(0, 60))
+
+
+def _ensure_sweeper():
+    # gunicorn 工作进程由主进程 fork 而来，线程不会随之复制，按进程号判断是否需要启动
+    global _sweeper_thread, _sweeper_pid
+    if _sweeper_pid == os.getpid() and _sweeper_thread is not None and _sweeper_thread.is_alive():
+        return
+    with _sweeper_lock:
+        if _sweeper_pid == os.getpid() and _sweeper_thread is not None and _sweeper_thread.is_alive():
+            return
+        _sweeper_thread = threading.Thread(target=_sweeper_loop, name='file-retention', daemon=True)
+        _sweeper_pid = os.getpid()
+        _sweeper_thread.start()
+
+
+def init_file_retention(app):
+    """读取应用配置，后台清理线程在本进程处理第一个请求时启动"""
+    global _retention_rules, _sweep_interval
+    _retention_rules = app.config.get('FILE_RETENTION_RULES', DEFAULT_RETENTION_RULES)
+    _sweep_interval = app.config.get('FILE_RETENTION_INTERVAL', DEFAULT_SWEEP_INTERVAL)
+    if not app.config.get('FILE_RETENTION_ENABLED', True):
+        logger.info("文件自动清理已禁用")
+        return
+    app.before_request(_ensure_sweeper)
@@ -0,0 +1,146 @@
+"""
+用户最后在线时间的批量写入
+
+原来 before_request 在每个已登录请求中设置 current_user.last_seen 并提交一次事务，评分保存、轮询等
+AJAX 请求也要额外写一次 users 表，提交次数翻倍，并与管理后台的用户查询争用行锁。
+这里改为：
+- 请求中只在内存中记录访问时间，同一用户在 LAST_SEEN_THROTTLE 秒内只记录一次；
+- 后台线程每 LAST_SEEN_FLUSH_INTERVAL 秒把本进程记录的时间用一条批量 UPDATE 写入数据库；
+- UPDATE 只在新时间更晚时生效，多个工作进程写入同一用户时不会把时间改回去。
+User.is_online() 按 15 分钟判断，节流和写入延迟合计不超过两分钟，在线状态不受影响。
+"""
+
+import os
+import time
+import atexit
+import threading
+import logging
+from datetime import datetime
+from sqlalchemy import text
+
+logger = logging.getLogger('greenscore')
+
+# 同一用户两次记录的最小间隔（秒）
+DEFAULT_LAST_SEEN_THROTTLE = 60
+# 后台写入间隔（秒）
+DEFAULT_LAST_SEEN_FLUSH_INTERVAL = 30
+
+_app = None
+_db = None
+_throttle = DEFAULT_LAST_SEEN_THROTTLE
+_flush_interval = DEFAULT_LAST_SEEN_FLUSH_INTERVAL
+
+_lock = threading.Lock()
+# 待写入的访问时间 {user_id: datetime}
+_pending = {}
+# 最近一次记录的时间 {user_id: time.monotonic()}，用于节流
+_recorded_at = {}
+_flusher_thread = None
+_flusher_pid = None
+
+
+def init_last_seen(app, db):
+    """读取应用配置，后台写入线程在本进程第一次记录时启动"""
+    global _app, _db, _throttle, _flush_interval
+    _app = app
+    _db = db
+    _throttle = app.config.get('LAST_SEEN_THROTTLE', DEFAULT_LAST_SEEN_THROTTLE)
+    _flush_interval = app.config.get('LAST_SEEN_FLUSH_INTERVAL', DEFAULT_LAST_SEEN_FLUSH_INTERVAL)
+
+
+def record_last_seen(user_id):
+    """
+    记录用户的访问时间，不访问数据库
+
+    返回:
+    - bool: 本次是否记录（节流间隔内的重复访问返回 False）
+    """
+    if not user_id:
+        return False
+    now = time.monotonic()
+    with _lock:
+        last = _recorded_at.get(user_id)
+        if last is not None and now - last < _throttle:
+            return False
+        _recorded_at[user_id] = now
+        # 与 User.is_online() 一致，使用不带时区的 UTC 时间
+        _pending[user_id] = datetime.utcnow()
+    _ensure_flusher()
+    return True
+
+
+def flush_last_seen():
+    """
+    把待写入的访问时间写入数据库
+
+    返回:
+    - int: 写入的用户数
+    """
+    with _lock:
+        if not _pending:
+            return 0
+        batch = dict(_pending)
+        _pending.clear()
+        # 清理早已超过节流间隔的记录，避免长期运行后字典持续增长
+        expired = time.monotonic() - _throttle
+        for user_id in [user_id for user_id, recorded in _recorded_at.items() if recorded < expired]:
+            _recorded_at.pop(user_id)
+
+    try:
+        with _app.app_context():
+            _db.session.execute(
+                text("""
+                UPDATE users SET last_seen = :last_seen
+                WHERE id = :user_id AND (last_seen IS NULL OR last_seen < :last_seen)
+                """),
+                [{'user_id': user_id, 'last_seen': last_seen} for user_id, last_seen in batch.items()]
+            )
+            _db.session.commit()
+        return len(batch)
+    except Exception as e:
+        logger.warning(f"批量更新最后在线时间失败: {len(batch)} 个用户, {str(e)}")
+        try:
+            with _app.app_context():
+                _db.session.rollback()
+        except Exception:
+            pass
+        # 放回队列，下次写入时重试（保留较新的时间）
+        with _lock:
+            for user_id, last_seen in batch.items():
+                if user_id not in _pending or _pending[user_id] < last_seen:
+                    _pending[user_id] = last_seen
+        return 0
+
+
+def _flusher_loop():
+    while True:
+        time.sleep(_flush_interval)
+        try:
+            flush_last_seen()
+        except Exception as e:
+            logger.error(f"后台写入最后在线时间异常: {str(e)}")
+
+
+def _ensure_flusher():
+    # gunicorn 工作进程由主进程 fork 而来，线程不会随之复制，按进程号判断是否需要启动
+    global _flusher_thread, _flusher_pid
+    if _flusher_pid == os.getpid() and _flusher_thread is not None and _flusher_thread.is_alive():
+        return
+    with _lock:
+        if _flusher_pid == os.getpid() and _flusher_thread is not None and _flusher_thread.is_alive():
+            return
+        _flusher_thread = threading.Thread(target=_flusher_loop, name='last-seen-flusher', daemon=True)
+        _flusher_pid = os.getpid()
+        _flusher_thread.start()
+
+
+def _flush_on_exit():
+    if _app is None or not _pending:
+        return
+    try:
+        flush_last_seen()
+    except Exception:
+        pass
+
+
+atexit.register(_flush_on_exit)
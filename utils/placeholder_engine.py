@@ -0,0 +1,120 @@
+"""
+Word 文档 {占位符} 替换
+
+占位符在 Word 中经常被拆分到多个 run 里（例如 "{项" 和 "目名称}"）。这里对每个段落只拼接
+一次文本，用一个正则找出全部占位符，通过 run 起始位置定位占位符所在的 run，然后一次性完成全部替换。
+替换值写入占位符开始所在的 run，保留该 run 的格式；占位符跨越的其余 run 被清空或截断。
+
+报审表、交通分析报告、装饰性构件计算书等所有报告生成都通过这里替换文本占位符。
+"""
+
+import re
+from bisect import bisect_right
+
+PLACEHOLDER_PATTERN = re.compile(r'\{([^{}]+)\}')
+
+
+def _get_lookup(replacements):
+    """replacements 可以是字典，也可以是 key -> 值 的函数；值为 None 表示不替换"""
+    if callable(replacements):
+        return replacements
+    return replacements.get
+
+
+def replace_placeholders_in_runs(runs, replacements, pattern=PLACEHOLDER_PATTERN):
+    """
+    在一组连续的 run 中替换占位符
+
+    参数:
+    - runs: run 列表（通常是 paragraph.runs）
+    - replacements: 占位符名称（不含花括号）到替换值的字典，或返回替换值的函数
+    - pattern: 占位符正则，第一个分组为占位符名称
+
+    返回:
+    - int: 替换的占位符数量
+    """
+    if not runs:
+        return 0
+    texts = [run.text for run in runs]
+    full_text = ''.join(texts)
+    if '{' not in full_text and pattern is PLACEHOLDER_PATTERN:
+        return 0
+
+    lookup = _get_lookup(replacements)
+    edits = []
+    for match in pattern.finditer(full_text):
+        value = lookup(match.group(1))
+        if value is not None:
+            edits.append((match.start(), match.end(), str(value)))
+    if not edits:
+        return 0
+
+    # 每个 run 在段落文本中的起始位置
+    run_starts = []
+    position = 0
+    for text in texts:
+        run_starts.append(position)
+        position += len(text)
+
+    # 从后往前替换：修改只发生在当前占位符及其之后，前面占位符的位置保持有效
+    changed = set()
+    for start, end, value in reversed(edits):
+        first = bisect_right(run_starts, start) - 1
+        last = bisect_right(run_starts, end - 1) - 1
+        start_offset = start - run_starts[first]
+        end_offset = end - run_starts[last]
+        if first == last:
+            text = texts[first]
+            texts[first] = text[:start_offset] + value + text[end_offset:]
+        else:
+            texts[first] = texts[first][:start_offset] + value
+            for index in range(first + 1, last):
+                texts[index] = ''
+            texts[last] = texts[last][end_offset:]
+        changed.update(range(first, last + 1))
+
+    # 每个 run 只写回一次
+    for index in sorted(changed):
+        runs[index].text = texts[index]
+    return len(edits)
+
+
+def replace_placeholders_in_paragraphs(paragraphs, replacements, pattern=PLACEHOLDER_PATTERN):
+    """在多个段落中替换占位符，返回替换的占位符总数"""
+    return sum(
+        replace_placeholders_in_runs(paragraph.runs, replacements, pattern)
+        for paragraph in paragraphs
+    )
+
+
+def iter_document_paragraphs(doc):
+    """按顺序返回文档正文段落和表格单元格中的段落，合并单元格中的段落只返回一次"""
+    paragraphs = list(doc.paragraphs)
+    seen = set()
+    for table in doc.tables:
+        for row in table.rows:
+            for cell in row.cells:
+                # 集合持有元素引用，lxml 对同一节点返回同一个代理对象
+                if cell._tc in seen:
+                    continue
+                seen.add(cell._tc)
+                paragraphs.extend(cell.paragraphs)
+    return paragraphs
+
+
+def replace_placeholders_in_document(doc, replacements, pattern=PLACEHOLDER_PATTERN):
+    """在整个文档（正文和表格）中替换占位符，返回替换的占位符总数"""
+    return replace_placeholders_in_paragraphs(iter_document_paragraphs(doc), replacements, pattern)
+
+
+def find_placeholder_paragraph(paragraphs, name):
+    """
+    查找包含指定占位符的第一个段落，占位符可以跨越多个 run
+
+    用于图片、表格等需要替换整个段落内容的占位符，未找到时返回 None
+    """
+    placeholder = f"{{{name}}}"
+    for paragraph in paragraphs:
+        if placeholder in paragraph.text:
+            return paragraph
+    return None
@@ -0,0 +1,117 @@
+"""
+项目访问权限解析
+
+check_project_access 和 get_project_permissions 原来各自查询一次项目表和协作者表，项目页面和协作管理接口
+在一个请求中会重复查询多次。这里用一条语句同时取得项目创建者和当前用户的协作者记录，
+结果保存在 flask.g 中，同一请求内对同一项目的后续检查不再访问数据库。
+协作者变更后调用 invalidate_project_permissions，本请求后续的检查重新查询。
+"""
+
+from flask import g, session
+from sqlalchemy import text
+from models import db
+
+ROLE_OWNER = '创建者'
+ROLE_PARTICIPANT = '参与者'
+PERMISSION_READ = '只读'
+PERMISSION_EDIT = '编辑'
+PERMISSION_MANAGE = '管理'
+
+
+class ProjectPermission:
+    """当前用户对某个项目的角色和权限"""
+
+    __slots__ = ('project_id', 'user_id', 'role', 'permissions')
+
+    def __init__(self, project_id, user_id, role, permissions):
+        self.project_id = project_id
+        self.user_id = user_id
+        self.role = role
+        self.permissions = permissions
+
+    @property
+    def is_owner(self):
+        return self.role == ROLE_OWNER
+
+    @property
+    def can_edit(self):
+        return self.permissions in (PERMISSION_EDIT, PERMISSION_MANAGE)
+
+    @property
+    def can_manage(self):
+        return self.permissions == PERMISSION_MANAGE
+
+    def to_dict(self):
+        """接口和模板使用的字典格式 {'role', 'permissions'}"""
+        return {
+            'role': self.role,
+            'permissions': self.permissions
+        }
+
+    def __repr__(self):
+        return f"<ProjectPermission project={self.project_id} user={self.user_id} {self.role}/{self.permissions}>"
+
+
+def _request_cache():
+    cache = getattr(g, '_project_permissions', None)
+    if cache is None:
+        cache = g._project_permissions = {}
+    return cache
+
+
+def _query_permission(project_id, user_id):
+    row = db.session.execute(
+        text("""
+        SELECT p.user_id AS owner_id, c.role, c.permissions
+        FROM projects p
+        LEFT JOIN project_collaborators c ON c.project_id = p.id AND c.user_id = :user_id
+        WHERE p.id = :project_id
+        """),
+        {'project_id': project_id, 'user_id': user_id}
+    ).fetchone()
+    if row is None:
+        return None
+    if row.owner_id == user_id:
+        # 创建者拥有最高权限
+        return ProjectPermission(project_id, user_id, ROLE_OWNER, PERMISSION_MANAGE)
+    if row.role is None and row.permissions is None:
+        return None
+    return ProjectPermission(project_id, user_id, row.role or ROLE_PARTICIPANT, row.permissions or PERMISSION_READ)
+
+
+def resolve_project_permission(project_id, user_id=None):
+    """
+    获取用户对项目的权限，同一请求内只查询一次
+
+    参数:
+        project_id: 项目ID
+        user_id: 用户ID，默认取当前登录用户
+
+    返回值:
+        ProjectPermission；未登录、项目不存在或无权访问时返回 None
+    """
+    user_id = user_id if user_id is not None else session.get('user_id')
+    if not user_id:
+        return None
+    try:
+        project_id = int(project_id)
+    except (TypeError, ValueError):
+        return None
+
+    cache = _request_cache()
+    key = (user_id, project_id)
+    if key not in cache:
+        cache[key] = _query_permission(project_id, user_id)
+    return cache[key]
+
+
+def invalidate_project_permissions(project_id=None):
+    """清除本请求缓存的权限结果，不传项目ID时全部清除"""
+    cache = getattr(g, '_project_permissions', None)
+    if not cache:
+        return
+    if project_id is None:
+        cache.clear()
+        return
+    for key in [key for key in cache if key[1] == int(project_id)]:
+        cache.pop(key)
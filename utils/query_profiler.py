@@ -0,0 +1,208 @@
+"""
+开发环境的慢查询和 N+1 查询检测
+
+app.py 中有不少逐行查询、逐行写入的代码（例如原来 get_projects 逐个查询协作项目、save_score 逐条插入评分），
+新增接口时很容易再次引入。开发模式下这里记录每个请求执行的 SQL：
+- 语句总数超过 QUERY_PROFILER_MAX_STATEMENTS；
+- 同一形状的语句（去掉参数和字面量后相同）执行次数超过 QUERY_PROFILER_MAX_REPEATS；
+- 单条语句耗时超过 QUERY_PROFILER_SLOW_QUERY 秒；
+出现以上情况时，把语句和发出语句的代码位置写入 logs/query_profiler.log，并在响应头 X-Query-Profiler 中给出摘要。
+
+QUERY_PROFILER_ENABLED 未设置时跟随 app.debug（python app.py 启动的开发模式），gunicorn / waitress 部署默认不启用。
+"""
+
+import os
+import re
+import time
+import threading
+import traceback
+import logging
+from logging.handlers import RotatingFileHandler
+from flask import g, request, current_app, has_request_context
+
+logger = logging.getLogger('greenscore.query_profiler')
+
+QUERY_PROFILER_LOG = os.path.join('logs', 'query_profiler.log')
+DEFAULT_MAX_STATEMENTS = 50
+DEFAULT_MAX_REPEATS = 10
+DEFAULT_SLOW_QUERY = 0.5
+# 每条问题语句记录的代码位置层数
+STACK_DEPTH = 6
+# 响应头最多列出的代码位置数
+MAX_HEADER_LOCATIONS = 3
+
+_PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_THIS_FILE = os.path.abspath(__file__)
+_local = threading.local()
+_installed = False
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDER_LIST = re.compile(r'\(\s*(?:\?|%\(\w+\)s|%s|:\w+)(?:\s*,\s*(?:\?|%\(\w+\)s|%s|:\w+))*\s*\)')
+_PARAMETER = re.compile(r'%\(\w+\)s|%s|:\w+')
+_WHITESPACE = re.compile(r'\s+')
+
+
+def init_query_profiler(app):
+    """注册请求钩子和 SQLAlchemy 事件；是否启用在每个请求开始时判断"""
+    global _installed
+    if _installed:
+        return
+    _installed = True
+
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+    event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+
+    if not logger.handlers:
+        os.makedirs(os.path.dirname(QUERY_PROFILER_LOG), exist_ok=True)
+        handler = RotatingFileHandler(QUERY_PROFILER_LOG, maxBytes=10000000, backupCount=3, encoding='utf-8')
+        handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s: %(message)s'))
+        logger.addHandler(handler)
+        logger.setLevel(logging.WARNING)
+        # 不再写入 logs/app.log，避免开发时刷屏
+        logger.propagate = False
+
+
+def _is_enabled():
+    enabled = current_app.config.get('QUERY_PROFILER_ENABLED')
+    if enabled is None:
+        return current_app.debug
+    return bool(enabled)
+
+
+def statement_shape(statement):
+    """去掉参数、字面量和 IN 列表长度后的语句形状，同一形状的语句视为同一条查询"""
+    shape = _STRING_LITERAL.sub('?', statement)
+    shape = _NUMBER_LITERAL.sub('?', shape)
+    shape = _PLACEHOLDER_LIST.sub('(?)', shape)
+    shape = _PARAMETER.sub('?', shape)
+    return _WHITESPACE.sub(' ', shape).strip()
+
+
+def _caller_frames():
+    """发出语句的项目代码位置（跳过第三方库和本模块），由内到外"""
+    frames = []
+    for frame in reversed(traceback.extract_stack()):
+        file_name = os.path.abspath(frame.filename)
+        if file_name == _THIS_FILE or not file_name.startswith(_PROJECT_ROOT):
+            continue
+        if f"{os.sep}site-packages{os.sep}" in file_name or f"{os.sep}venv{os.sep}" in file_name:
+            continue
+        frames.append(f"{os.path.relpath(file_name, _PROJECT_ROOT)}:{frame.lineno} {frame.name}")
+        if len(frames) >= STACK_DEPTH:
+            break
+    return frames
+
+
+def _start_request():
+    if _is_enabled():
+        # {形状: {'count', 'time', 'max_time', 'statement', 'frames'}}
+        g._query_profile = {}
+        g._query_profile_count = 0
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if not has_request_context() or '_query_profile' not in g:
+        return
+    stack = getattr(_local, 'started', None)
+    if stack is None:
+        stack = _local.started = []
+    stack.append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if not has_request_context() or '_query_profile' not in g:
+        return
+    stack = getattr(_local, 'started', None)
+    if not stack:
+        return
+    elapsed = time.perf_counter() - stack.pop()
+    g._query_profile_count += 1
+    shape = statement_shape(statement)
+    entry = g._query_profile.get(shape)
+    if entry is None:
+        # 只在第一次出现时采集调用栈，重复的语句来自同一处代码
+        entry = g._query_profile[shape] = {
+            'count': 0,
+            'time': 0.0,
+            'max_time': 0.0,
+            'statement': statement,
+            'frames': _caller_frames(),
+        }
+    entry['count'] += 1
+    entry['time'] += elapsed
+    if elapsed > entry['max_time']:
+        entry['max_time'] = elapsed
+        if elapsed >= current_app.config.get('QUERY_PROFILER_SLOW_QUERY', DEFAULT_SLOW_QUERY):
+            # 慢查询记录实际变慢那一次的调用位置
+            entry['frames'] = _caller_frames()
+
+
+def _finish_request(response):
+    profile = g.pop('_query_profile', None)
+    if profile is None:
+        return response
+    total = g.pop('_query_profile_count', 0)
+    try:
+        config = current_app.config
+        max_statements = config.get('QUERY_PROFILER_MAX_STATEMENTS', DEFAULT_MAX_STATEMENTS)
+        max_repeats = config.get('QUERY_PROFILER_MAX_REPEATS', DEFAULT_MAX_REPEATS)
+        slow_query = config.get('QUERY_PROFILER_SLOW_QUERY', DEFAULT_SLOW_QUERY)
+
+        repeated = sorted(
+            (entry for entry in profile.values() if entry['count'] > max_repeats),
+            key=lambda entry: entry['count'], reverse=True
+        )
+        slow = sorted(
+            (entry for entry in profile.values() if entry['max_time'] >= slow_query),
+            key=lambda entry: entry['max_time'], reverse=True
+        )
+        too_many = total > max_statements
+        if not (too_many or repeated or slow):
+            return response
+
+        summary = f"statements={total}; shapes={len(profile)}; repeated={len(repeated)}; slow={len(slow)}"
+        response.headers['X-Query-Profiler'] = summary
+        locations = []
+        for entry in repeated + slow:
+            if entry['frames'] and entry['frames'][0] not in locations:
+                locations.append(entry['frames'][0])
+        if locations:
+            # 响应头只能使用 latin-1 字符，文件路径中的其他字符替换掉
+            header = ', '.join(locations[:MAX_HEADER_LOCATIONS])
+            response.headers['X-Query-Profiler-Location'] = header.encode('latin-1', 'replace').decode('latin-1')
+
+        _log_profile(summary, total, max_statements, repeated, slow)
+    except Exception as e:
+        logger.warning(f"SQL 检测失败: {str(e)}")
+    return response
+
+
+def _format_entry(entry):
+    statement = _WHITESPACE.sub(' ', entry['statement']).strip()
+    if len(statement) > 500:
+        statement = statement[:500] + '...'
+    lines = [
+        f"    次数 {entry['count']}, 合计 {entry['time'] * 1000:.1f} ms, 最长 {entry['max_time'] * 1000:.1f} ms",
+        f"    SQL: {statement}",
+    ]
+    lines.extend(f"      at {frame}" for frame in entry['frames'])
+    return '\n'.join(lines)
+
+
+def _log_profile(summary, total, max_statements, repeated, slow):
+    lines = [f"{request.method} {request.path} [{request.endpoint}] {summary}"]
+    if total > max_statements:
+        lines.append(f"  语句总数 {total} 超过 {max_statements}")
+    for entry in repeated:
+        lines.append("  重复查询（可能是 N+1）:")
+        lines.append(_format_entry(entry))
+    for entry in slow:
+        lines.append("  慢查询:")
+        lines.append(_format_entry(entry))
+    logger.warning('\n'.join(lines))
@@ -0,0 +1,361 @@
+"""
+报告导出后台任务
+
+报审表、自评估报告、绿建专篇、DWG、交通分析报告、装饰性构件计算书的生成都很耗时，同步处理时
+几个导出请求就会占满全部 gunicorn 工作进程。请求带有 X-Report-Job: 1 头（或 ?async=1）时，
+接口只校验参数并提交后台任务，立即返回 202 和任务ID；前端轮询任务状态，完成后下载生成的文件。
+
+- 每个进程使用一个线程池执行任务，线程数由 app.config['REPORT_JOB_WORKERS'] 配置；
+- 任务状态和生成的文件保存在 temp/report_jobs 下，轮询请求落到任意工作进程都能查到；
+- 状态文件记录执行任务的进程号，该进程退出（工作进程重启、超时被杀）后轮询立即返回失败；
+- 该目录不在 file_retention 的清理范围内，结束超过 REPORT_JOB_RETENTION 的任务在提交新任务时顺带删除；
+- 导出函数原样复用：任务在后台请求上下文中调用导出函数，把返回的文件响应保存下来，错误响应记录为失败。
+"""
+
+import os
+import re
+import json
+import time
+import uuid
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from flask import request, jsonify, send_file
+from werkzeug.http import parse_options_header
+from utils.file_retention import mark_file_used
+from utils.request_metrics import process_alive
+
+logger = logging.getLogger('greenscore')
+
+REPORT_JOB_DIR = os.path.join('temp', 'report_jobs')
+DEFAULT_REPORT_JOB_WORKERS = 2
+# 所在进程仍在运行、但开始执行超过该时间仍未结束的任务视为已卡死（秒）；
+# 最慢的交通分析报告、DWG 导出一般在几分钟内完成
+REPORT_JOB_STALE_AGE = 10 * 60
+# 已结束任务的状态和文件保留时间（秒）
+REPORT_JOB_RETENTION = 24 * 3600
+# 清理已结束任务的最小间隔（秒）
+REPORT_JOB_EXPIRE_INTERVAL = 30 * 60
+
+_JOB_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
+_app = None
+_executor = None
+_executor_lock = threading.Lock()
+_last_expired_at = 0
+# 当前线程正在执行的任务，导出函数通过 report_job_progress 上报进度
+_current_job = threading.local()
+
+
+def init_report_jobs(app):
+    """保存应用对象，任务线程在其中创建请求上下文"""
+    global _app
+    _app = app
+    os.makedirs(REPORT_JOB_DIR, exist_ok=True)
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            workers = DEFAULT_REPORT_JOB_WORKERS
+            if _app is not None:
+                workers = _app.config.get('REPORT_JOB_WORKERS', DEFAULT_REPORT_JOB_WORKERS)
+            _executor = ThreadPoolExecutor(max_workers=max(1, int(workers)), thread_name_prefix='report-job')
+        return _executor
+
+
+def _job_status_file(job_id):
+    return os.path.join(REPORT_JOB_DIR, f"{job_id}.json")
+
+
+def _job_data_file(job_id):
+    return os.path.join(REPORT_JOB_DIR, f"{job_id}.data")
+
+
+def _write_job(job):
+    job['updated_at'] = time.time()
+    tmp_file = f"{_job_status_file(job['job_id'])}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(job, f, ensure_ascii=False)
+    os.replace(tmp_file, _job_status_file(job['job_id']))
+
+
+def _update_job(job_id, **fields):
+    job = _read_job(job_id)
+    if job is None:
+        return None
+    job.update(fields)
+    _write_job(job)
+    return job
+
+
+def _read_job(job_id):
+    try:
+        with open(_job_status_file(job_id), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def expire_report_jobs(now=None):
+    """删除结束超过 REPORT_JOB_RETENTION 的任务，返回删除的任务数"""
+    now = now or time.time()
+    expired = 0
+    try:
+        names = os.listdir(REPORT_JOB_DIR)
+    except OSError:
+        return 0
+    for name in names:
+        file_path = os.path.join(REPORT_JOB_DIR, name)
+        try:
+            if now - os.path.getmtime(file_path) <= REPORT_JOB_RETENTION:
+                continue
+        except OSError:
+            continue
+        if name.endswith('.json'):
+            job = _read_job(name[:-len('.json')])
+            # 状态文件在每次进度更新时写入，长时间未更新的排队或运行中任务按中断处理
+            if job is not None and job['status'] in ('queued', 'running') and not _job_interrupted(job):
+                continue
+            data_file = _job_data_file(name[:-len('.json')])
+            for path in (file_path, data_file):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            expired += 1
+        elif name.endswith('.tmp') or not os.path.exists(_job_status_file(name.rsplit('.', 1)[0])):
+            # 写入中断留下的临时文件、状态文件已删除的数据文件
+            try:
+                os.remove(file_path)
+            except OSError:
+                pass
+    return expired
+
+
+def _maybe_expire_report_jobs():
+    global _last_expired_at
+    now = time.time()
+    if now - _last_expired_at < REPORT_JOB_EXPIRE_INTERVAL:
+        return
+    _last_expired_at = now
+    try:
+        expired = expire_report_jobs(now)
+        if expired:
+            logger.info(f"已删除 {expired} 个过期的报告任务")
+    except Exception as e:
+        logger.warning(f"清理过期报告任务失败: {str(e)}")
+
+
+def wants_report_job():
+    """当前请求是否要求以后台任务方式生成"""
+    if request.headers.get('X-Report-Job') == '1':
+        return True
+    return request.args.get('async', '').lower() in ('1', 'true')
+
+
+def _current_user_id():
+    try:
+        from flask_login import current_user
+        if current_user.is_authenticated:
+            return current_user.id
+    except Exception:
+        pass
+    return None
+
+
+def submit_report_job(job_type, func, cleanup=None):
+    """
+    提交后台任务
+
+    参数:
+    - job_type: 任务类型，例如 'word'、'dwg'
+    - func: 无参数函数，返回导出接口原有的响应（文件响应或 jsonify 错误）
+    - cleanup: 可选，任务结束后调用（例如删除上传的临时图片）
+
+    返回:
+    - str: 任务ID
+    """
+    os.makedirs(REPORT_JOB_DIR, exist_ok=True)
+    _maybe_expire_report_jobs()
+    job_id = uuid.uuid4().hex
+    _write_job({
+        'job_id': job_id,
+        'type': job_type,
+        'status': 'queued',
+        'progress': 0,
+        'message': '排队中',
+        'user_id': _current_user_id(),
+        'pid': os.getpid(),
+        'created_at': time.time(),
+    })
+    _get_executor().submit(_run_job, job_id, job_type, func, cleanup)
+    return job_id
+
+
+def run_report(job_type, func, cleanup=None):
+    """
+    导出接口的统一入口：请求要求后台任务时提交任务并返回 202，否则直接生成并返回文件
+
+    cleanup 在同步生成结束后、后台任务结束后或提交失败时调用，调用方无需再清理
+    """
+    if not wants_report_job():
+        try:
+            return func()
+        finally:
+            if cleanup:
+                cleanup()
+    try:
+        job_id = submit_report_job(job_type, func, cleanup)
+    except Exception:
+        if cleanup:
+            cleanup()
+        raise
+    return jsonify({
+        'success': True,
+        'job_id': job_id,
+        'status_url': f"/api/report_jobs/{job_id}",
+        'download_url': f"/api/report_jobs/{job_id}/download",
+    }), 202
+
+
+def report_job_progress(progress=None, message=None):
+    """导出函数上报进度，不在后台任务中调用时不做任何处理"""
+    job_id = getattr(_current_job, 'job_id', None)
+    if not job_id:
+        return
+    fields = {}
+    if progress is not None:
+        fields['progress'] = max(0, min(99, int(progress)))
+    if message:
+        fields['message'] = message
+    try:
+        _update_job(job_id, **fields)
+    except OSError as e:
+        logger.warning(f"更新任务进度失败: {job_id}, {str(e)}")
+
+
+def _run_job(job_id, job_type, func, cleanup):
+    started_at = time.time()
+    _current_job.job_id = job_id
+    try:
+        _update_job(job_id, status='running', progress=5, message='正在生成', started_at=started_at)
+        with _app.test_request_context():
+            response = _app.make_response(func())
+            result = _save_job_response(job_id, response)
+        _update_job(job_id, finished_at=time.time(), **result)
+        logger.info(f"报告任务完成: {job_type} {job_id}, 状态 {result['status']}, 耗时 {time.time() - started_at:.1f} 秒")
+    except Exception as e:
+        logger.error(f"报告任务失败: {job_type} {job_id}, {str(e)}")
+        try:
+            _update_job(job_id, status='failed', error=f"生成失败: {str(e)}", status_code=500, finished_at=time.time())
+        except OSError:
+            pass
+    finally:
+        _current_job.job_id = None
+        if cleanup:
+            try:
+                cleanup()
+            except Exception as cleanup_error:
+                logger.warning(f"报告任务清理失败: {job_id}, {str(cleanup_error)}")
+
+
+def _save_job_response(job_id, response):
+    """保存导出函数返回的响应：文件写入任务目录，JSON 响应转换为任务结果"""
+    try:
+        if response.status_code >= 400 or response.mimetype == 'application/json':
+            payload = response.get_json(silent=True) or {}
+            if response.status_code < 400 and payload.get('file_url'):
+                # DWG 直接发送失败时返回的是导出目录中的文件地址
+                return {'status': 'succeeded', 'progress': 100, 'message': '生成完成', 'file_url': payload['file_url']}
+            error = payload.get('error') or payload.get('message') or f"生成失败 ({response.status_code})"
+            return {
+                'status': 'failed',
+                'message': '生成失败',
+                'error': error,
+                'status_code': response.status_code if response.status_code >= 400 else 500,
+            }
+
+        _, options = parse_options_header(response.headers.get('Content-Disposition', ''))
+        file_name = options.get('filename') or f"{job_id}.bin"
+        data_file = _job_data_file(job_id)
+        tmp_file = f"{data_file}.tmp"
+        with open(tmp_file, 'wb') as f:
+            for chunk in response.iter_encoded():
+                f.write(chunk)
+        os.replace(tmp_file, data_file)
+        return {
+            'status': 'succeeded',
+            'progress': 100,
+            'message': '生成完成',
+            'file_name': file_name,
+            'mimetype': response.mimetype,
+            'size': os.path.getsize(data_file),
+        }
+    finally:
+        response.close()
+
+
+def get_report_job(job_id):
+    """
+    获取任务状态，任务不存在或不属于当前用户时返回 None
+    """
+    if not _JOB_ID_PATTERN.match(job_id or ''):
+        return None
+    job = _read_job(job_id)
+    if job is None:
+        return None
+    if job.get('user_id') is not None and job['user_id'] != _current_user_id():
+        return None
+    if job['status'] in ('queued', 'running') and _job_interrupted(job):
+        job = _update_job(job_id, status='failed', error='任务已中断，请重新生成', status_code=500) or job
+    return job
+
+
+def _job_interrupted(job):
+    """执行任务的进程已退出，或任务开始后长时间未结束"""
+    pid = job.get('pid')
+    if pid is not None and not process_alive(pid):
+        return True
+    # 只计算开始执行后的时间，排在长任务后面的任务不会被误判
+    started_at = job.get('started_at')
+    return started_at is not None and time.time() - started_at > REPORT_JOB_STALE_AGE
+
+
+def report_job_payload(job):
+    """任务状态接口返回的字段"""
+    payload = {
+        'job_id': job['job_id'],
+        'type': job['type'],
+        'status': job['status'],
+        'progress': job.get('progress', 0),
+        'message': job.get('message'),
+        'created_at': job.get('created_at'),
+        'finished_at': job.get('finished_at'),
+    }
+    if job['status'] == 'failed':
+        payload['error'] = job.get('error')
+        payload['status_code'] = job.get('status_code', 500)
+    elif job['status'] == 'succeeded':
+        if job.get('file_url'):
+            payload['file_url'] = job['file_url']
+        else:
+            payload['download_url'] = f"/api/report_jobs/{job['job_id']}/download"
+            payload['file_name'] = job.get('file_name')
+            payload['size'] = job.get('size')
+    return payload
+
+
+def send_report_job_file(job):
+    """发送已完成任务生成的文件"""
+    data_file = _job_data_file(job['job_id'])
+    if job['status'] != 'succeeded' or not os.path.exists(data_file):
+        return jsonify({'success': False, 'error': '文件不存在或已过期，请重新生成'}), 404
+    mark_file_used(data_file)
+    return send_file(
+        os.path.abspath(data_file),
+        as_attachment=True,
+        download_name=job.get('file_name') or os.path.basename(data_file),
+        mimetype=job.get('mimetype') or 'application/octet-stream'
+    )
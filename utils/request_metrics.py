@@ -0,0 +1,421 @@
+"""
+请求耗时、SQL 和缓存统计
+
+log_request_info / log_response_info 只记录请求路径和错误状态码，看不出哪些接口慢、慢在哪里。
+这里在每个请求中统计：
+- 按接口（Flask endpoint）的请求数、耗时分布（直方图）和响应字节数；
+- 请求期间执行的 SQL 语句数和耗时（SQLAlchemy 引擎事件，export.py 中直接使用 pymysql 的查询不在其中）；
+- 缓存命中和未命中次数（评分汇总缓存、项目导出数据、DWG 缓存，由 record_cache_access 上报）。
+
+统计保存在本进程内存中，并定期写入 temp/metrics/<进程号>-<标识>.json；管理后台的指标接口合并各工作进程的数据，
+以 Prometheus 文本格式输出。已退出进程（gunicorn 重启工作进程）的统计并入 temp/metrics/archive.json，
+合并结果始终包含归档，计数器不会因为工作进程重启而减少。
+"""
+
+import os
+import json
+import time
+import uuid
+import threading
+import logging
+from flask import g, request, has_request_context
+
+logger = logging.getLogger('greenscore')
+
+METRICS_DIR = os.path.join('temp', 'metrics')
+# 已退出进程的统计归档
+METRICS_ARCHIVE_FILE = os.path.join(METRICS_DIR, 'archive.json')
+METRICS_ARCHIVE_LOCK_FILE = os.path.join(METRICS_DIR, 'archive.lock')
+# 归档锁文件超过该时间视为持有锁的进程异常退出后遗留（秒）
+ARCHIVE_LOCK_STALE_AGE = 60
+# 归档中保留的已并入快照文件名数量，用于识别已并入但尚未删除的文件
+ARCHIVE_FOLDED_MAX = 200
+# 快照中合并的统计项
+METRIC_SECTIONS = ('requests', 'latency', 'response_bytes', 'sql', 'cache')
+# 本进程统计写入文件的最小间隔（秒）
+METRICS_SNAPSHOT_INTERVAL = 5
+# 请求耗时直方图的桶上限（秒）
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+# 不在请求中执行的 SQL（后台线程、报告任务）记录在该接口名下
+BACKGROUND_ENDPOINT = '(background)'
+
+_lock = threading.Lock()
+_last_snapshot = 0
+_enabled = False
+_sql_local = threading.local()
+# 本进程快照文件名中的标识，进程号被新的工作进程复用时不会覆盖旧进程的文件
+_process_token = None
+_process_token_pid = None
+
+# {(endpoint, method, status): 次数}
+_requests = {}
+# {(endpoint, method): [各桶计数..., +Inf 桶计数, 耗时合计]}
+_latency = {}
+# {endpoint: 响应字节数}
+_response_bytes = {}
+# {endpoint: [语句数, 耗时合计]}
+_sql = {}
+# {(cache, result): 次数}
+_cache = {}
+
+
+def init_request_metrics(app):
+    """注册请求钩子和 SQLAlchemy 事件，METRICS_ENABLED 为 False 时不做任何统计"""
+    global _enabled
+    if not app.config.get('METRICS_ENABLED', True):
+        logger.info("请求统计已禁用")
+        return
+    if _enabled:
+        return
+    _enabled = True
+    os.makedirs(METRICS_DIR, exist_ok=True)
+
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+    event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+    event.listen(Engine, 'handle_error', _handle_sql_error)
+
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+
+
+def _endpoint_name():
+    return request.endpoint or '(unmatched)'
+
+
+def _start_request():
+    g._metrics_started = time.perf_counter()
+    g._metrics_sql = [0, 0.0]
+
+
+def _finish_request(response):
+    started = g.pop('_metrics_started', None)
+    if started is None:
+        return response
+    try:
+        elapsed = time.perf_counter() - started
+        sql_count, sql_time = g.pop('_metrics_sql', (0, 0.0))
+        endpoint = _endpoint_name()
+        method = request.method
+        # 直接发送文件的响应（send_file）长度来自 Content-Length，流式响应按 0 计
+        size = response.content_length or 0
+        with _lock:
+            key = (endpoint, method, str(response.status_code))
+            _requests[key] = _requests.get(key, 0) + 1
+            _observe_latency((endpoint, method), elapsed)
+            _response_bytes[endpoint] = _response_bytes.get(endpoint, 0) + size
+            if sql_count:
+                _add_sql(endpoint, sql_count, sql_time)
+        _maybe_write_snapshot()
+    except Exception as e:
+        logger.warning(f"记录请求统计失败: {str(e)}")
+    return response
+
+
+def _observe_latency(key, elapsed):
+    values = _latency.get(key)
+    if values is None:
+        values = _latency[key] = [0] * (len(LATENCY_BUCKETS) + 1) + [0.0]
+    for index, upper in enumerate(LATENCY_BUCKETS):
+        if elapsed <= upper:
+            values[index] += 1
+            break
+    else:
+        values[len(LATENCY_BUCKETS)] += 1
+    values[-1] += elapsed
+
+
+def _add_sql(endpoint, count, seconds):
+    values = _sql.get(endpoint)
+    if values is None:
+        values = _sql[endpoint] = [0, 0.0]
+    values[0] += count
+    values[1] += seconds
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stack = getattr(_sql_local, 'started', None)
+    if stack is None:
+        stack = _sql_local.started = []
+    stack.append(time.perf_counter())
+
+
+def _record_sql(elapsed):
+    if has_request_context() and '_metrics_sql' in g:
+        g._metrics_sql[0] += 1
+        g._metrics_sql[1] += elapsed
+        return
+    with _lock:
+        _add_sql(BACKGROUND_ENDPOINT, 1, elapsed)
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stack = getattr(_sql_local, 'started', None)
+    if stack:
+        _record_sql(time.perf_counter() - stack.pop())
+
+
+def _handle_sql_error(exception_context):
+    # 执行出错时 after_cursor_execute 不会触发，这里把开始时间出栈，失败的语句同样计入
+    stack = getattr(_sql_local, 'started', None)
+    if stack:
+        _record_sql(time.perf_counter() - stack.pop())
+
+
+def record_cache_access(cache_name, hit):
+    """上报一次缓存访问，cache_name 例如 'score_summary'、'export_data'、'dwg'"""
+    if not _enabled:
+        return
+    key = (cache_name, 'hit' if hit else 'miss')
+    with _lock:
+        _cache[key] = _cache.get(key, 0) + 1
+
+
+def _snapshot():
+    with _lock:
+        return {
+            'pid': os.getpid(),
+            'updated_at': time.time(),
+            'requests': [[list(key), value] for key, value in _requests.items()],
+            'latency': [[list(key), list(values)] for key, values in _latency.items()],
+            'response_bytes': [[[key], value] for key, value in _response_bytes.items()],
+            'sql': [[[key], list(values)] for key, values in _sql.items()],
+            'cache': [[list(key), value] for key, value in _cache.items()],
+        }
+
+
+def _snapshot_file():
+    global _process_token, _process_token_pid
+    if _process_token_pid != os.getpid():
+        # gunicorn 工作进程由主进程 fork 而来，按进程号重新生成标识
+        _process_token = uuid.uuid4().hex[:12]
+        _process_token_pid = os.getpid()
+    return os.path.join(METRICS_DIR, f"{_process_token_pid}-{_process_token}.json")
+
+
+def write_metrics_snapshot():
+    """把本进程的统计写入文件，供其他工作进程的指标接口读取"""
+    global _last_snapshot
+    _last_snapshot = time.time()
+    snapshot_file = _snapshot_file()
+    tmp_file = f"{snapshot_file}.{threading.get_ident()}.tmp"
+    try:
+        os.makedirs(METRICS_DIR, exist_ok=True)
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(_snapshot(), f)
+        os.replace(tmp_file, snapshot_file)
+    except OSError as e:
+        logger.warning(f"保存请求统计失败: {str(e)}")
+
+
+def _maybe_write_snapshot():
+    if time.time() - _last_snapshot >= METRICS_SNAPSHOT_INTERVAL:
+        write_metrics_snapshot()
+
+
+def process_alive(pid):
+    """进程号对应的进程是否仍在运行"""
+    if pid == os.getpid():
+        return True
+    if os.name == 'nt':
+        # Windows 下使用 waitress 单进程运行，其他进程号的文件都是以前运行留下的
+        return False
+    try:
+        os.kill(pid, 0)
+        return True
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+
+
+def _read_json(file_path):
+    try:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _acquire_archive_lock():
+    try:
+        if time.time() - os.path.getmtime(METRICS_ARCHIVE_LOCK_FILE) > ARCHIVE_LOCK_STALE_AGE:
+            os.remove(METRICS_ARCHIVE_LOCK_FILE)
+    except OSError:
+        pass
+    try:
+        fd = os.open(METRICS_ARCHIVE_LOCK_FILE, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        os.write(fd, str(os.getpid()).encode())
+        os.close(fd)
+        return True
+    except FileExistsError:
+        return False
+
+
+def _archive_snapshots(names):
+    """
+    把已退出进程的快照并入归档文件后删除
+
+    归档先写入并记录已并入的文件名，再删除快照文件；中途退出时留下的快照按文件名识别，不会重复累计。
+    其他进程正在归档时直接返回，这些快照下次再处理。
+    """
+    if not _acquire_archive_lock():
+        return
+    try:
+        archive = _read_json(METRICS_ARCHIVE_FILE) or {}
+        folded = archive.get('folded', [])
+        changed = False
+        for name in names:
+            if name in folded:
+                continue
+            snapshot = _read_json(os.path.join(METRICS_DIR, name))
+            if snapshot is not None:
+                for section in METRIC_SECTIONS:
+                    archive[section] = [[list(key), value] for key, value in _merge([archive, snapshot], section).items()]
+            folded.append(name)
+            changed = True
+        if changed:
+            archive['folded'] = folded[-ARCHIVE_FOLDED_MAX:]
+            archive['updated_at'] = time.time()
+            tmp_file = f"{METRICS_ARCHIVE_FILE}.{os.getpid()}.tmp"
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(archive, f)
+            os.replace(tmp_file, METRICS_ARCHIVE_FILE)
+        for name in names:
+            try:
+                os.remove(os.path.join(METRICS_DIR, name))
+            except OSError:
+                pass
+    except OSError as e:
+        logger.warning(f"归档请求统计失败: {str(e)}")
+    finally:
+        try:
+            os.remove(METRICS_ARCHIVE_LOCK_FILE)
+        except OSError:
+            pass
+
+
+def _load_snapshots():
+    """
+    读取各进程的统计和已退出进程的归档
+
+    返回:
+    - tuple: (参与合并的快照列表, 存活的工作进程数)
+    """
+    snapshots = {}
+    dead = []
+    live = 0
+    try:
+        names = os.listdir(METRICS_DIR)
+    except OSError:
+        return [], 0
+    for name in names:
+        if not name.endswith('.json'):
+            continue
+        try:
+            pid = int(name[:-5].split('-', 1)[0])
+        except ValueError:
+            continue
+        snapshot = _read_json(os.path.join(METRICS_DIR, name))
+        if snapshot is None:
+            continue
+        if process_alive(pid):
+            live += 1
+        else:
+            dead.append(name)
+        snapshots[name] = snapshot
+
+    # 先读快照再读归档：期间被其他进程并入归档的快照按文件名去掉，不会重复或遗漏
+    archive = _read_json(METRICS_ARCHIVE_FILE)
+    if archive:
+        for name in archive.get('folded', []):
+            snapshots.pop(name, None)
+    if dead:
+        _archive_snapshots(dead)
+    return list(snapshots.values()) + ([archive] if archive else []), live
+
+
+def _merge(snapshots, section):
+    merged = {}
+    for snapshot in snapshots:
+        for labels, value in snapshot.get(section, []):
+            key = tuple(labels)
+            if isinstance(value, list):
+                current = merged.get(key)
+                merged[key] = value if current is None else [a + b for a, b in zip(current, value)]
+            else:
+                merged[key] = merged.get(key, 0) + value
+    return merged
+
+
+def _escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels):
+    return '{' + ','.join(f'{name}="{_escape_label(value)}"' for name, value in labels.items()) + '}'
+
+
+def _format_number(value):
+    if isinstance(value, float):
+        return repr(round(value, 6))
+    return str(value)
+
+
+def render_prometheus_metrics():
+    """合并各工作进程的统计，返回 Prometheus 文本格式（0.0.4）"""
+    write_metrics_snapshot()
+    snapshots, workers = _load_snapshots()
+    lines = []
+
+    lines.append('# HELP greenscore_http_requests_total 按接口、方法和状态码统计的请求数')
+    lines.append('# TYPE greenscore_http_requests_total counter')
+    for (endpoint, method, status), value in sorted(_merge(snapshots, 'requests').items()):
+        lines.append(f"greenscore_http_requests_total{_labels(endpoint=endpoint, method=method, status=status)} {value}")
+
+    lines.append('# HELP greenscore_http_request_duration_seconds 请求处理耗时')
+    lines.append('# TYPE greenscore_http_request_duration_seconds histogram')
+    for (endpoint, method), values in sorted(_merge(snapshots, 'latency').items()):
+        cumulative = 0
+        for upper, count in zip(LATENCY_BUCKETS, values):
+            cumulative += count
+            lines.append(
+                f"greenscore_http_request_duration_seconds_bucket"
+                f"{_labels(endpoint=endpoint, method=method, le=upper)} {cumulative}"
+            )
+        cumulative += values[len(LATENCY_BUCKETS)]
+        lines.append(
+            f"greenscore_http_request_duration_seconds_bucket{_labels(endpoint=endpoint, method=method, le='+Inf')} {cumulative}"
+        )
+        lines.append(
+            f"greenscore_http_request_duration_seconds_sum{_labels(endpoint=endpoint, method=method)} {_format_number(values[-1])}"
+        )
+        lines.append(
+            f"greenscore_http_request_duration_seconds_count{_labels(endpoint=endpoint, method=method)} {cumulative}"
+        )
+
+    lines.append('# HELP greenscore_http_response_bytes_total 响应字节数')
+    lines.append('# TYPE greenscore_http_response_bytes_total counter')
+    for (endpoint,), value in sorted(_merge(snapshots, 'response_bytes').items()):
+        lines.append(f"greenscore_http_response_bytes_total{_labels(endpoint=endpoint)} {value}")
+
+    sql = sorted(_merge(snapshots, 'sql').items())
+    lines.append('# HELP greenscore_db_queries_total 执行的 SQL 语句数')
+    lines.append('# TYPE greenscore_db_queries_total counter')
+    for (endpoint,), (count, _) in sql:
+        lines.append(f"greenscore_db_queries_total{_labels(endpoint=endpoint)} {count}")
+    lines.append('# HELP greenscore_db_query_duration_seconds_total SQL 语句执行耗时合计')
+    lines.append('# TYPE greenscore_db_query_duration_seconds_total counter')
+    for (endpoint,), (_, seconds) in sql:
+        lines.append(f"greenscore_db_query_duration_seconds_total{_labels(endpoint=endpoint)} {_format_number(seconds)}")
+
+    lines.append('# HELP greenscore_cache_requests_total 缓存命中和未命中次数')
+    lines.append('# TYPE greenscore_cache_requests_total counter')
+    for (cache_name, result), value in sorted(_merge(snapshots, 'cache').items()):
+        lines.append(f"greenscore_cache_requests_total{_labels(cache=cache_name, result=result)} {value}")
+
+    lines.append('# HELP greenscore_metrics_workers 参与统计的工作进程数')
+    lines.append('# TYPE greenscore_metrics_workers gauge')
+    lines.append(f"greenscore_metrics_workers {workers}")
+    return '\n'.join(lines) + '\n'
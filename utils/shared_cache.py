@@ -0,0 +1,362 @@
+"""
+多进程共享的 SQLite 缓存后端
+
+SimpleCache 在每个 gunicorn 工作进程中各有一份，save_score / update_score_direct 只能清除本进程的缓存，
+其他进程仍返回旧的评分汇总；FileSystemCache 每次 has + get 都要读文件并反序列化两次。
+这里把缓存保存在一个 SQLite 数据库（WAL 模式，启用 mmap）中，所有工作进程读写同一份数据：
+- 任一进程删除或更新缓存，其他进程的下一次读取立即可见；
+- get_or_set 保证同一时间只有一个进程计算缺失的值，其他进程等待结果（防止缓存击穿）；
+- update 在一个写事务中完成读取、修改、写回，并发的增量更新不会互相覆盖。
+
+通过 Flask-Caching 配置使用：CACHE_TYPE = 'utils.shared_cache.SQLiteCache'，CACHE_DIR 为数据库所在目录。
+
+评分汇总增量更新和缓存标签依赖 update_cache_value 的原子性，其他后端中只支持 RedisCache（WATCH/MULTI 乐观事务）
+和进程内的 SimpleCache / NullCache，配置其他后端时 check_cache_backend 在启动时报错。
+"""
+
+import os
+import time
+import pickle
+import random
+import sqlite3
+import threading
+import logging
+from cachelib.redis import RedisCache as CachelibRedisCache
+from cachelib.simple import SimpleCache as CachelibSimpleCache
+from flask_caching.backends.base import BaseCache
+from flask_caching.backends.nullcache import NullCache
+
+logger = logging.getLogger('greenscore')
+
+# 计算锁的键前缀，锁本身也存放在缓存表中
+_LOCK_PREFIX = '__lock__:'
+# 每次写入时以该概率顺带清理过期条目
+_PRUNE_PROBABILITY = 0.01
+# 进程内缓存（SimpleCache）的读取-修改-写回锁
+_local_update_lock = threading.Lock()
+
+
+class SQLiteCache(BaseCache):
+    """
+    Flask-Caching 后端，多个进程和线程共用一个 SQLite 数据库
+
+    参数:
+    - cache_dir: 数据库所在目录
+    - default_timeout: 默认过期时间（秒），0 表示不过期
+    - busy_timeout: 数据库被其他进程锁定时的最长等待时间（秒）
+    """
+
+    def __init__(self, cache_dir='cache', default_timeout=300, busy_timeout=5.0, file_name='shared_cache.sqlite3'):
+        super().__init__(default_timeout=default_timeout)
+        os.makedirs(cache_dir, exist_ok=True)
+        self._path = os.path.join(cache_dir, file_name)
+        self._busy_timeout = busy_timeout
+        # 连接按线程保存；记录进程号，fork 出的工作进程不复用父进程的连接
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache_entries ("
+                "key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL NOT NULL)"
+            )
+
+    @classmethod
+    def factory(cls, app, config, args, kwargs):
+        kwargs.update({
+            'cache_dir': config.get('CACHE_DIR') or 'cache',
+            'busy_timeout': config.get('CACHE_SQLITE_BUSY_TIMEOUT', 5.0),
+        })
+        return cls(*args, **kwargs)
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+        conn = sqlite3.connect(self._path, timeout=self._busy_timeout, isolation_level=None, check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('PRAGMA mmap_size=67108864')
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+    def _expires_at(self, timeout):
+        timeout = self._normalize_timeout(timeout)
+        return time.time() + timeout if timeout > 0 else 0
+
+    @staticmethod
+    def _is_live(expires, now):
+        return expires == 0 or expires > now
+
+    def _maybe_prune(self, conn):
+        if random.random() < _PRUNE_PROBABILITY:
+            conn.execute("DELETE FROM cache_entries WHERE expires != 0 AND expires <= ?", (time.time(),))
+
+    def _load(self, row):
+        if row is None or not self._is_live(row[1], time.time()):
+            return None
+        try:
+            return pickle.loads(row[0])
+        except Exception as e:
+            logger.warning(f"缓存数据反序列化失败: {str(e)}")
+            return None
+
+    def get(self, key):
+        try:
+            row = self._connect().execute(
+                "SELECT value, expires FROM cache_entries WHERE key = ?", (key,)
+            ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning(f"读取共享缓存失败: {key}, {str(e)}")
+            return None
+        return self._load(row)
+
+    def get_many(self, *keys):
+        if not keys:
+            return []
+        try:
+            placeholders = ','.join('?' * len(keys))
+            rows = self._connect().execute(
+                f"SELECT key, value, expires FROM cache_entries WHERE key IN ({placeholders})", keys
+            ).fetchall()
+        except sqlite3.Error as e:
+            logger.warning(f"批量读取共享缓存失败: {str(e)}")
+            return [None] * len(keys)
+        found = {row[0]: self._load(row[1:]) for row in rows}
+        return [found.get(key) for key in keys]
+
+    def has(self, key):
+        try:
+            row = self._connect().execute(
+                "SELECT expires FROM cache_entries WHERE key = ?", (key,)
+            ).fetchone()
+        except sqlite3.Error:
+            return False
+        return row is not None and self._is_live(row[0], time.time())
+
+    def set(self, key, value, timeout=None):
+        try:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO cache_entries (key, value, expires) VALUES (?, ?, ?)",
+                (key, sqlite3.Binary(pickle.dumps(value, pickle.HIGHEST_PROTOCOL)), self._expires_at(timeout))
+            )
+            self._maybe_prune(conn)
+            return True
+        except (sqlite3.Error, pickle.PicklingError) as e:
+            logger.warning(f"写入共享缓存失败: {key}, {str(e)}")
+            return False
+
+    def set_many(self, mapping, timeout=None):
+        expires = self._expires_at(timeout)
+        try:
+            rows = [
+                (key, sqlite3.Binary(pickle.dumps(value, pickle.HIGHEST_PROTOCOL)), expires)
+                for key, value in mapping.items()
+            ]
+            conn = self._connect()
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                conn.executemany("INSERT OR REPLACE INTO cache_entries (key, value, expires) VALUES (?, ?, ?)", rows)
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+            return list(mapping.keys())
+        except (sqlite3.Error, pickle.PicklingError) as e:
+            logger.warning(f"批量写入共享缓存失败: {str(e)}")
+            return []
+
+    def add(self, key, value, timeout=None):
+        """键不存在（或已过期）时写入，返回是否写入"""
+        try:
+            conn = self._connect()
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                conn.execute(
+                    "DELETE FROM cache_entries WHERE key = ? AND expires != 0 AND expires <= ?", (key, time.time())
+                )
+                cursor = conn.execute(
+                    "INSERT OR IGNORE INTO cache_entries (key, value, expires) VALUES (?, ?, ?)",
+                    (key, sqlite3.Binary(pickle.dumps(value, pickle.HIGHEST_PROTOCOL)), self._expires_at(timeout))
+                )
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+            return cursor.rowcount == 1
+        except (sqlite3.Error, pickle.PicklingError) as e:
+            logger.warning(f"写入共享缓存失败: {key}, {str(e)}")
+            return False
+
+    def delete(self, key):
+        try:
+            cursor = self._connect().execute("DELETE FROM cache_entries WHERE key = ?", (key,))
+            return cursor.rowcount > 0
+        except sqlite3.Error as e:
+            logger.warning(f"删除共享缓存失败: {key}, {str(e)}")
+            return False
+
+    def delete_many(self, *keys):
+        if not keys:
+            return []
+        try:
+            placeholders = ','.join('?' * len(keys))
+            self._connect().execute(f"DELETE FROM cache_entries WHERE key IN ({placeholders})", keys)
+            return list(keys)
+        except sqlite3.Error as e:
+            logger.warning(f"批量删除共享缓存失败: {str(e)}")
+            return []
+
+    def clear(self):
+        try:
+            self._connect().execute("DELETE FROM cache_entries")
+            return True
+        except sqlite3.Error as e:
+            logger.warning(f"清空共享缓存失败: {str(e)}")
+            return False
+
+    def update(self, key, func, timeout=None):
+        """
+        在一个写事务中读取、修改并写回缓存值，其他进程的写入会等待本次更新完成
+
+        参数:
+        - func: 接收当前值（不存在时为 None），返回新值；返回 None 表示删除该键
+
+        返回:
+        - 写回的新值
+        """
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute("SELECT value, expires FROM cache_entries WHERE key = ?", (key,)).fetchone()
+            value = func(self._load(row))
+            if value is None:
+                conn.execute("DELETE FROM cache_entries WHERE key = ?", (key,))
+            else:
+                conn.execute(
+                    "INSERT OR REPLACE INTO cache_entries (key, value, expires) VALUES (?, ?, ?)",
+                    (key, sqlite3.Binary(pickle.dumps(value, pickle.HIGHEST_PROTOCOL)), self._expires_at(timeout))
+                )
+            conn.execute('COMMIT')
+            return value
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def inc(self, key, delta=1):
+        return self.update(key, lambda value: (value or 0) + delta)
+
+    def dec(self, key, delta=1):
+        return self.update(key, lambda value: (value or 0) - delta)
+
+    def get_or_set(self, key, func, timeout=None, lock_timeout=30.0, poll_interval=0.05):
+        """
+        读取缓存，不存在时计算并写入；多个进程同时缺失时只有一个进程计算
+
+        其他进程等待计算结果，超过 lock_timeout 仍未得到结果时自行计算
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        lock_key = _LOCK_PREFIX + key
+        deadline = time.time() + lock_timeout
+        while not self.add(lock_key, os.getpid(), timeout=max(1, int(lock_timeout))):
+            if time.time() >= deadline:
+                logger.warning(f"等待缓存计算超时，自行计算: {key}")
+                return self._compute_and_set(key, func, timeout)
+            time.sleep(poll_interval)
+            value = self.get(key)
+            if value is not None:
+                return value
+
+        try:
+            # 获得锁后再检查一次，其他进程可能刚刚写入
+            value = self.get(key)
+            if value is not None:
+                return value
+            return self._compute_and_set(key, func, timeout)
+        finally:
+            self.delete(lock_key)
+
+    def _compute_and_set(self, key, func, timeout):
+        value = func()
+        if value is not None:
+            self.set(key, value, timeout=timeout)
+        return value
+
+
+def get_or_set_cache_value(cache, key, func, timeout=None):
+    """
+    对 Flask-Caching 实例执行 get-or-set
+
+    共享后端保证只有一个进程计算；其他后端（例如开发环境配置的 SimpleCache）退化为 get + set
+    """
+    backend = cache.cache
+    if hasattr(backend, 'get_or_set'):
+        return backend.get_or_set(key, func, timeout=timeout)
+    value = backend.get(key)
+    if value is None:
+        value = func()
+        if value is not None:
+            backend.set(key, value, timeout=timeout)
+    return value
+
+
+def check_cache_backend(cache):
+    """
+    检查缓存后端是否支持原子的读取-修改-写回
+
+    FileSystemCache、Memcached 等多进程共享的后端只能 get + set，并发保存评分时增量和标签会互相覆盖
+    """
+    backend = cache.cache
+    if hasattr(backend, 'update') or isinstance(backend, (CachelibRedisCache, CachelibSimpleCache, NullCache)):
+        return
+    raise RuntimeError(
+        f"不支持的缓存后端 {type(backend).__name__}：请使用 utils.shared_cache.SQLiteCache、RedisCache 或 SimpleCache"
+    )
+
+
+def _redis_update(backend, key, func, timeout):
+    """RedisCache 的读取-修改-写回：WATCH 键后在 MULTI 中写回，期间键被其他进程修改时重新执行 func"""
+    from redis.exceptions import WatchError
+    name = backend.key_prefix + key
+    timeout = backend._normalize_timeout(timeout)
+    with backend._write_client.pipeline() as pipe:
+        while True:
+            try:
+                pipe.watch(name)
+                value = func(backend.serializer.loads(pipe.get(name)))
+                pipe.multi()
+                if value is None:
+                    pipe.delete(name)
+                elif timeout == -1:
+                    pipe.set(name, backend.serializer.dumps(value))
+                else:
+                    pipe.setex(name, timeout, backend.serializer.dumps(value))
+                pipe.execute()
+                return value
+            except WatchError:
+                continue
+
+
+def update_cache_value(cache, key, func, timeout=None):
+    """
+    对 Flask-Caching 实例执行读取-修改-写回，func 返回 None 时删除该键
+
+    共享后端在一个写事务中完成；RedisCache 使用 WATCH/MULTI，冲突时 func 会被再次调用，不应有副作用；
+    SimpleCache 只在本进程内有效，用进程内的锁保证原子性
+    """
+    backend = cache.cache
+    if hasattr(backend, 'update'):
+        return backend.update(key, func, timeout=timeout)
+    if isinstance(backend, CachelibRedisCache):
+        return _redis_update(backend, key, func, timeout)
+    check_cache_backend(cache)
+    with _local_update_lock:
+        value = func(backend.get(key))
+        if value is None:
+            backend.delete(key)
+        else:
+            backend.set(key, value, timeout=timeout)
+        return value
@@ -0,0 +1,125 @@
+"""
+Word 模板缓存
+
+static/templates 下的模板在每次导出时内容都相同。这里按模板路径和修改时间缓存
+解析后的文档以及书签、占位符索引，渲染时只复制缓存的文档，不再重复读取和解析模板文件。
+模板文件被替换（修改时间或大小变化）后自动重新加载。
+"""
+
+import os
+import copy
+import threading
+import logging
+from io import BytesIO
+from docx import Document
+from docx.oxml.ns import qn
+from docx.text.paragraph import Paragraph
+from utils.placeholder_engine import PLACEHOLDER_PATTERN
+
+logger = logging.getLogger('greenscore')
+
+# 最多缓存的模板数量，超过后丢弃最早加载的模板
+TEMPLATE_CACHE_MAX = 32
+
+_template_cache = {}
+_template_cache_lock = threading.Lock()
+
+
+def get_document_paragraphs(doc):
+    """
+    按文档顺序返回正文中的全部段落元素（包括表格内的段落）
+
+    同一模板的副本返回的顺序一致，模板索引中的段落序号即为该列表的下标。
+    """
+    return doc.element.body.xpath('.//w:p')
+
+
+def _build_template_index(doc):
+    """扫描文档，记录书签名称和包含占位符的段落"""
+    body = doc.element.body
+    bookmarks = [
+        bookmark.get(qn('w:name'))
+        for bookmark in body.iter(qn('w:bookmarkStart'))
+        if bookmark.get(qn('w:name'))
+    ]
+
+    placeholders = {}
+    placeholder_paragraphs = []
+    for index, p in enumerate(get_document_paragraphs(doc)):
+        text = ''.join(t.text or '' for t in p.iter(qn('w:t')))
+        if '{' not in text:
+            continue
+        names = PLACEHOLDER_PATTERN.findall(text)
+        if not names:
+            continue
+        placeholder_paragraphs.append(index)
+        for name in names:
+            placeholders.setdefault(name, []).append(index)
+
+    return {
+        'bookmarks': bookmarks,
+        'bookmark_names': set(bookmarks),
+        # 占位符名称 -> 所在段落序号列表
+        'placeholders': placeholders,
+        'placeholder_paragraphs': placeholder_paragraphs,
+    }
+
+
+def _load_template_entry(template_path, stat):
+    with open(template_path, 'rb') as f:
+        content = f.read()
+    doc = Document(BytesIO(content))
+    index = _build_template_index(doc)
+    logger.info(
+        f"模板已加载到缓存: {template_path}, 书签 {len(index['bookmarks'])} 个, "
+        f"占位符段落 {len(index['placeholder_paragraphs'])} 个"
+    )
+    return {
+        'mtime': stat.st_mtime_ns,
+        'size': stat.st_size,
+        'content': content,
+        'document': doc,
+        'index': index,
+    }
+
+
+def get_template_entry(template_path):
+    """获取模板缓存项，模板文件未缓存或已修改时重新加载"""
+    cache_key = os.path.abspath(template_path)
+    stat = os.stat(cache_key)
+    with _template_cache_lock:
+        entry = _template_cache.get(cache_key)
+    if entry and entry['mtime'] == stat.st_mtime_ns and entry['size'] == stat.st_size:
+        return entry
+
+    entry = _load_template_entry(cache_key, stat)
+    with _template_cache_lock:
+        _template_cache.pop(cache_key, None)
+        _template_cache[cache_key] = entry
+        while len(_template_cache) > TEMPLATE_CACHE_MAX:
+            _template_cache.pop(next(iter(_template_cache)))
+    return entry
+
+
+def load_template_document(template_path):
+    """
+    获取可直接修改的模板文档副本
+
+    返回:
+    - tuple: (Document, 模板索引)，索引在各副本间共享，调用方不应修改
+    """
+    entry = get_template_entry(template_path)
+    try:
+        doc = copy.deepcopy(entry['document'])
+    except Exception as e:
+        # 复制失败时从缓存的文件内容重新解析，仍然避免读取磁盘
+        logger.warning(f"复制缓存模板失败，改为重新解析: {template_path}, {str(e)}")
+        doc = Document(BytesIO(entry['content']))
+    return doc, entry['index']
+
+
+def get_placeholder_paragraphs(doc, template_index):
+    """根据模板索引返回包含占位符的段落对象，无需遍历整个文档"""
+    paragraphs = get_document_paragraphs(doc)
+    parent = doc._body
+    return [Paragraph(paragraphs[index], parent) for index in template_index['placeholder_paragraphs']]
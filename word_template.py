@@ -13,6 +13,13 @@ import lxml.etree
 import traceback
 import platform # 用于检查操作系统
 import sys # 用于检查平台
+import threading
+import multiprocessing
+from io import BytesIO
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from utils.template_cache import load_template_document, get_placeholder_paragraphs
+from utils.placeholder_engine import replace_placeholders_in_runs, replace_placeholders_in_document
 try:
     import pythoncom # 导入 pythoncom 用于 CoInitialize
 except ImportError:
@@ -45,8 +52,176 @@ def process_runs(runs, target_chars):
             # 对于中文字体，还需要设置对应的字体族
             run._element.rPr.rFonts.set(qn('w:eastAsia'), '宋体')    
 
-def process_template(data):
-    
+# 各评价标准的报审表模板（按输出顺序）
+CHENGDU_TEMPLATE_FILES = [
+    '附表1-1 成都市绿色建筑设计施工图审查自评表（民用建筑）.docx',
+    '附表2-1 成都市绿色建筑设计施工图申报信息汇总表（民用建筑）.docx',
+    '附表3 水系统规划设计申报表.docx',
+    '附表4 专项报告申报一览表.docx'
+]
+SICHUAN_BASIC_TEMPLATE_FILES = [
+    '附表1 四川省民用绿色建筑施工图审查结果汇总表.docx',
+    '附表2 四川省民用绿色建筑设计基本级施工图审查明细一览表.docx',
+    '附表4 水系统规划设计评审表.docx'
+]
+SICHUAN_TEMPLATE_FILES = [
+    '附表1 四川省民用绿色建筑施工图审查结果汇总表.docx',
+    '附表2 四川省民用绿色建筑设计基本级施工图审查明细一览表.docx',
+    '附表3 四川省民用绿色建筑设计提高级施工图审查明细一览表.docx',
+    '附表4 水系统规划设计评审表.docx'
+]
+ANHUI_TEMPLATE_FILES = ['安徽绿色建筑审查表.docx']
+
+# 多模板渲染进程池：python-docx 处理是CPU密集型操作，受GIL限制无法用线程并行，
+# 因此使用进程池。进程池在首次使用时创建并在后续请求中复用。
+# gunicorn 工作进程中已有后台线程（报告任务、文件清理、在线时间写入等），直接 fork 可能复制到被其他线程
+# 持有的锁（logging、sqlite、pymysql）而死锁，因此子进程由 forkserver（Windows 下为 spawn）启动。
+_render_pool = None
+_render_pool_lock = threading.Lock()
+
+
+def _get_render_workers():
+    """
+    本进程的模板渲染进程数，为1时不使用进程池
+
+    TEMPLATE_RENDER_WORKERS 是整个服务的渲染进程总数，按 SERVER_WORKERS（gunicorn 工作进程数）平分
+    """
+    cpu_count = os.cpu_count() or 1
+    try:
+        configured = int(current_app.config.get('TEMPLATE_RENDER_WORKERS') or cpu_count)
+        server_workers = int(current_app.config.get('SERVER_WORKERS') or 1)
+    except (TypeError, ValueError):
+        configured, server_workers = cpu_count, 1
+    return max(1, min(configured // max(1, server_workers), cpu_count))
+
+
+def _get_render_context():
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context('forkserver')
+        # forkserver 进程预先导入本模块，渲染进程从它 fork，无需各自重新导入 python-docx
+        context.set_forkserver_preload(['word_template'])
+        return context
+    return multiprocessing.get_context('spawn')
+
+
+def _get_render_pool(max_workers):
+    global _render_pool
+    with _render_pool_lock:
+        if _render_pool is None:
+            _render_pool = ProcessPoolExecutor(max_workers=max_workers, mp_context=_get_render_context())
+            print(f"[word_template.py] 已创建模板渲染进程池，进程数: {max_workers}")
+        return _render_pool
+
+
+def _reset_render_pool():
+    """进程池异常（如子进程被杀死）后丢弃，下次使用时重新创建"""
+    global _render_pool
+    with _render_pool_lock:
+        if _render_pool is not None:
+            _render_pool.shutdown(wait=False)
+        _render_pool = None
+
+
+def _render_template_worker(template_path, data, root_path, output_dir, in_memory):
+    """进程池中执行的单个模板渲染，子进程没有Flask应用上下文，路径由参数传入"""
+    return replace_placeholders(template_path, data, root_path=root_path, output_dir=output_dir, in_memory=in_memory)
+
+
+def _check_render_result(template_file, result):
+    """检查 replace_placeholders 的返回值，有效时返回 (输出路径或文档内容, 模板基础名)"""
+    if not result:
+        print(f"错误: 调用 replace_placeholders 处理模板 {template_file} 时返回 None，表示内部处理失败。请检查之前的日志查找具体错误。跳过添加。")
+        return None
+    output, base_name = result
+    if isinstance(output, bytes):
+        if not output:
+            print(f"警告: 处理模板 {template_file} 返回空文档，跳过添加。")
+            return None
+        print(f"已成功处理并添加: {base_name} ({len(output)} 字节)")
+        return output, base_name
+    if not isinstance(output, str) or not output.endswith('.docx'):
+        print(f"警告: 处理模板 {template_file} 返回无效路径 '{output}'，跳过添加。")
+        return None
+    print(f"已成功处理并添加: {output}")
+    return output, base_name
+
+
+def render_templates(template_files, data, on_output=None, in_memory=False):
+    """
+    渲染一组模板，多个模板时在进程池中并行处理
+
+    参数:
+    - template_files: static/templates 下的模板文件名列表
+    - data: 项目导出数据
+    - on_output: 可选回调，每个模板完成时以 (输出路径, 模板基础名) 调用，调用顺序为完成顺序
+    - in_memory: 为 True 时不写入导出目录，输出路径替换为文档内容 (bytes)
+
+    返回:
+    - list: 按模板顺序排列的 (输出路径, 模板基础名)，失败的模板不包含在内
+    """
+    template_paths = []
+    for template_file in template_files:
+        template_path = os.path.join(current_app.static_folder, 'templates', template_file)
+        if not os.path.exists(template_path):
+            print(f"警告: 模板文件不存在: {template_path}, 将跳过此文件。")
+            continue # 跳过当前文件，继续处理下一个
+        template_paths.append((template_file, template_path))
+
+    results = [None] * len(template_paths)
+
+    def collect(index, result):
+        results[index] = _check_render_result(template_paths[index][0], result)
+        if results[index] and on_output:
+            on_output(*results[index])
+
+    pending = list(range(len(template_paths)))
+    workers = _get_render_workers()
+    if workers > 1 and len(template_paths) > 1:
+        root_path = current_app.root_path
+        output_dir = current_app.config.get('EXPORT_FOLDER', 'static/exports')
+        try:
+            pool = _get_render_pool(workers)
+            futures = {
+                pool.submit(_render_template_worker, template_path, data, root_path, output_dir, in_memory): index
+                for index, (_, template_path) in enumerate(template_paths)
+            }
+            print(f"[word_template.py] 已提交 {len(futures)} 个模板到进程池并行处理")
+            for future in as_completed(futures):
+                index = futures[future]
+                try:
+                    result = future.result()
+                except BrokenProcessPool:
+                    raise
+                except Exception as e:
+                    result = None
+                    print(f"模板 {template_paths[index][0]} 渲染失败: {str(e)}")
+                pending.remove(index)
+                collect(index, result)
+        except (BrokenProcessPool, OSError, RuntimeError) as e:
+            # 进程池不可用时，未完成的模板改为在当前进程中处理
+            print(f"[word_template.py] 模板渲染进程池不可用，改为顺序处理: {str(e)}")
+            _reset_render_pool()
+
+    for index in pending:
+        template_file, template_path = template_paths[index]
+        print(f"处理第 {index+1} 个模板文件: {template_path}")
+        collect(index, replace_placeholders(template_path, data, in_memory=in_memory))
+
+    return [result for result in results if result]
+
+
+def process_template(data, on_output=None, in_memory=False):
+    """
+    按评价标准生成报审表文档
+
+    参数:
+    - data: 项目导出数据，第一项为项目信息
+    - on_output: 可选回调，每个文档生成后立即调用，用于边生成边打包
+    - in_memory: 为 True 时返回文档内容 (bytes) 而不是导出目录中的文件路径
+
+    返回:
+    - list: (输出路径, 模板基础名) 列表；无需处理或失败时返回 None
+    """
     try:
         # --- 添加设计日期 --- 
         if data and isinstance(data[0], dict):
@@ -57,121 +232,33 @@ def process_template(data):
                 print(f"[word_template.py] 已自动添加设计日期: {current_date}")
         # --- 设计日期添加结束 ---
 
-        from flask import current_app
-        import os
-        
         # 根据评价标准选择模板文件
         standard = data[0].get('评价标准', '') 
         # 获取星级目标
         star_rating_target = data[0].get('星级目标', '')
-        output_paths = [] # 用于存储生成的文档路径
-        # --- 修改：存储生成的文档信息 (路径, 基础名) --- 
-        output_info_list = [] 
-        # --- 修改结束 ---
 
         if standard == '国标':
-            if "安徽" in data[0].get('项目地点', '') :
-                template_file = '安徽绿色建筑审查表.docx'
-                template_path = os.path.join(current_app.static_folder, 'templates', template_file)
-                print(f"处理模板文件: {template_path}, 评价标准: {standard}")
-                if not os.path.exists(template_path):
-                    raise Exception(f"模板文件不存在: {template_path}")
-                # --- 修改：处理返回值 --- 
-                result = replace_placeholders(template_path, data)
-                if result:
-                    output_path, base_name = result
-                    if not isinstance(output_path, str) or not output_path.endswith('.docx'):
-                         print(f"警告: 国标模板处理返回无效路径 '{output_path}'，跳过添加。")
-                    else:
-                         output_info_list.append((output_path, base_name))
-                else:
-                     print(f"警告: 国标模板处理失败，跳过添加。")
-                # --- 修改结束 ---
-            else:
+            if "安徽" not in data[0].get('项目地点', ''):
                 return None  # 国标（非安徽）不进行任何操作
-
+            template_files = ANHUI_TEMPLATE_FILES
         elif standard == '四川省标':
             if star_rating_target == '基本级':
-                template_files = [
-                '附表1 四川省民用绿色建筑施工图审查结果汇总表.docx',
-                '附表2 四川省民用绿色建筑设计基本级施工图审查明细一览表.docx',
-                '附表4 水系统规划设计评审表.docx'
-            ]
+                template_files = SICHUAN_BASIC_TEMPLATE_FILES
             else:
-                template_files = [
-                '附表1 四川省民用绿色建筑施工图审查结果汇总表.docx',
-                '附表2 四川省民用绿色建筑设计基本级施工图审查明细一览表.docx',
-                '附表3 四川省民用绿色建筑设计提高级施工图审查明细一览表.docx',
-                '附表4 水系统规划设计评审表.docx'
-            ]
-
-                for idx, template_file in enumerate(template_files):
-                    template_path = os.path.join(current_app.static_folder, 'templates', template_file)
-                    print(f"处理第 {idx+1} 个模板文件 (成都市标): {template_path}")
-                    
-                    if not os.path.exists(template_path):
-                        print(f"警告: 模板文件不存在: {template_path}, 将跳过此文件。")
-                        continue # 跳过当前文件，继续处理下一个
-                    # 调用 replace_placeholders 处理模板
-                    result = replace_placeholders(template_path, data)
-
-                                    # 检查模板是否处理成功
-                    if result:
-                        output_path, base_name = result
-                        if not isinstance(output_path, str) or not output_path.endswith('.docx'):
-                            print(f"警告: 处理模板 {template_file} 返回无效路径 '{output_path}'，跳过添加。")
-                        else:
-                            # 将成功生成的文档信息添加到列表
-                            output_info_list.append((output_path, base_name))
-                            print(f"已成功处理并添加: {output_path}")
-                    else:
-                        print(f"错误: 调用 replace_placeholders 处理模板 {template_file} 时返回 None，表示内部处理失败。请检查之前的日志查找具体错误。跳过添加。")
-                    # --- 修改结束 ---
+                template_files = SICHUAN_TEMPLATE_FILES
         elif standard == '成都市标':
-            # 定义成都市标需要处理的模板文件列表
-            template_files = [
-                '附表1-1 成都市绿色建筑设计施工图审查自评表（民用建筑）.docx',
-                '附表2-1 成都市绿色建筑设计施工图申报信息汇总表（民用建筑）.docx',   
-                '附表3 水系统规划设计申报表.docx',
-                '附表4 专项报告申报一览表.docx'
-            ]
-
-            for idx, template_file in enumerate(template_files):
-                template_path = os.path.join(current_app.static_folder, 'templates', template_file)
-                print(f"处理第 {idx+1} 个模板文件 (成都市标): {template_path}")
-                
-                if not os.path.exists(template_path):
-                    print(f"警告: 模板文件不存在: {template_path}, 将跳过此文件。")
-                    continue # 跳过当前文件，继续处理下一个
-                # 调用 replace_placeholders 处理模板
-                result = replace_placeholders(template_path, data)
-                
-                # 检查模板是否处理成功
-                if result:
-                    output_path, base_name = result
-                    if not isinstance(output_path, str) or not output_path.endswith('.docx'):
-                         print(f"警告: 处理模板 {template_file} 返回无效路径 '{output_path}'，跳过添加。")
-                    else:
-                        # 将成功生成的文档信息添加到列表
-                        output_info_list.append((output_path, base_name))
-                        print(f"已成功处理并添加: {output_path}")
-                else:
-                    print(f"错误: 调用 replace_placeholders 处理模板 {template_file} 时返回 None，表示内部处理失败。请检查之前的日志查找具体错误。跳过添加。")
-                # --- 修改结束 ---
-
+            template_files = CHENGDU_TEMPLATE_FILES
         else:
             # 对于其他未知的标准，或者不需要处理的情况
-             print(f"未知的评价标准或无需处理: {standard}")
-             return None # 或返回空列表 []，取决于后续逻辑
+            print(f"未知的评价标准或无需处理: {standard}")
+            return None
 
-        # --- 添加最终返回日志 --- 
-        # --- 修改：返回信息列表 --- 
+        print(f"处理 {standard} 模板，共 {len(template_files)} 个")
+        output_info_list = render_templates(template_files, data, on_output, in_memory)
+
+        # 返回生成的文档信息列表
         final_return_value = output_info_list if output_info_list else None
         print(f"[word_template.py] process_template 即将返回: {final_return_value}")
-        print(f"[word_template.py] process_template 即将返回类型: {type(final_return_value)}")
-        # --- 结束日志 --- 
-        # --- 修改结束 --- 
-        # 返回生成的文档信息列表
         return final_return_value
         
     except Exception as e:
@@ -318,22 +405,27 @@ def replace_bookmarks_in_doc(doc, project_info, score_data, standard):
 
     # 3. 处理数字/条文号书签 (来自原始文件)
     print("  处理条文号相关书签...")
+    # 预先按 条文号 和 f+条文号(去掉点) 两种书签格式建立索引，每个书签只需一次查找；
+    # 同一书签名对应多条记录时使用第一条，与逐条匹配的结果一致
+    clause_items = {}
+    for item in score_data:
+        clause_num = item.get('条文号', '')
+        if not clause_num: continue
+        clause_items.setdefault(str(clause_num), item)
+        clause_items.setdefault('f' + str(clause_num).replace('.', ''), item)
+
+    clause_bookmark_pattern = re.compile(r'\d+(?:\.\d+)*?')
     for bookmark_name in list(bookmark_starts.keys()): # Iterate over keys found in doc
-        is_clause_bookmark = re.match(r'\d+(?:\.\d+)*?', bookmark_name) or bookmark_name.startswith('f')
+        is_clause_bookmark = clause_bookmark_pattern.match(bookmark_name) or bookmark_name.startswith('f')
         if is_clause_bookmark and bookmark_name not in processed_bookmarks:
-            for item in score_data:
-                clause_num = item.get('条文号', '')
-                if not clause_num: continue
-                bookmark_format_f = 'f' + str(clause_num).replace('.', '')
-                # 检查书签名称是否匹配 条文号 或 f+条文号
-                if bookmark_name == str(clause_num) or bookmark_name == bookmark_format_f:
-                    display_score = str(item.get('得分', ''))
-                    if standard == '四川省标':
-                        if display_score == '达标': display_score = '√'
-                        elif display_score == '—' or display_score == '不达标': display_score = '×'
-                        elif display_score == '0': display_score = '/'
-                    if perform_replacement(bookmark_name, display_score):
-                        break # 找到匹配项并处理后，跳出内层 score_data 循环
+            item = clause_items.get(bookmark_name)
+            if item is None: continue
+            display_score = str(item.get('得分', ''))
+            if standard == '四川省标':
+                if display_score == '达标': display_score = '√'
+                elif display_score == '—' or display_score == '不达标': display_score = '×'
+                elif display_score == '0': display_score = '/'
+            perform_replacement(bookmark_name, display_score)
 
     # 4. 处理设计日期书签 (来自原始文件)
     print("  处理设计日期书签...")
@@ -522,11 +614,13 @@ def update_toc_with_com(doc_path):
         print("--- COM 目录更新尝试结束 ---")
 
 
-def replace_placeholders(template_path, data):
+def replace_placeholders(template_path, data, root_path=None, output_dir=None, in_memory=False):
     """
     替换 Word 文档中的占位符或书签。
     根据评价标准选择不同的处理方式。
     完成后尝试更新目录。
+    root_path/output_dir 默认取自当前应用，在进程池中调用时需显式传入。
+    in_memory 为 True 时不保存文件，返回的第一项为文档内容 (bytes)。
     返回: tuple (output_path, base_template_name) 或 None
     """
     output_path = None # 初始化为 None
@@ -542,7 +636,13 @@ def replace_placeholders(template_path, data):
             print("错误：传入的数据为空")
             return None
 
-        doc = Document(template_path)
+        if root_path is None:
+            root_path = current_app.root_path
+        if output_dir is None:
+            output_dir = current_app.config.get('EXPORT_FOLDER', 'static/exports')
+
+        # 从模板缓存获取文档副本和预先扫描的书签、占位符索引
+        doc, template_index = load_template_document(template_path)
         project_info = data[0] if isinstance(data[0], dict) else {}
         score_data = data[1:]
         standard = project_info.get('评价标准', '') # 获取评价标准
@@ -552,9 +652,11 @@ def replace_placeholders(template_path, data):
         image_placeholder = "{鸟瞰图}" # 图片占位符
         image_replaced = False # 标记是否成功替换了图片
 
-        if birdview_image_relative_path:
+        if birdview_image_relative_path and '鸟瞰图' not in template_index['placeholders']:
+            print("[word_template.py] 模板中没有鸟瞰图占位符，跳过图片替换。")
+        elif birdview_image_relative_path:
             try:
-                absolute_image_path = os.path.join(current_app.root_path, birdview_image_relative_path)
+                absolute_image_path = os.path.join(root_path, birdview_image_relative_path)
                 image_exists = os.path.exists(absolute_image_path)
                 print(f"[word_template.py] 检查图片绝对路径: {absolute_image_path}, 是否存在: {image_exists}")
             except Exception as path_err:
@@ -684,8 +786,11 @@ def replace_placeholders(template_path, data):
                  project_info['标准项目总分'] = ""
 
             # 调用书签处理函数 (现在使用原始逻辑)
-            replace_bookmarks_in_doc(doc, project_info, score_data, standard)
-            print(f"已调用书签处理函数完成 {standard} 模板。")
+            if template_index['bookmarks']:
+                replace_bookmarks_in_doc(doc, project_info, score_data, standard)
+                print(f"已调用书签处理函数完成 {standard} 模板。")
+            else:
+                print(f"模板中没有书签，跳过书签处理。")
 
         elif standard == '国标' and "安徽" in project_info.get('项目地点', ''):
             # --- 执行当前的 {占位符} 文本替换逻辑 (保持不变) ---
@@ -694,67 +799,34 @@ def replace_placeholders(template_path, data):
             text_replacements = {}
             # ... (准备 text_replacements, 包括计算 标准项目总分) ...
             # ... (遍历段落和表格, 查找和替换占位符) ...
-            # --- VVV 占位符替换逻辑 (保持不变) VVV --- 
+            # 替换字典的键为占位符名称（不含花括号），例如 "1.0.1措施"
             for key, value in project_info.items():
                 if key.endswith('_path'): continue
-                placeholder = f"{{{key}}}"
-                text_replacements[placeholder] = str(value) if value is not None else ''
+                text_replacements[key] = str(value) if value is not None else ''
             try:
                 # Calculate standard score for placeholder replacement
-                project_total_score_placeholder = "{项目总分}"
-                if project_total_score_placeholder in text_replacements:
-                   project_total_score_str = text_replacements[project_total_score_placeholder]
-                   project_total_score = float(project_total_score_str)
+                if "项目总分" in text_replacements:
+                   project_total_score = float(text_replacements["项目总分"])
                    standard_total_score = (project_total_score + 400) / 10
-                   text_replacements["{标准项目总分}"] = f"{standard_total_score:.1f}"
-            except Exception: text_replacements["{标准项目总分}"] = ""
+                   text_replacements["标准项目总分"] = f"{standard_total_score:.1f}"
+            except Exception: text_replacements["标准项目总分"] = ""
             for item in score_data:
                 clause_num = item.get("条文号", "")
                 if clause_num:
-                   text_replacements[f"{{{clause_num}}}"] = str(item.get("得分", "0"))
-                   text_replacements[f"{{{clause_num}措施}}"] = item.get("技术措施", "")
-                   text_replacements[f"{{{clause_num}达标}}"] = item.get("是否达标", "")
-                   text_replacements[f"{{{clause_num}分类}}"] = item.get("分类", "")
-            # (Loop through paragraphs and tables, find runs, replace placeholders)
-            elements_to_process = list(doc.paragraphs)
-            for table in doc.tables: # Add table paragraphs
-                for row in table.rows: 
-                    for cell in row.cells: elements_to_process.extend(cell.paragraphs)
+                   text_replacements[f"{clause_num}"] = str(item.get("得分", "0"))
+                   text_replacements[f"{clause_num}措施"] = item.get("技术措施", "")
+                   text_replacements[f"{clause_num}达标"] = item.get("是否达标", "")
+                   text_replacements[f"{clause_num}分类"] = item.get("分类", "")
+            # 只处理模板索引中包含占位符的段落（含表格内段落）；
+            # 每个段落只扫描一次，所有占位符一次替换完成
+            elements_to_process = get_placeholder_paragraphs(doc, template_index)
+            replaced_count = 0
             for p in elements_to_process:
-                 inline = p.runs
-                 # (Detailed run-level placeholder replacement logic remains here)
-                 runs_text = [(run, run.text) for run in inline] 
-                 current_paragraph_text = "".join(rt[1] for rt in runs_text)
-                 if '{' in current_paragraph_text:
-                     for placeholder, replacement_text in text_replacements.items():
-                         while placeholder in current_paragraph_text:
-                             # ... (find start/end run/offset) ...
-                             start_index=current_paragraph_text.find(placeholder); end_index=start_index+len(placeholder)
-                             start_run_idx,start_offset,end_run_idx,end_offset=-1,-1,-1,-1; current_pos=0
-                             for i, (run, text) in enumerate(runs_text):
-                                 run_len=len(text)
-                                 if start_run_idx==-1 and start_index<current_pos+run_len: start_run_idx=i; start_offset=start_index-current_pos
-                                 if end_run_idx==-1 and end_index<=current_pos+run_len: end_run_idx=i; end_offset=end_index-current_pos; break
-                                 current_pos+=run_len
-                             if start_run_idx!=-1 and end_run_idx!=-1:
-                                 # (Apply replacement across runs, clean middle, handle end run)
-                                 try:
-                                     target_run, target_text = runs_text[start_run_idx]
-                                     target_run.text = target_text[:start_offset] + replacement_text
-                                     runs_text[start_run_idx] = (target_run, target_run.text)
-                                     for i in range(start_run_idx + 1, end_run_idx): # Clean middle runs
-                                         if i < len(runs_text): runs_text[i][0].text = ""; runs_text[i] = (runs_text[i][0], "")
-                                     if start_run_idx != end_run_idx: # Handle end run
-                                         if end_run_idx < len(runs_text):
-                                             end_run, end_text = runs_text[end_run_idx]
-                                             end_run.text = end_text[end_offset:]
-                                             runs_text[end_run_idx] = (end_run, end_run.text)
-                                     else: # Ends in the same run
-                                         target_run.text += target_text[end_offset:]
-                                         runs_text[start_run_idx] = (target_run, target_run.text)
-                                     current_paragraph_text = "".join(rt[1] for rt in runs_text) # Update text for while loop
-                                 except Exception as replace_err: print(f"占位符替换错误: {replace_err}"); break
-                             else: break # Stop if placeholder not located
+                try:
+                    replaced_count += replace_placeholders_in_runs(p.runs, text_replacements)
+                except Exception as replace_err:
+                    print(f"占位符替换错误: {replace_err}")
+            print(f"共替换 {replaced_count} 个占位符")
             # --- ^^^ 占位符替换逻辑结束 ^^^ ---
             print("--- 文本占位符处理完成 (国标安徽) ---")
 
@@ -767,8 +839,13 @@ def replace_placeholders(template_path, data):
         modify_square_chars_font(doc)
         print("方框符号字体处理完成。")
 
+        if in_memory:
+            buffer = BytesIO()
+            doc.save(buffer)
+            print(f"=== 完成处理文档模板 (内存输出) ===")
+            return (buffer.getvalue(), base_template_name)
+
         # 保存处理后的文档 (保持不变)
-        output_dir = current_app.config.get('EXPORT_FOLDER', 'static/exports')
         os.makedirs(output_dir, exist_ok=True)
         timestamp = datetime.now().strftime("%Y%m%d%H%M%S%f")
         project_name = project_info.get('项目名称', '未知项目')
@@ -803,70 +880,13 @@ def replace_placeholders(template_path, data):
         print(f"=== 处理文档失败 ===")
         return None
 
-def replace_simple_placeholders_in_runs(runs, data_dict):
-    """在给定的 runs 列表中替换简单的 {key} 占位符"""
-    full_text = "".join(run.text for run in runs)
-    
-    # 使用正则表达式查找所有 {key} 形式的占位符
-    placeholders = re.findall(r"\{([^{}]+?)\}", full_text)
-    
-    if not placeholders:
-        return # 没有找到占位符，直接返回
-    
-    modified = False
-    for key in placeholders:
-        # 检查 data_dict 中是否有对应的键
-        if key in data_dict:
-            value = str(data_dict[key]) if data_dict[key] is not None else "" # 转换为字符串，None 转为空字符串
-            
-            # 构建要替换的占位符字符串，例如 "{项目名称}"
-            placeholder_to_replace = f"{{{key}}}"
-            
-            # --- 复杂的替换逻辑，处理跨 run 的占位符 --- 
-            # 因为一个占位符可能跨越多个 run，例如 "{项" 在一个 run，"目名称}" 在另一个 run
-            # 我们需要迭代 runs，构建当前文本，查找并替换
-            current_run_index = 0
-            while current_run_index < len(runs):
-                # 从当前 run 开始构建文本片段，直到找到完整的占位符或结束
-                temp_text = ""
-                runs_involved_indices = []
-                for i in range(current_run_index, len(runs)):
-                    temp_text += runs[i].text
-                    runs_involved_indices.append(i)
-                    if placeholder_to_replace in temp_text:
-                        break # 找到了完整的占位符
-               
-                # 如果找到了占位符
-                if placeholder_to_replace in temp_text:
-                    first_run_index = runs_involved_indices[0]
-                    last_run_index = runs_involved_indices[-1]
-                   
-                    # 在第一个 run 中执行替换
-                    first_run_text = runs[first_run_index].text
-                    start_index = temp_text.find(placeholder_to_replace)
-                    # 计算占位符在第一个 run 中的起始位置
-                    placeholder_start_in_first_run = start_index - sum(len(runs[j].text) for j in range(current_run_index, first_run_index))
-                   
-                    # 替换逻辑：只在第一个run中进行替换，并清空后续相关run的文本
-                    runs[first_run_index].text = first_run_text[:placeholder_start_in_first_run] + value + first_run_text[placeholder_start_in_first_run + len(placeholder_to_replace):]
-                   
-                    # 清空参与构成占位符的后续runs的文本
-                    for i in range(first_run_index + 1, last_run_index + 1):
-                        # 需要确保不超出 runs_involved_indices 的范围
-                        if i in runs_involved_indices:
-                             runs[i].text = ""
-                   
-                    modified = True
-                    # 从替换后的下一个 run 开始继续检查（或从当前 run 重新开始以处理同一 run 内的多个占位符）
-                    # 为简单起见，我们从第一个被修改的 run 之后开始，这可能错过同一 run 的后续占位符，但更安全
-                    current_run_index = first_run_index + 1
-                else:
-                    # 如果从 current_run_index 开始没有找到完整的占位符，移动到下一个 run
-                    current_run_index += 1
-            # --- 复杂替换逻辑结束 --- 
-           
-    # 如果进行了修改，可以考虑合并相邻的、格式相同的空 run 或 run，但这比较复杂，暂时省略
-    return modified
+def _simple_placeholder_lookup(data_dict):
+    """简单 {key} 占位符的取值函数，data_dict 中没有的键保持原样"""
+    def lookup(key):
+        if key not in data_dict:
+            return None
+        return str(data_dict[key]) if data_dict[key] is not None else "" # None 转为空字符串
+    return lookup
 
 def replace_generic_placeholders(doc_path, data_dict):
     """
@@ -883,21 +903,9 @@ def replace_generic_placeholders(doc_path, data_dict):
         print(f"[word_template.py] 开始通用占位符替换: {doc_path}")
         print(f"  替换数据: {list(data_dict.keys())}")
         
-        overall_modified = False
-        
-        # 遍历文档中的所有段落
-        for para in doc.paragraphs:
-            if replace_simple_placeholders_in_runs(para.runs, data_dict):
-                overall_modified = True
-               
-        # 遍历文档中的所有表格
-        for table in doc.tables:
-            for row in table.rows:
-                for cell in row.cells:
-                    for para in cell.paragraphs:
-                        if replace_simple_placeholders_in_runs(para.runs, data_dict):
-                            overall_modified = True
-                           
+        # 遍历文档中的所有段落和表格
+        overall_modified = replace_placeholders_in_document(doc, _simple_placeholder_lookup(data_dict)) > 0
+
         if overall_modified:
             doc.save(doc_path)
             print(f"[word_template.py] 通用占位符替换完成并保存: {doc_path}")